@@ -0,0 +1,249 @@
+# asr.py
+"""
+Speech recognition for /speech-to-text, off the event loop.
+
+Recognition runs on a bounded pool of ASR_WORKERS threads; each worker
+builds its recognizer once and reuses it for every request it serves.
+A request waits for a slot (at most ASR_MAX_QUEUE may wait) and for its
+result at most ASR_TIMEOUT seconds. The backend is chosen with
+ASR_BACKEND:
+
+  google  speech_recognition's recognize_google (network; the default)
+  vosk    offline Kaldi model from VOSK_MODEL_PATH (needs the vosk package)
+  stub    deterministic local stand-in for tests and benchmarks
+
+Backends get 16-bit mono PCM (AudioClip) at their `sample_rate`, as
+prepared by audio.preprocess(), and return the transcript, or raise
+NoSpeech when nothing intelligible was said.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from audio import AudioClip
+
+ASR_BACKEND = os.getenv("ASR_BACKEND", "google")
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "4"))
+ASR_MAX_QUEUE = int(os.getenv("ASR_MAX_QUEUE", "16"))
+ASR_TIMEOUT = float(os.getenv("ASR_TIMEOUT", "30"))
+ASR_LANGUAGE = os.getenv("ASR_LANGUAGE", "en-US")
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-en-us-0.15")
+# Simulated decoding time of the stub backend, as a fraction of the audio duration
+STUB_ASR_RTF = float(os.getenv("STUB_ASR_RTF", "0"))
+
+logger = logging.getLogger(__name__)
+
+
+class ASRError(Exception):
+    pass
+
+
+class ASRTimeout(ASRError):
+    pass
+
+
+class ASRBusy(ASRError):
+    pass
+
+
+class NoSpeech(ASRError):
+    pass
+
+
+# === Backends ===
+class GoogleBackend:
+    name = "google"
+    sample_rate = 16000
+
+    def __init__(self, language=ASR_LANGUAGE):
+        self.language = language
+
+    def load(self):
+        import speech_recognition
+
+    def new_recognizer(self):
+        import speech_recognition as sr
+        return sr.Recognizer()
+
+    def transcribe(self, recognizer, clip: AudioClip) -> str:
+        import speech_recognition as sr
+        try:
+            return recognizer.recognize_google(sr.AudioData(clip.pcm, clip.sample_rate, 2), language=self.language)
+        except sr.UnknownValueError:
+            raise NoSpeech()
+
+
+class VoskBackend:
+    name = "vosk"
+    sample_rate = 16000
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        # One model (read-only, shared by all workers), loaded once
+        with self._lock:
+            if self._model is None:
+                import vosk
+                vosk.SetLogLevel(-1)
+                self._model = vosk.Model(self.model_path)
+        return self._model
+
+    def new_recognizer(self):
+        # KaldiRecognizer is bound to a sample rate: one per rate seen by this worker
+        return {}
+
+    def transcribe(self, recognizers, clip: AudioClip) -> str:
+        import vosk
+        recognizer = recognizers.get(clip.sample_rate)
+        if recognizer is None:
+            recognizer = recognizers[clip.sample_rate] = vosk.KaldiRecognizer(self.load(), clip.sample_rate)
+        recognizer.AcceptWaveform(clip.pcm)
+        # FinalResult() also resets the recognizer for the next clip
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        if not text:
+            raise NoSpeech()
+        return text
+
+
+class StubBackend:
+    """Deterministic transcript derived from the audio, no model or network."""
+    name = "stub"
+    sample_rate = 16000
+
+    def __init__(self, rtf=STUB_ASR_RTF):
+        self.rtf = rtf
+
+    def load(self):
+        pass
+
+    def new_recognizer(self):
+        return None
+
+    def transcribe(self, recognizer, clip: AudioClip) -> str:
+        if self.rtf:
+            time.sleep(clip.duration * self.rtf)
+        if not any(clip.pcm):
+            raise NoSpeech()
+        digest = hashlib.sha1(clip.pcm).hexdigest()[:8]
+        return f"stub transcript {digest} ({clip.duration:.2f}s)"
+
+
+BACKENDS = {
+    "google": GoogleBackend,
+    "vosk": VoskBackend,
+    "stub": StubBackend,
+}
+
+
+# === Service ===
+class ASRService:
+    def __init__(self, backend, workers=ASR_WORKERS, max_queue=ASR_MAX_QUEUE, timeout=ASR_TIMEOUT):
+        self.backend = backend
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._local = threading.local()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # Running + queued jobs; a slot is only freed once its thread finishes,
+        # so timed-out jobs still count and the pool can't be flooded
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self.in_flight = 0
+        self.completed = 0
+        self.no_speech = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="asr")
+            return self._executor
+
+    def warm_up(self):
+        self.backend.load()
+        self.executor
+
+    def _recognize(self, clip: AudioClip) -> str:
+        # Runs in a worker thread: the recognizer is built on its first job
+        recognizer = getattr(self._local, "recognizer", None)
+        if recognizer is None:
+            recognizer = self._local.recognizer = self.backend.new_recognizer()
+        return self.backend.transcribe(recognizer, clip)
+
+    def _release(self, _future):
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def transcribe(self, clip: AudioClip, timeout=None) -> str:
+        """Transcript of `clip`; raises NoSpeech, ASRBusy, ASRTimeout or ASRError."""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise ASRBusy(f"{self.workers + self.max_queue} transcriptions already running or queued")
+        self.in_flight += 1
+        future = self.executor.submit(self._recognize, clip)
+        future.add_done_callback(self._release)
+        timeout = timeout or self.timeout
+        try:
+            text = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # The thread can't be interrupted; its slot frees when it returns
+            self.timeouts += 1
+            raise ASRTimeout(f"Speech recognition did not finish within {timeout}s")
+        except NoSpeech:
+            self.no_speech += 1
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            raise ASRError(str(e)) from e
+        self.completed += 1
+        return text
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "timeout": self.timeout,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "no_speech": self.no_speech,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+        }
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_asr() -> ASRService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                backend_cls = BACKENDS.get(ASR_BACKEND)
+                if backend_cls is None:
+                    raise ValueError(f"Unknown ASR_BACKEND {ASR_BACKEND!r}, expected one of {sorted(BACKENDS)}")
+                _service = ASRService(backend_cls())
+                logger.info(f"[ASR] Using {ASR_BACKEND} backend, {ASR_WORKERS} workers")
+    return _service
@@ -0,0 +1,313 @@
+# audio.py
+"""
+NumPy audio preprocessing in front of every ASR backend.
+
+preprocess() turns an upload into what the recognizer wants, in memory:
+
+  sniff     the container from its magic bytes (WAV natively; FLAC, OGG
+            and AIFF through soundfile/libsndfile; anything else, e.g. a
+            browser's WebM/Opus, is refused with UnsupportedAudio)
+  decode    WAV by walking its RIFF chunks over a memoryview of the upload,
+            so the sample data is viewed in place with np.frombuffer, not copied;
+            uploads longer than AUDIO_MAX_SECONDS are refused from the header
+  downmix   channels to mono, fused with the conversion to float32
+  resample  to the backend's rate (16 kHz, as the spTOtxt notebook assumes):
+            windowed-sinc FIR low-pass, then linear interpolation
+  trim      leading and trailing silence, with an energy VAD over 30 ms frames
+
+Backends then get little-endian signed 16-bit mono PCM (AudioClip), and
+clips without any speech never reach them.
+"""
+import os
+import struct
+from io import BytesIO
+from typing import NamedTuple
+
+import numpy as np
+
+# Voice activity detection: a frame is speech when its energy is at least
+# VAD_MARGIN_DB above the noise floor and above VAD_MIN_DB (dBFS)
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+VAD_MIN_DB = float(os.getenv("VAD_MIN_DB", "-45"))
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "10"))
+# Audio kept on either side of the speech when trimming
+TRIM_PAD_MS = int(os.getenv("TRIM_PAD_MS", "200"))
+# Longest upload accepted, checked against the header before decoding
+AUDIO_MAX_SECONDS = float(os.getenv("AUDIO_MAX_SECONDS", "600"))
+
+SILENCE_DB = -100.0
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+MAGIC = [  # (offset, bytes, format)
+    (0, b"fLaC", "flac"),
+    (0, b"OggS", "ogg"),
+    (0, b"\x1aE\xdf\xa3", "webm"),
+    (0, b"ID3", "mp3"),
+    (4, b"ftyp", "mp4"),
+]
+# Decoded by soundfile (libsndfile)
+SOUNDFILE_FORMATS = {"flac", "ogg", "aiff"}
+
+
+class UnsupportedAudio(ValueError):
+    pass
+
+
+class AudioClip(NamedTuple):
+    pcm: bytes  # little-endian signed 16-bit, mono
+    sample_rate: int
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / 2 / self.sample_rate
+
+
+class Preprocessed(NamedTuple):
+    clip: AudioClip  # None when the upload holds no speech
+    info: dict
+
+
+# === Format sniffing and decoding ===
+def sniff_format(data) -> str:
+    head = bytes(data[:12])
+    if head[:4] in (b"RIFF", b"RF64") and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    for offset, magic, name in MAGIC:
+        if head[offset:offset + len(magic)] == magic:
+            return name
+    if head[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "mp3"
+    return "unknown"
+
+
+def _check_length(frames: int, rate: int):
+    if frames > AUDIO_MAX_SECONDS * rate:
+        raise ValueError(f"Audio is longer than {AUDIO_MAX_SECONDS:.0f}s")
+
+
+def _wav_chunks(view: memoryview):
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        (size,) = struct.unpack_from("<I", view, offset + 4)
+        body = offset + 8
+        # Streaming writers leave the size unset (0 or 0xFFFFFFFF): take the rest
+        end = len(view) if chunk_id == b"data" and size in (0, 0xFFFFFFFF) else min(body + size, len(view))
+        yield chunk_id, view[body:end]
+        offset = body + size + (size & 1)
+
+
+def _wav_samples(view: memoryview):
+    """(samples array viewing the upload, channels, rate) from WAV bytes."""
+    fmt = data = None
+    for chunk_id, body in _wav_chunks(view):
+        if chunk_id == b"fmt ":
+            fmt = body
+        elif chunk_id == b"data":
+            data = body
+            break
+    if fmt is None or data is None or len(fmt) < 16:
+        raise ValueError("WAV file has no fmt or data chunk")
+    tag, channels, rate, _, block_align, bits = struct.unpack_from("<HHIIHH", fmt)
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        (tag,) = struct.unpack_from("<H", fmt, 24)  # first two bytes of the subformat GUID
+    if channels == 0 or rate == 0:
+        raise ValueError("WAV file declares no channels or a zero sample rate")
+    # A frame is `channels` samples of `width` bytes, each holding `bits` bits
+    if block_align == 0 or block_align % channels or bits == 0 or bits > 8 * (block_align // channels):
+        raise ValueError(f"Inconsistent WAV header ({channels} channels, {bits} bits, "
+                         f"{block_align} bytes per frame)")
+    width = block_align // channels
+    _check_length(len(data) // block_align, rate)
+    usable = len(data) - len(data) % block_align
+    data = data[:usable]
+    if tag == WAVE_FORMAT_IEEE_FLOAT and width in (4, 8):
+        samples = np.frombuffer(data, "<f4" if width == 4 else "<f8")
+    elif tag == WAVE_FORMAT_PCM and width == 1:
+        samples = np.frombuffer(data, np.uint8)
+    elif tag == WAVE_FORMAT_PCM and width in (2, 4):
+        samples = np.frombuffer(data, "<i2" if width == 2 else "<i4")
+    elif tag == WAVE_FORMAT_PCM and width == 3:
+        raw = np.frombuffer(data, np.uint8).reshape(-1, 3)
+        # Little-endian 24-bit into the top of an int32; the sign comes with the top byte
+        samples = (raw[:, 0].astype(np.int32) << 8 | raw[:, 1].astype(np.int32) << 16
+                   | raw[:, 2].astype(np.int8).astype(np.int32) << 24)
+    else:
+        raise UnsupportedAudio(f"Unsupported WAV encoding (format {tag:#x}, {bits} bits)")
+    return samples.reshape(-1, channels), channels, rate
+
+
+def _full_scale(dtype) -> float:
+    if dtype == np.uint8:
+        return 128.0
+    if dtype.kind == "f":
+        return 1.0
+    return float(2 ** (8 * dtype.itemsize - 1))
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    """float32 mono in [-1, 1] from (frames, channels) samples of any dtype."""
+    channels = samples.shape[1]
+    # Channel by channel: a strided mean(axis=1) is several times slower
+    mono = samples[:, 0].astype(np.float32)
+    for c in range(1, channels):
+        mono += samples[:, c]
+    if samples.dtype == np.uint8:
+        mono -= 128.0 * channels
+    mono *= np.float32(1 / (_full_scale(samples.dtype) * channels))
+    return mono
+
+
+def decode(data) -> tuple:
+    """(mono float32 samples, sample rate, info) from an uploaded file."""
+    view = memoryview(data)
+    fmt = sniff_format(view)
+    if fmt == "wav":
+        samples, channels, rate = _wav_samples(view)
+        mono = to_mono(samples)
+    elif fmt in SOUNDFILE_FORMATS:
+        try:
+            import soundfile
+        except ImportError:
+            raise UnsupportedAudio(f"{fmt.upper()} needs the soundfile package; send WAV instead")
+        header = soundfile.info(BytesIO(data))
+        _check_length(header.frames, header.samplerate)
+        frames, rate = soundfile.read(BytesIO(data), dtype="float32", always_2d=True)
+        channels = frames.shape[1]
+        mono = to_mono(frames)
+    elif fmt == "unknown":
+        raise ValueError("Unrecognized audio format; send WAV")
+    else:
+        raise UnsupportedAudio(f"{fmt.upper()} audio is not supported; send WAV")
+    return mono, rate, {"format": fmt, "channels": channels, "source_rate": rate,
+                        "source_seconds": round(len(mono) / rate, 3)}
+
+
+# === Resampling ===
+def _lowpass(x: np.ndarray, cutoff: float, taps=63) -> np.ndarray:
+    """Windowed-sinc FIR low-pass; `cutoff` as a fraction of the sample rate."""
+    n = np.arange(taps) - (taps - 1) / 2
+    h = (2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)).astype(np.float32)
+    return np.convolve(x, h / h.sum(), mode="same")
+
+
+def resample(x: np.ndarray, source_rate: int, target_rate: int) -> np.ndarray:
+    """
+    NumPy only: scipy's resample_poly is faster, but importing scipy while
+    sklearn imports it in another warm-up thread breaks both imports.
+    """
+    if source_rate == target_rate or len(x) == 0:
+        return x
+    if target_rate < source_rate:
+        # Anti-aliasing: nothing above the new Nyquist frequency may remain
+        x = _lowpass(x, 0.5 * target_rate / source_rate * 0.9)
+    n_out = int(len(x) * target_rate / source_rate)
+    positions = np.arange(n_out, dtype=np.float64) * (source_rate / target_rate)
+    return np.interp(positions, np.arange(len(x)), x).astype(np.float32)
+
+
+# === Voice activity ===
+def pcm_samples(pcm) -> np.ndarray:
+    """int16 view of PCM bytes (no copy)."""
+    return np.frombuffer(pcm, dtype="<i2")
+
+
+def frame_energy_db(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """
+    Mean energy of each complete frame in dBFS (a trailing partial frame is
+    ignored); int16 or float samples in [-1, 1].
+    """
+    n = len(samples) // frame_len
+    if n == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[: n * frame_len].reshape(n, frame_len).astype(np.float32)
+    if samples.dtype == np.int16:
+        frames *= np.float32(1 / 32768)
+    power = np.einsum("ij,ij->i", frames, frames) / frame_len
+    return np.maximum(10 * np.log10(power + 1e-12), SILENCE_DB)
+
+
+def speech_bounds(x: np.ndarray, rate: int, frame_ms=VAD_FRAME_MS, min_db=VAD_MIN_DB,
+                  margin_db=VAD_MARGIN_DB, pad_ms=TRIM_PAD_MS):
+    """
+    (start, end) sample indices spanning the speech in `x` plus `pad_ms` on
+    each side, or None when no frame is speech.
+
+    The noise floor is the clip's 10th-percentile frame energy; speech is at
+    least `margin_db` above it (capped `margin_db` below the 90th percentile,
+    so a clip that is speech throughout is kept whole).
+    """
+    frame_len = max(1, rate * frame_ms // 1000)
+    energies = frame_energy_db(x, frame_len)
+    if len(energies) == 0:
+        return None
+    low, high = np.percentile(energies, [10, 90])
+    threshold = max(min_db, min(low + margin_db, high - margin_db))
+    voiced = np.flatnonzero(energies >= threshold)
+    if len(voiced) == 0:
+        return None
+    pad = rate * pad_ms // 1000
+    start = max(0, voiced[0] * frame_len - pad)
+    end = min(len(x), (voiced[-1] + 1) * frame_len + pad)
+    return int(start), int(end)
+
+
+class EnergyVAD:
+    """
+    Streaming voice activity detection over fixed-length frames.
+
+    The noise floor follows quieter frames quickly, louder non-speech frames
+    slowly and speech barely at all, so steady background noise raises the
+    threshold but a long utterance doesn't.
+    """
+
+    def __init__(self, sample_rate, frame_ms=VAD_FRAME_MS, min_db=VAD_MIN_DB, margin_db=VAD_MARGIN_DB):
+        self.frame_len = max(1, sample_rate * frame_ms // 1000)
+        self.frame_bytes = 2 * self.frame_len
+        self.min_db = min_db
+        self.margin_db = margin_db
+        self.noise_db = min_db - margin_db
+
+    def voiced(self, energies: np.ndarray) -> np.ndarray:
+        """Speech flag for each frame energy, updating the noise floor as it goes."""
+        flags = np.empty(len(energies), dtype=bool)
+        noise = self.noise_db
+        for i, db in enumerate(energies.tolist()):
+            flags[i] = voiced = db >= max(self.min_db, noise + self.margin_db)
+            noise += (db - noise) * (0.2 if db < noise else 0.002 if voiced else 0.05)
+        self.noise_db = noise
+        return flags
+
+
+# === Pipeline ===
+def to_pcm16(x: np.ndarray) -> bytes:
+    return (np.clip(x, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def pcm_clip(pcm: bytes, source_rate: int, target_rate: int) -> AudioClip:
+    """AudioClip at `target_rate` from 16-bit mono PCM (streamed audio)."""
+    if source_rate == target_rate:
+        return AudioClip(pcm, source_rate)
+    x = pcm_samples(pcm).astype(np.float32) * np.float32(1 / 32768)
+    return AudioClip(to_pcm16(resample(x, source_rate, target_rate)), target_rate)
+
+
+def preprocess(data, target_rate: int, trim=True) -> Preprocessed:
+    """
+    Decode, downmix, resample and (with `trim`) cut the silence around the
+    speech. Raises UnsupportedAudio / ValueError for unusable uploads.
+    """
+    x, rate, info = decode(data)
+    x = resample(x, rate, target_rate)
+    if trim:
+        bounds = speech_bounds(x, target_rate)
+        if bounds is None:
+            return Preprocessed(None, {**info, "seconds": 0.0})
+        x = x[bounds[0]:bounds[1]]
+    clip = AudioClip(to_pcm16(x), target_rate)
+    return Preprocessed(clip, {**info, "seconds": round(clip.duration, 3)})
@@ -1,23 +1,29 @@
 from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field, EmailStr, constr
 from passlib.context import CryptContext
-from pymongo import MongoClient, DESCENDING
+from pymongo import ASCENDING, DESCENDING
 from datetime import datetime, timedelta
+from typing import List, Optional
 from bson import ObjectId
+import os
 import uuid
 import config
+from conversation import conversation_memory
+from symptom_extractor import symptom_extractor
+from database import database
+from chat_buffer import chat_buffer, BufferFull, ChatWriteError
+from indexes import CHAT_HISTORY_FIELDS, SESSION_FIELDS, LOGIN_FIELDS
+from pagination import (
+    MAX_PAGE_SIZE, InvalidCursor, encode_cursor, page_query, sort_spec, ndjson_stream,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-client = MongoClient("mongodb://localhost:27017/")
-db = client["meditrain"]
-users_collection = db["users"]
-chat_collection = db["chat_history"]
-sessions_collection = db["chat_sessions"]
-
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class User(BaseModel):
@@ -69,12 +75,13 @@ class SymptomInput(BaseModel):
 #     new_message: str
 
 @router.post("/register")
-def register(user: User):
-    if users_collection.find_one({"email": user.email}):
+async def register(user: User):
+    if await database.users.find_one({"email": user.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email already registered")
     try:
-        hashed_pwd = pwd_context.hash(user.password)
-        users_collection.insert_one({
+        # bcrypt is deliberately slow; keep it off the event loop
+        hashed_pwd = await run_in_threadpool(pwd_context.hash, user.password)
+        await database.users.insert_one({
             "username": user.username,
             "email": user.email,
             "password": hashed_pwd
@@ -85,14 +92,14 @@ def register(user: User):
     return {"message": "User registered successfully"}
 
 @router.post("/login")
-def login(data: LoginData):
-    user = users_collection.find_one({"email": data.email})
-    if not user or not pwd_context.verify(data.password, user["password"]):
+async def login(data: LoginData):
+    user = await database.users.find_one({"email": data.email}, LOGIN_FIELDS)
+    if not user or not await run_in_threadpool(pwd_context.verify, data.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     return {"message": "Login successful", "username": user["username"]}
 
 @router.post("/create_session")
-def create_session(data: CreateSession):
+async def create_session(data: CreateSession):
     session_id = str(uuid.uuid4())
     session_data = {
         "session_id": session_id,
@@ -102,78 +109,191 @@ def create_session(data: CreateSession):
         "created_at": datetime.utcnow()
     }
     try:
-        sessions_collection.insert_one(session_data)
+        await database.sessions.insert_one(session_data)
     except Exception as e:
         logger.exception("Error creating session")
         raise HTTPException(status_code=500, detail="Session creation failed")
     return {"status": "success", "session_id": session_id}
 
-@router.get("/sessions")
-def get_sessions(email: str, case_id: str = None):
+def session_item(s: dict) -> dict:
+    s["_id"] = str(s["_id"])
+    s["created_at"] = s["created_at"].isoformat()
+    return s
+
+def sessions_cursor(email: str, case_id: str = None, after: str = None, limit: int = None):
+    """Newest first, keyset-paginated on (created_at, _id)."""
     query = {"email": email}
     if case_id:
         query["case_id"] = case_id
     try:
-        sessions = list(sessions_collection.find(query).sort("created_at", DESCENDING))
+        query = page_query(query, "created_at", DESCENDING, after)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cursor = database.sessions.find(query, SESSION_FIELDS).sort(sort_spec("created_at", DESCENDING))
+    return cursor.limit(limit) if limit else cursor
+
+@router.get("/sessions")
+async def get_sessions(email: str, case_id: str = None,
+                       limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None):
+    """
+    A user's sessions, newest first. With `limit`, one page at a time: pass
+    the returned `next_after` as `after` to get the next page.
+    """
+    cursor = sessions_cursor(email, case_id, after, limit)
+    try:
+        sessions = await cursor.to_list(None)
     except Exception as e:
         logger.exception("Error fetching sessions")
         raise HTTPException(status_code=500, detail="Failed to retrieve sessions")
-    for s in sessions:
-        s["_id"] = str(s["_id"])
-        s["created_at"] = s["created_at"].isoformat()
-    return {"sessions": sessions}
+    next_after = None
+    if limit and len(sessions) == limit:
+        next_after = encode_cursor(sessions[-1]["created_at"], sessions[-1]["_id"])
+    return {"sessions": [session_item(s) for s in sessions], "next_after": next_after}
 
-@router.post("/store_chat")
-def store_chat(data: ChatMessage):
-    chat_collection.insert_one({
+@router.get("/sessions/stream")
+async def stream_sessions(email: str, case_id: str = None, after: Optional[str] = None):
+    """Same as /sessions, as NDJSON written while the cursor is read (constant memory)."""
+    cursor = sessions_cursor(email, case_id, after)
+    return StreamingResponse(ndjson_stream(cursor, session_item), media_type="application/x-ndjson")
+
+# Messages per /store_chat/batch request
+CHAT_BATCH_MAX_MESSAGES = int(os.getenv("CHAT_BATCH_MAX_MESSAGES", "500"))
+
+class ChatMessageBatch(BaseModel):
+    messages: List[ChatMessage] = Field(..., min_length=1, max_length=CHAT_BATCH_MAX_MESSAGES)
+
+def chat_document(data: ChatMessage, analysis: dict) -> dict:
+    return {
         "user_email": data.email,
         "case_id": data.case_id,
         "session_id": data.session_id,
         "role": data.role,
         "message": data.message,
+        "symptoms": analysis["symptoms"],
+        "symptom_spans": analysis["spans"],
         "timestamp": datetime.utcnow()
-    })
-    return {"status": "success"}
+    }
+
+async def buffer_chats(docs: list, wait: bool):
+    try:
+        return await chat_buffer.add(docs, wait=wait)
+    except BufferFull as e:
+        logger.warning(f"Chat buffer full: {e}")
+        raise HTTPException(status_code=503, detail="Chat storage is busy, retry shortly",
+                            headers={"Retry-After": "1"})
+    except ChatWriteError as e:
+        # Refused for their content (kept in the dead-letter file), so retrying won't help
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.post("/store_chat")
+async def store_chat(data: ChatMessage, wait: bool = False):
+    """
+    Store one chat message. It is written to MongoDB by the write-behind
+    buffer (chat_buffer.py); `wait=true` returns only once it is written.
+    """
+    # Extracted once here and served from the record by /chat_history
+    analysis = await run_in_threadpool(symptom_extractor.analyze, data.message)
+    ids = await buffer_chats([chat_document(data, analysis)], wait)
+    return {"status": "success", "id": str(ids[0]), **analysis}
+
+@router.post("/store_chat/batch")
+async def store_chat_batch(data: ChatMessageBatch, wait: bool = False):
+    """Store several chat messages (e.g. both sides of an exchange) in one request."""
+    analyses = await run_in_threadpool(
+        lambda: list(symptom_extractor.analyze_many(m.message for m in data.messages))
+    )
+    docs = [chat_document(m, analysis) for m, analysis in zip(data.messages, analyses)]
+    ids = await buffer_chats(docs, wait)
+    return {
+        "status": "success",
+        "stored": len(docs),
+        "results": [{"id": str(_id), **analysis} for _id, analysis in zip(ids, analyses)],
+    }
  # Adjust this import based on your structure
 
 
+async def tag_legacy_chats(docs: list):
+    """Add symptoms to messages stored before extraction moved to store_chat."""
+    untagged = [doc for doc in docs if "symptom_spans" not in doc]
+    if untagged:
+        analyses = await run_in_threadpool(
+            lambda: list(symptom_extractor.analyze_many(doc["message"] for doc in untagged))
+        )
+        for doc, analysis in zip(untagged, analyses):
+            doc["symptoms"], doc["symptom_spans"] = analysis["symptoms"], analysis["spans"]
+
+def chat_history_item(doc: dict) -> dict:
+    return {
+        "id": str(doc["_id"]),
+        "role": doc["role"],
+        "message": doc["message"],
+        "symptoms": doc["symptoms"],
+        "symptom_spans": doc["symptom_spans"],
+        "timestamp": doc.get("timestamp", "")
+    }
+
+def chat_history_cursor(email: str, session_id: str, after: str = None, limit: int = None):
+    """Oldest first, keyset-paginated on (timestamp, _id) over the user_session_time_id index."""
+    query = {"user_email": email, "session_id": session_id}
+    try:
+        query = page_query(query, "timestamp", ASCENDING, after)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cursor = database.chats.find(query, CHAT_HISTORY_FIELDS).sort(sort_spec("timestamp", ASCENDING))
+    return cursor.limit(limit) if limit else cursor
+
 @router.get("/chat_history")
-async def get_chat_history(email: str, case_id: str):
+async def get_chat_history(email: str, case_id: str,
+                           limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = None):
     """
-    Return all chat sessions and chats for a given user and case_id.
+    Return the chats of one session (`case_id` is the session id), oldest
+    first. With `limit`, one page at a time: pass the returned `next_after`
+    as `after` to get the next page.
     """
+    if chat_buffer.has_pending(user_email=email, session_id=case_id):
+        await chat_buffer.flush()
+    cursor = chat_history_cursor(email, case_id, after, limit)
     try:
-        chat_documents = chat_collection.find({
-            "user_email": email,
-            "session_id": case_id
-        })
-        print(chat_documents)
-
-        session_chat_map = []
-        for doc in chat_documents:
-            print(doc)
-            session_id = doc["session_id"]
-            # if session_id not in session_chat_map:
-            #     session_chat_map[session_id] = []
-            session_chat_map.append({
-                "role": doc["role"],
-                "message": doc["message"],
-                "timestamp": doc.get("timestamp", "")
-            })
-
-        return {"status": "success", "chat_history": session_chat_map}
-
+        chat_documents = await cursor.to_list(None)
+        await tag_legacy_chats(chat_documents)
     except Exception as e:
-        print(e)
+        logger.exception("Error fetching chat history")
         raise HTTPException(status_code=500, detail=str(e))
 
+    next_after = None
+    if limit and len(chat_documents) == limit:
+        last = chat_documents[-1]
+        next_after = encode_cursor(last.get("timestamp"), last["_id"])
+    return {
+        "status": "success",
+        "chat_history": [chat_history_item(doc) for doc in chat_documents],
+        "next_after": next_after,
+    }
+
+@router.get("/chat_history/stream")
+async def stream_chat_history(email: str, case_id: str, after: Optional[str] = None):
+    """Same as /chat_history, as NDJSON written while the cursor is read (constant memory)."""
+    async def item(doc):
+        await tag_legacy_chats([doc])
+        return chat_history_item(doc)
+
+    if chat_buffer.has_pending(user_email=email, session_id=case_id):
+        await chat_buffer.flush()
+    cursor = chat_history_cursor(email, case_id, after)
+    return StreamingResponse(ndjson_stream(cursor, item), media_type="application/x-ndjson")
+
 @router.delete("/delete_session")
-def delete_session(email: str = Query(...), session_id: str = Query(...)):
-    session_result = sessions_collection.delete_one({"email": email, "session_id": session_id})
-    chat_result = chat_collection.delete_many({"user_email": email, "session_id": session_id})
+async def delete_session(email: str = Query(...), session_id: str = Query(...)):
+    # Otherwise buffered messages would be written after the delete
+    if chat_buffer.has_pending(user_email=email, session_id=session_id):
+        await chat_buffer.flush()
+    session_result = await database.sessions.delete_one({"email": email, "session_id": session_id})
+    chat_result = await database.chats.delete_many({"user_email": email, "session_id": session_id})
 
     if session_result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Session not found.")
+    # Server-side /chat memory of the session, cached and stored (see conversation.py)
+    await conversation_memory.forget(session_id)
     return {
         "status": "success",
         "message": "Session and related chats deleted.",
@@ -181,8 +301,8 @@ def delete_session(email: str = Query(...), session_id: str = Query(...)):
     }
 
 @router.put("/update_session")
-def update_session_name(data: UpdateSessionName):
-    result = sessions_collection.update_one(
+async def update_session_name(data: UpdateSessionName):
+    result = await database.sessions.update_one(
         {"email": data.email, "session_id": data.session_id},
         {"$set": {"session_name": data.new_name}}
     )
@@ -0,0 +1,178 @@
+# benchmarks/bench_asr.py
+# /speech-to-text latency over a folder of WAV fixtures, through the ASR
+# service (asr.py): per-clip latency serially and under concurrent load, and
+# the worst event-loop stall meanwhile, compared with calling the backend
+# inline on the loop as the endpoint used to.
+#
+#   cd backend && python -m benchmarks.bench_asr [--fixtures DIR] [--backend stub]
+#       [--concurrency 16] [--rtf 0.1]
+#
+# Without --fixtures, synthetic clips (tones and silence, mono/stereo,
+# 8-48 kHz, 1-10 s) are written to a temporary folder first.
+import os
+import time
+import wave
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+import numpy as np
+
+import asr
+from asr import ASRService, BACKENDS, NoSpeech
+from audio import preprocess
+
+FIXTURE_SPECS = [  # (seconds, sample rate, channels, tone Hz or 0 for silence)
+    (1, 16000, 1, 440), (3, 16000, 1, 220), (5, 44100, 2, 330), (10, 48000, 1, 550),
+    (2, 8000, 1, 0), (7, 22050, 2, 660), (4, 16000, 1, 880), (6, 32000, 1, 120),
+]
+
+
+def write_fixtures(folder):
+    rng = np.random.default_rng(0)
+    for i, (seconds, rate, channels, hz) in enumerate(FIXTURE_SPECS):
+        t = np.arange(int(seconds * rate)) / rate
+        signal = 0.3 * np.sin(2 * np.pi * hz * t) + 0.02 * rng.standard_normal(t.size) if hz else np.zeros(t.size)
+        samples = (np.repeat(signal[:, None], channels, axis=1) * 32767).astype("<i2")
+        with wave.open(os.path.join(folder, f"clip{i:02d}_{seconds}s_{rate}hz.wav"), "wb") as wav:
+            wav.setnchannels(channels)
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(samples.tobytes())
+
+
+def load_fixtures(folder):
+    clips = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(".wav"):
+            with open(os.path.join(folder, name), "rb") as f:
+                clips.append((name, f.read()))
+    return clips
+
+
+class LoopLag:
+    """Largest delay seen by a 5 ms ticker on the event loop."""
+
+    async def __aenter__(self):
+        self.worst = 0.0
+        self._tick_start = time.perf_counter()
+        self._task = asyncio.create_task(self._tick())
+        await asyncio.sleep(0)
+        return self
+
+    async def _tick(self):
+        while True:
+            self._tick_start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            self.worst = max(self.worst, time.perf_counter() - self._tick_start - 0.005)
+
+    async def __aexit__(self, *exc):
+        # A tick still pending at the end was held up just as long
+        self.worst = max(self.worst, time.perf_counter() - self._tick_start - 0.005)
+        self._task.cancel()
+
+
+async def transcribe_upload(service, data):
+    clip, _ = await asyncio.to_thread(preprocess, data, service.backend.sample_rate)
+    try:
+        if clip is None:
+            raise NoSpeech()
+        return await service.transcribe(clip)
+    except NoSpeech:
+        return "Could not understand audio"
+
+
+async def run_serial(service, clips):
+    latencies = []
+    for name, data in clips:
+        start = time.perf_counter()
+        text = await transcribe_upload(service, data)
+        latencies.append(time.perf_counter() - start)
+        print(f"  {name:30}{latencies[-1] * 1e3:9.1f} ms  {text[:50]}")
+    return latencies
+
+
+async def run_concurrent(service, clips, concurrency):
+    jobs = [clips[i % len(clips)][1] for i in range(concurrency)]
+    latencies = []
+
+    async def one(data):
+        start = time.perf_counter()
+        await transcribe_upload(service, data)
+        latencies.append(time.perf_counter() - start)
+
+    async with LoopLag() as lag:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(data) for data in jobs))
+        wall = time.perf_counter() - start
+    return latencies, wall, lag.worst
+
+
+async def run_inline(backend, clips, concurrency):
+    """The old endpoint: decode and recognize on the event loop itself."""
+    recognizer = backend.new_recognizer()
+    jobs = [clips[i % len(clips)][1] for i in range(concurrency)]
+
+    async def one(data):
+        await asyncio.sleep(0)
+        clip, _ = preprocess(data, backend.sample_rate)
+        try:
+            if clip is None:
+                raise NoSpeech()
+            backend.transcribe(recognizer, clip)
+        except NoSpeech:
+            pass
+
+    async with LoopLag() as lag:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(data) for data in jobs))
+        wall = time.perf_counter() - start
+    return wall, lag.worst
+
+
+def summary(latencies):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return f"p50 {statistics.median(ordered) * 1e3:.1f} ms, p95 {p95 * 1e3:.1f} ms"
+
+
+async def main(args):
+    backend = BACKENDS[args.backend](**({"rtf": args.rtf} if args.backend == "stub" else {}))
+    service = ASRService(backend, workers=args.workers, max_queue=args.concurrency)
+    clips = load_fixtures(args.fixtures)
+    print(f"{len(clips)} fixtures from {args.fixtures}, {args.backend} backend, {args.workers} workers\n")
+
+    start = time.perf_counter()
+    service.warm_up()
+    print(f"warm-up {time.perf_counter() - start:.2f}s\nserial:")
+    print(f"  {summary(await run_serial(service, clips))}")
+
+    latencies, wall, lag = await run_concurrent(service, clips, args.concurrency)
+    print(f"\n{args.concurrency} concurrent via pool: {summary(latencies)}, wall {wall:.2f}s, "
+          f"worst loop stall {lag * 1e3:.1f} ms")
+    wall, lag = await run_inline(backend, clips, args.concurrency)
+    print(f"{args.concurrency} concurrent inline:   wall {wall:.2f}s, worst loop stall {lag * 1e3:.1f} ms")
+    print(f"\n{service.stats()}")
+    service.shutdown()
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", help="folder of .wav files (default: generated clips)")
+    parser.add_argument("--backend", default="stub", choices=sorted(BACKENDS))
+    parser.add_argument("--workers", type=int, default=asr.ASR_WORKERS)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rtf", type=float, default=0.05, help="stub decoding time per second of audio")
+    args = parser.parse_args()
+    if args.fixtures:
+        asyncio.run(main(args))
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        write_fixtures(folder)
+        args.fixtures = folder
+        asyncio.run(main(args))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,94 @@
+# benchmarks/bench_audio_preprocess.py
+# The audio preprocessing stage (audio.py) on long clips: time per stage
+# (decode + downmix, resample, VAD trim, PCM encode), the payload sent to the
+# recognizer with and without trimming, and stub recognition time on both.
+# Clips are synthetic: speech-like bursts in the middle of long stretches of
+# low noise, as when a recording starts early and stops late.
+#
+#   cd backend && python -m benchmarks.bench_audio_preprocess [--seconds 60 300] [--rtf 0.05]
+import io
+import time
+import wave
+import argparse
+
+import numpy as np
+
+import audio
+from asr import StubBackend
+
+TARGET_RATE = 16000
+FORMATS = [  # (sample rate, channels, sample width in bytes)
+    (44100, 2, 2),
+    (48000, 1, 3),
+    (16000, 1, 2),
+]
+
+
+def make_wav(seconds, rate, channels, width, speech_share=0.4, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(seconds * rate)
+    x = 0.003 * rng.standard_normal(n)
+    start, end = int(n * (1 - speech_share) / 2), int(n * (1 + speech_share) / 2)
+    t = np.arange(end - start) / rate
+    x[start:end] += 0.3 * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)) * np.sin(2 * np.pi * 200 * t)
+    frames = np.repeat(x[:, None], channels, axis=1)
+    if width == 3:
+        ints = (frames * (2 ** 23 - 1)).astype("<i4")
+        raw = ints.view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        raw = (frames * 32767).astype("<i2").tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(width)
+        wav.setframerate(rate)
+        wav.writeframes(raw)
+    return buffer.getvalue()
+
+
+def timed(fn, *args, repeat=3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1e3
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[60, 300])
+    parser.add_argument("--rtf", type=float, default=0.05, help="stub decoding time per second of audio")
+    args = parser.parse_args()
+    stub = StubBackend(rtf=args.rtf)
+
+    print(f"{'clip':26}{'decode':>9}{'resample':>10}{'trim':>8}{'encode':>8}{'total':>8}"
+          f"{'upload':>10}{'sent':>10}{'asr full':>10}{'asr trim':>10}")
+    for seconds in args.seconds:
+        for rate, channels, width in FORMATS:
+            data = make_wav(seconds, rate, channels, width)
+            samples, _, _ = audio._wav_samples(memoryview(data))
+            if width != 3:
+                # Zero-copy: the sample view reads the upload buffer itself
+                assert np.shares_memory(samples, np.frombuffer(data, np.uint8))
+
+            (x, source_rate, _), decode_ms = timed(audio.decode, data)
+            y, resample_ms = timed(audio.resample, x, source_rate, TARGET_RATE)
+            bounds, trim_ms = timed(audio.speech_bounds, y, TARGET_RATE)
+            trimmed = y[bounds[0]:bounds[1]]
+            pcm, encode_ms = timed(audio.to_pcm16, trimmed)
+            total_ms = decode_ms + resample_ms + trim_ms + encode_ms
+
+            full = audio.AudioClip(audio.to_pcm16(y), TARGET_RATE)
+            clip = audio.AudioClip(pcm, TARGET_RATE)
+            _, asr_full_ms = timed(stub.transcribe, None, full, repeat=1)
+            _, asr_trim_ms = timed(stub.transcribe, None, clip, repeat=1)
+
+            name = f"{seconds:.0f}s {rate // 1000}k {channels}ch {8 * width}bit"
+            print(f"{name:26}{decode_ms:>8.1f}ms{resample_ms:>8.1f}ms{trim_ms:>6.1f}ms{encode_ms:>6.1f}ms"
+                  f"{total_ms:>6.0f}ms{len(data) / 1e6:>8.1f}MB{len(pcm) / 1e6:>8.1f}MB"
+                  f"{asr_full_ms / 1e3:>9.2f}s{asr_trim_ms / 1e3:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main_()
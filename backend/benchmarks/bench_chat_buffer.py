@@ -0,0 +1,99 @@
+# benchmarks/bench_chat_buffer.py
+# Chat persistence: one insert_one per message (the old /store_chat) versus
+# the write-behind buffer (chat_buffer.py), against an in-process MongoDB
+# stand-in with a simulated round-trip latency. Reports round-trips and
+# throughput. (The no-loss, exactly-once and backpressure guarantees are
+# checked in tests/test_chat_buffer.py.)
+#
+#   cd backend && python -m benchmarks.bench_chat_buffer [--messages 2000] [--producers 50] [--rtt-ms 2]
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+
+from mongomock_motor import AsyncMongoMockClient
+
+from chat_buffer import ChatWriteBuffer
+
+
+class SlowCollection:
+    """Wraps a collection: every call costs one round-trip."""
+
+    def __init__(self, collection, rtt):
+        self.collection = collection
+        self.rtt = rtt
+        self.round_trips = 0
+
+    async def insert_one(self, doc):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt)
+        return await self.collection.insert_one(doc)
+
+    async def insert_many(self, docs, ordered=True):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt)
+        return await self.collection.insert_many(docs, ordered=ordered)
+
+
+def make_messages(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {"user_email": f"user{rng.randint(0, 99)}@example.com", "case_id": "case001",
+         "session_id": f"s{rng.randint(0, 499)}", "role": "user" if i % 2 == 0 else "bot",
+         "message": f"message {i}", "symptoms": [], "symptom_spans": [], "timestamp": datetime.utcnow()}
+        for i in range(n)
+    ]
+
+
+async def produce(messages, producers, store):
+    """`producers` concurrent clients, each storing its share one message at a time."""
+    async def client(share):
+        for doc in share:
+            await store(doc)
+    await asyncio.gather(*(client(messages[i::producers]) for i in range(producers)))
+
+
+async def run_insert_one(messages, producers, rtt):
+    collection = SlowCollection(AsyncMongoMockClient()["bench"]["chats"], rtt)
+    start = time.perf_counter()
+    await produce(messages, producers, collection.insert_one)
+    return time.perf_counter() - start, collection.round_trips
+
+
+async def run_buffered(messages, producers, rtt, wait=False, **options):
+    raw = AsyncMongoMockClient()["bench"]["chats"]
+    collection = SlowCollection(raw, rtt)
+    buffer = ChatWriteBuffer(lambda: collection, **options)
+    buffer.start()
+    start = time.perf_counter()
+    await produce(messages, producers, lambda doc: buffer.add([doc], wait=wait))
+    accepted = time.perf_counter() - start
+    await buffer.stop()
+    return accepted, time.perf_counter() - start, collection.round_trips, raw, buffer
+
+
+async def main(args):
+    rtt = args.rtt_ms / 1000
+    print(f"{args.messages} messages from {args.producers} concurrent clients, {args.rtt_ms} ms round-trip\n")
+    print(f"{'mode':28}{'round-trips':>12}{'accepted s':>12}{'written s':>11}{'msgs/s':>10}")
+
+    seconds, round_trips = await run_insert_one(make_messages(args.messages), args.producers, rtt)
+    print(f"{'insert_one per message':28}{round_trips:>12}{seconds:>12.2f}{seconds:>11.2f}{args.messages / seconds:>10.0f}")
+
+    for label, wait in (("buffer", False), ("buffer, wait=true", True)):
+        accepted, total, round_trips, _, _ = await run_buffered(make_messages(args.messages), args.producers, rtt,
+                                                               wait=wait)
+        print(f"{label:28}{round_trips:>12}{accepted:>12.2f}{total:>11.2f}{args.messages / total:>10.0f}")
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--producers", type=int, default=50)
+    parser.add_argument("--rtt-ms", type=float, default=2)
+    asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,52 @@
+# benchmarks/bench_forest.py
+# Latency of the flat-array forest against sklearn, single row and 1k rows.
+# (Bit-identity with sklearn is checked in tests/test_tree_ensemble.py.)
+#
+#   cd backend && python -m benchmarks.bench_forest
+import time
+import warnings
+
+import joblib
+import numpy as np
+
+import ml_model
+from tree_ensemble import FlatForest
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def random_rows(n_rows, n_features, rng):
+    X = np.zeros((n_rows, n_features), dtype=np.float32)
+    X[:, 0] = rng.integers(1, 100, n_rows)
+    X[:, 1] = rng.integers(0, 2, n_rows)
+    X[:, 2:] = rng.random((n_rows, n_features - 2)) < 0.15
+    return X
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def main():
+    model = joblib.load(ml_model.MODEL_PATH)
+    if hasattr(model, "feature_names_in_"):
+        del model.feature_names_in_
+    forest = FlatForest.from_model(model)
+    rng = np.random.default_rng(0)
+    X = random_rows(1000, model.n_features_in_, rng)
+
+    one = X[:1]
+    print(f"{'':14}{'sklearn':>12}{'flat':>12}")
+    for label, rows, repeat in (("1 row", one, 200), ("1k rows", X, 20)):
+        sk_ms = best_of(lambda: model.predict(rows), repeat)
+        flat_ms = best_of(lambda: forest.predict(rows), repeat)
+        print(f"{label:14}{sk_ms:10.3f}ms{flat_ms:10.3f}ms  ({sk_ms / flat_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_inference.py
+# Latency of the DataFrame-free predict_diagnosis path against the original
+# DataFrame one. The fast path is timed with the prediction cache cleared
+# before every call, so it measures inference; cache hits are reported
+# separately. (Parity with the DataFrame path is checked in
+# tests/test_ml_model.py.)
+#
+#   cd backend && python -m benchmarks.bench_inference
+import os
+import json
+import time
+import warnings
+
+import joblib
+import pandas as pd
+
+import ml_model
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+
+def dataframe_predict(model, mlb, symptoms, age, gender):
+    """The original per-request path: mlb.transform + one-row DataFrame."""
+    gender_val = 0 if gender.lower() == "male" else 1
+    filtered = [s for s in symptoms if s in set(mlb.classes_)]
+    vector = mlb.transform([filtered])
+    input_df = pd.DataFrame(
+        [[age, gender_val] + list(vector[0])],
+        columns=["age", "gender"] + list(mlb.classes_)
+    )
+    return model.predict(input_df)[0]
+
+
+def case_inputs():
+    inputs = []
+    for file in sorted(os.listdir(ml_model.CASE_FOLDER)):
+        if not file.endswith(".json"):
+            continue
+        with open(os.path.join(ml_model.CASE_FOLDER, file)) as f:
+            case = json.load(f)
+        patient = case["patient_profile"]
+        symptoms = case["symptoms"]
+        inputs.append((symptoms, patient["age"], patient["gender"]))
+        # Every single-symptom variant too, to cover more leaves
+        inputs.extend(([s], patient["age"], patient["gender"]) for s in symptoms)
+    return inputs
+
+
+def timeit(fn, inputs, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for symptoms, age, gender in inputs:
+            fn(symptoms, age, gender)
+    return (time.perf_counter() - start) / (repeat * len(inputs)) * 1e6
+
+
+def main():
+    model = joblib.load(ml_model.MODEL_PATH)
+    mlb = joblib.load(ml_model.ENCODER_PATH)
+    known = set(mlb.classes_)
+    inputs = [i for i in case_inputs() if any(s in known for s in i[0])]
+
+    def uncached(*args):
+        ml_model.prediction_cache.clear()
+        return ml_model.predict_diagnosis(*args)
+
+    df_us = timeit(lambda *a: dataframe_predict(model, mlb, *a), inputs)
+    fast_us = timeit(uncached, inputs)
+    hit_us = timeit(ml_model.predict_diagnosis, inputs)
+    print(f"DataFrame path : {df_us:8.1f} us/prediction")
+    print(f"fast path      : {fast_us:8.1f} us/prediction ({df_us / fast_us:.1f}x)")
+    print(f"cache hit      : {hit_us:8.1f} us/prediction")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_keyword_filters.py
+# Microbenchmark for the keyword-filter automaton against the per-keyword
+# scans it replaced. (That every filter makes the same decisions is checked
+# in tests/test_keyword_matcher.py.)
+#
+#   cd backend && python -m benchmarks.bench_keyword_filters
+import re
+import time
+import random
+
+from config import (
+    ALLOWED_KEYWORDS, BANNED_TOPICS, BANNED_SENTENCES,
+    GENERAL_KNOWLEDGE_TOPICS, IRRELEVANT_PHRASES,
+)
+import utils
+from keyword_matcher import KeywordMatcher
+
+
+# === Reference implementations (before the automaton) ===
+def old_is_general_knowledge_question(text):
+    return any(topic in text.lower() for topic in GENERAL_KNOWLEDGE_TOPICS)
+
+
+def old_is_irrelevant_message(message):
+    return any(phrase in message.lower() for phrase in IRRELEVANT_PHRASES)
+
+
+def old_is_medical_input(user_input):
+    input_lower = user_input.lower()
+    return (
+        not any(sentence in input_lower for sentence in BANNED_SENTENCES) and
+        not any(word in input_lower for word in BANNED_TOPICS) and
+        any(keyword in input_lower for keyword in ALLOWED_KEYWORDS)
+    )
+
+
+def old_is_allowed_message(message):
+    normalized = utils.normalize_text(message)
+    for banned in BANNED_TOPICS:
+        if re.search(rf'\b{re.escape(banned)}\b', normalized):
+            return False
+    for keyword in ALLOWED_KEYWORDS:
+        if re.search(rf'\b{re.escape(keyword)}\b', normalized):
+            return True
+    return False
+
+
+PAIRS = [
+    ("is_general_knowledge_question", old_is_general_knowledge_question, utils.is_general_knowledge_question),
+    ("is_irrelevant_message", old_is_irrelevant_message, utils.is_irrelevant_message),
+    ("is_medical_input", old_is_medical_input, utils.is_medical_input),
+    ("is_allowed_message", old_is_allowed_message, utils.is_allowed_message),
+]
+
+HANDWRITTEN = [
+    "", " ", "Hello doctor", "hi", "this is fine", "Where does it hurt?",
+    "I have had a headache and fever since Monday.",
+    "Do you watch IPL? Who is your favorite cricketer?",
+    "What is the capital of France?", "Tell me about Newton's laws of physics",
+    "My stomach pain gets worse after meals", "Is this correct: MI presents with chest pain",
+    "x-ray shows a fracture", "follow-up in 2 weeks", "ECG, CBC and LFT done",
+    "I love you", "You look beautiful today", "Explain the mechanism of aspirin",
+    "painful painless pain-free", "hithere hi-there hi_there", "AI and machine learning in radiology",
+    "Are you single? \\bwife\\b", "sleeplessness and sleepy", "I'm feeling dizzy and nauseous",
+    "Café fever – naïve résumé", "treatment plan for asthma, dose and route",
+]
+
+
+def build_corpus(seed=0, n_random=3000):
+    rng = random.Random(seed)
+    keywords = ALLOWED_KEYWORDS + BANNED_TOPICS + BANNED_SENTENCES + GENERAL_KNOWLEDGE_TOPICS + IRRELEVANT_PHRASES
+    filler = ["the", "patient", "has", "had", "since", "and", "my", "x", "ok", "is", "a", "very", "of"]
+    wrappers = ["{}", " {} ", "{}!", "({})", "-{}-", "a{}", "{}s", "_{}_", "{}.", "'{}'", "{}?"]
+    corpus = list(HANDWRITTEN)
+    for keyword in keywords:
+        for wrapper in wrappers:
+            corpus.append("I think " + wrapper.format(keyword) + " matters")
+            corpus.append(wrapper.format(keyword.upper()))
+    for _ in range(n_random):
+        words = [rng.choice(keywords if rng.random() < 0.3 else filler) for _ in range(rng.randint(1, 14))]
+        glue = rng.choice([" ", " ", ", ", "-", ""])
+        corpus.append(glue.join(words))
+    return corpus
+
+
+def timed(fn, corpus, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in corpus:
+            fn(text)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus) * 1e6
+
+
+def main():
+    corpus = build_corpus()
+    start = time.perf_counter()
+    matcher = KeywordMatcher({
+        "banned_sentence": BANNED_SENTENCES, "banned_topic": BANNED_TOPICS, "allowed": ALLOWED_KEYWORDS,
+        "general_knowledge": GENERAL_KNOWLEDGE_TOPICS, "irrelevant": IRRELEVANT_PHRASES,
+    })
+    print(f"automaton: {len(matcher)} states, built in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    print(f"{'':32}{'before':>12}{'after':>12}")
+    for name, old, new in PAIRS:
+        old_us, new_us = timed(old, corpus), timed(new, corpus)
+        print(f"{name:32}{old_us:10.1f}us{new_us:10.1f}us  ({old_us / new_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
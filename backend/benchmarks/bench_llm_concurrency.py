@@ -0,0 +1,40 @@
+# benchmarks/bench_llm_concurrency.py
+# Load-test the LLM client against the offline fake backend.
+#
+#   cd backend && python -m benchmarks.bench_llm_concurrency [requests] [latency]
+import sys
+import time
+import asyncio
+
+from llm_client import FakeBackend, LLMClient
+
+
+async def run(n_requests, latency, max_in_flight):
+    client = LLMClient(FakeBackend(latency=latency), max_in_flight=max_in_flight)
+    peak = 0
+
+    async def one(i):
+        nonlocal peak
+        task = asyncio.ensure_future(client.generate(f"Doctor: question {i}"))
+        while not task.done():
+            peak = max(peak, client.in_flight)
+            await asyncio.sleep(latency / 10)
+        return task.result()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    return time.perf_counter() - start, peak
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    print(f"{n_requests} requests, fake latency {latency}s")
+    print(f"{'max_in_flight':>14}{'wall':>10}{'req/s':>10}{'peak':>8}")
+    for max_in_flight in (1, 4, 16, 64):
+        elapsed, peak = asyncio.run(run(n_requests, latency, max_in_flight))
+        print(f"{max_in_flight:>14}{elapsed:>9.2f}s{n_requests / elapsed:>10.1f}{peak:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/bench_mongo_indexes.py
+# Seeds a throwaway database with users, sessions and chat messages, then
+# runs every hot query shape with explain("executionStats") before and after
+# the startup indexes (indexes.py) exist: plan stage, documents examined,
+# documents returned and latency.
+#
+# Needs a real MongoDB server (mongomock has no query planner):
+#
+#   cd backend && MONGO_URI=mongodb://localhost:27017/ python -m benchmarks.bench_mongo_indexes
+#       [--users 200] [--sessions-per-user 20] [--messages-per-session 50]
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING
+
+from conversation import STATE_KIND
+from database import CHATS, SESSIONS, USERS, MONGO_URI, sync_database
+from indexes import CHAT_HISTORY_FIELDS, SESSION_FIELDS, INDEXES, ensure_indexes_sync
+from pagination import sort_spec
+
+BENCH_DB = "meditrain_bench"
+
+
+def seed(db, n_users, sessions_per_user, messages_per_session, seed=0):
+    rng = random.Random(seed)
+    for name in (USERS, SESSIONS, CHATS):
+        db.drop_collection(name)
+    start = datetime(2024, 1, 1)
+    db[USERS].insert_many([
+        {"username": f"user{u}", "email": f"user{u}@example.com", "password": "x" * 60} for u in range(n_users)
+    ])
+    sessions, chats = [], []
+    for u in range(n_users):
+        email = f"user{u}@example.com"
+        for s in range(sessions_per_user):
+            session_id = f"{u}-{s}"
+            created = start + timedelta(minutes=rng.randint(0, 500000))
+            sessions.append({"session_id": session_id, "email": email, "case_id": f"case{rng.randint(1, 20):03d}",
+                             "session_name": f"Session {s}", "created_at": created})
+            for m in range(messages_per_session):
+                chats.append({"user_email": email, "case_id": "case001", "session_id": session_id,
+                              "role": "user" if m % 2 == 0 else "bot", "message": "I have had a fever " * 5,
+                              "symptoms": ["fever"], "symptom_spans": [],
+                              "timestamp": created + timedelta(seconds=m)})
+            chats.append({"session_id": session_id, "kind": STATE_KIND, "case_id": "case001", "turns": []})
+        if len(chats) > 50000:
+            db[CHATS].insert_many(chats, ordered=False)
+            chats = []
+    db[SESSIONS].insert_many(sessions, ordered=False)
+    if chats:
+        db[CHATS].insert_many(chats, ordered=False)
+
+
+def query_shapes(db, n_users, sessions_per_user):
+    u, s = n_users // 2, sessions_per_user // 2
+    email, session_id = f"user{u}@example.com", f"{u}-{s}"
+    return [
+        ("/chat_history", lambda: db[CHATS].find(
+            {"user_email": email, "session_id": session_id}, CHAT_HISTORY_FIELDS).sort(sort_spec("timestamp", ASCENDING))),
+        ("/sessions", lambda: db[SESSIONS].find({"email": email}, SESSION_FIELDS).sort(
+            sort_spec("created_at", DESCENDING))),
+        ("/sessions?case_id=", lambda: db[SESSIONS].find(
+            {"email": email, "case_id": "case007"}, SESSION_FIELDS).sort(sort_spec("created_at", DESCENDING))),
+        ("conversation memory", lambda: db[CHATS].find({"session_id": session_id, "kind": STATE_KIND}).limit(1)),
+        ("/login", lambda: db[USERS].find({"email": email}, {"_id": 0, "username": 1, "password": 1}).limit(1)),
+        ("main.get_sessions", lambda: db[CHATS].find({"email": email})),
+    ]
+
+
+def plan_stages(plan):
+    stages = [plan["stage"]]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+
+def measure(make_cursor, repeat=20):
+    stats = make_cursor().explain()["executionStats"]
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        list(make_cursor())
+        best = min(best, time.perf_counter() - start)
+    stages = plan_stages(stats["executionStages"])
+    return ">".join(stages), stats["totalDocsExamined"], stats["nReturned"], best * 1e3
+
+
+def report(title, shapes):
+    print(f"\n{title}")
+    print(f"{'query':22}{'plan':>34}{'examined':>10}{'returned':>10}{'ms':>9}")
+    for name, make_cursor in shapes:
+        plan, examined, returned, ms = measure(make_cursor)
+        print(f"{name:22}{plan:>34}{examined:>10}{returned:>10}{ms:9.2f}")
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--sessions-per-user", type=int, default=20)
+    parser.add_argument("--messages-per-session", type=int, default=50)
+    args = parser.parse_args()
+
+    db = sync_database(MONGO_URI, BENCH_DB)
+    start = time.perf_counter()
+    seed(db, args.users, args.sessions_per_user, args.messages_per_session)
+    print(f"seeded {db[USERS].count_documents({})} users, {db[SESSIONS].count_documents({})} sessions, "
+          f"{db[CHATS].count_documents({})} chat documents in {time.perf_counter() - start:.1f}s")
+
+    shapes = query_shapes(db, args.users, args.sessions_per_user)
+    report("without indexes", shapes)
+    ensure_indexes_sync(db)
+    # Idempotent: a second run creates nothing new and raises nothing
+    ensure_indexes_sync(db)
+    report("with indexes.py", shapes)
+    print(f"\nindexes: { {name: [m.document['name'] for m in models] for name, models in INDEXES.items()} }")
+    db.client.drop_database(BENCH_DB)
+
+
+if __name__ == "__main__":
+    main_()
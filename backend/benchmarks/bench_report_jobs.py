@@ -0,0 +1,117 @@
+# benchmarks/bench_report_jobs.py
+# LLM diagnosis reports: answered inline (the synchronous /generate_report,
+# the request held for the whole completion) versus submitted to the job
+# queue (report_jobs.py) and polled. A fake LLM with a fixed latency stands
+# in for Gemini and records how many completions run at once. Reports how
+# long a request is held, how many completions ran, and the peak of
+# concurrent completions, for a burst in which some reports repeat.
+#
+#   cd backend && python -m benchmarks.bench_report_jobs [--requests 200] [--distinct 50] [--latency 1] [--workers 4]
+import time
+import asyncio
+import argparse
+
+from mongomock_motor import AsyncMongoMockClient
+
+from report_jobs import ReportJobQueue, DONE
+from utils import diagnosis_report_prompt
+
+
+class CountingLLM:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        return f"report for {len(prompt)} chars of prompt"
+
+
+def make_prompts(n, distinct):
+    return [diagnosis_report_prompt(f"Patient {i % distinct}", 30 + i % distinct, "F", ["fever", "cough"], "Flu")
+            for i in range(n)]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+async def run_inline(prompts, latency):
+    llm = CountingLLM(latency)
+    held = []
+
+    async def request(prompt):
+        start = time.perf_counter()
+        await llm.generate(prompt)
+        held.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(p) for p in prompts))
+    return held, time.perf_counter() - start, llm
+
+
+async def run_jobs(prompts, latency, workers):
+    llm = CountingLLM(latency)
+    collection = AsyncMongoMockClient()["bench"]["report_jobs"]
+    queue = ReportJobQueue(lambda: collection, generate=llm.generate, workers=workers, max_queue=len(prompts))
+    queue.start()
+    held = []
+
+    async def request(i, prompt):
+        start = time.perf_counter()
+        job_id, _ = await queue.submit({"i": i}, prompt)
+        held.append(time.perf_counter() - start)
+        return job_id
+
+    start = time.perf_counter()
+    job_ids = await asyncio.gather(*(request(i, p) for i, p in enumerate(prompts)))
+    # Poll like a client until every job is done
+    pending = set(job_ids)
+    while pending:
+        await asyncio.sleep(latency / 10)
+        for job_id in list(pending):
+            if (await queue.get(job_id))["status"] == DONE:
+                pending.discard(job_id)
+    total = time.perf_counter() - start
+    stats = queue.stats()
+    await queue.stop()
+    return held, total, llm, stats
+
+
+async def main(args):
+    prompts = make_prompts(args.requests, args.distinct)
+    print(f"{args.requests} report requests ({args.distinct} distinct), LLM latency {args.latency}s, "
+          f"{args.workers} job workers\n")
+    print(f"{'mode':22}{'held p50 ms':>13}{'held p99 ms':>13}{'all done s':>12}{'LLM calls':>11}{'peak':>6}")
+
+    held, total, llm = await run_inline(prompts, args.latency)
+    print(f"{'inline':22}{percentile(held, 50) * 1e3:>13.1f}{percentile(held, 99) * 1e3:>13.1f}"
+          f"{total:>12.2f}{llm.calls:>11}{llm.peak:>6}")
+
+    held, total, llm, stats = await run_jobs(prompts, args.latency, args.workers)
+    print(f"{'job queue':22}{percentile(held, 50) * 1e3:>13.1f}{percentile(held, 99) * 1e3:>13.1f}"
+          f"{total:>12.2f}{llm.calls:>11}{llm.peak:>6}")
+    assert llm.peak <= args.workers, llm.peak
+    print(f"\n{stats['deduplicated']} submissions joined an identical pending job")
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_()
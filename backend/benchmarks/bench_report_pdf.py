@@ -0,0 +1,79 @@
+# benchmarks/bench_report_pdf.py
+# PDF reports: rendering inline on the event loop (the old /generate_report)
+# versus the worker pool with content-addressed caching (report_generator.py).
+# For each mode, N concurrent requests for D distinct reports: wall time and
+# the worst event-loop stall seen meanwhile, then a repeat round served from
+# the cache.
+#
+#   cd backend && python -m benchmarks.bench_report_pdf [--requests 40] [--distinct 10] [--workers 2]
+import time
+import asyncio
+import argparse
+
+from report_generator import ReportRenderer, render_report, report_fields
+from benchmarks.bench_asr import LoopLag
+
+
+def make_fields(i):
+    return report_fields(
+        session_id=f"s{i}", patient_name=f"Patient {i}",
+        symptoms=["fever", "cough", "headache", "fatigue"][: 1 + i % 4],
+        diagnosis="Viral upper respiratory tract infection. " * 8,
+        treatment="Rest, fluids and paracetamol as needed. " * 8,
+        remarks=f"Follow up in {i % 7 + 1} days. " * 6,
+        date="17-10-2026",
+    )
+
+
+async def run_inline(requests):
+    async def one(fields):
+        return render_report(fields)
+    async with LoopLag() as lag:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(f) for f in requests))
+        seconds = time.perf_counter() - start
+    return seconds, lag.worst
+
+
+async def run_pool(renderer, requests):
+    async with LoopLag() as lag:
+        start = time.perf_counter()
+        await asyncio.gather(*(renderer.get(f) for f in requests))
+        seconds = time.perf_counter() - start
+    return seconds, lag.worst
+
+
+async def main(args):
+    requests = [make_fields(i % args.distinct) for i in range(args.requests)]
+    print(f"{args.requests} concurrent requests, {args.distinct} distinct reports, {args.workers} workers\n")
+    print(f"{'mode':30}{'wall ms':>10}{'loop stall ms':>15}{'renders':>9}")
+
+    render_report(make_fields(0))  # FPDF import and font metrics in this process, as a long-running server would
+    seconds, stall = await run_inline(requests)
+    print(f"{'inline on the event loop':30}{seconds * 1e3:>10.1f}{stall * 1e3:>15.1f}{args.requests:>9}")
+
+    renderer = ReportRenderer(workers=args.workers, cache_dir="")
+    await asyncio.to_thread(renderer.warm_up)
+    try:
+        seconds, stall = await run_pool(renderer, requests)
+        print(f"{'pool, cold cache':30}{seconds * 1e3:>10.1f}{stall * 1e3:>15.1f}{renderer.renders:>9}")
+        before = renderer.renders
+        seconds, stall = await run_pool(renderer, requests)
+        print(f"{'pool, warm cache':30}{seconds * 1e3:>10.1f}{stall * 1e3:>15.1f}{renderer.renders - before:>9}")
+        assert renderer.renders == args.distinct, renderer.stats()
+        print(f"\n{renderer.shared} requests shared an in-flight render, cache {renderer.cache.stats()}")
+    finally:
+        renderer.shutdown()
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--distinct", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    asyncio.run(main(parser.parse_args()))
+
+
+# The guard matters here: spawned workers re-import the main module
+if __name__ == "__main__":
+    main_()
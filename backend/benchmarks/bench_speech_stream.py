@@ -0,0 +1,98 @@
+# benchmarks/bench_speech_stream.py
+# Perceived latency of streaming recognition (speech_stream.py, behind
+# /ws/speech) versus record-then-upload (/speech-to-text). A simulated
+# microphone sends 100 ms PCM chunks in real time: alternating speech-like
+# tone bursts and pauses. For every utterance it reports when the first
+# partial transcript arrived (after speech started) and how long after the
+# speaker stopped the final one came. With an upload, nothing is decoded
+# until the whole recording has been sent.
+#
+#   cd backend && python -m benchmarks.bench_speech_stream [--backend stub] [--rtf 0.1] [--utterances 3]
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+from asr import ASRService, AudioClip, BACKENDS
+from speech_stream import SpeechSession, VAD_END_SILENCE_MS
+
+RATE = 16000
+CHUNK_S = 0.1
+
+
+def make_stream(utterances, seed=0):
+    """PCM plus (start, end) seconds of each spoken part."""
+    rng = np.random.default_rng(seed)
+    parts, spans, t = [], [], 0.0
+    for i in range(utterances):
+        pause, speech = 0.8, 1.5 + i
+        parts.append(0.002 * rng.standard_normal(int(pause * RATE)))
+        n = np.arange(int(speech * RATE))
+        # Tone with a syllable-rate envelope, over a little noise
+        envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * n / RATE)
+        parts.append(0.3 * envelope * np.sin(2 * np.pi * (180 + 40 * i) * n / RATE)
+                     + 0.002 * rng.standard_normal(n.size))
+        spans.append((t + pause, t + pause + speech))
+        t += pause + speech
+    parts.append(0.002 * rng.standard_normal(int(1.0 * RATE)))
+    pcm = (np.concatenate(parts) * 32767).astype("<i2").tobytes()
+    return pcm, spans
+
+
+async def run_stream(service, pcm, spans):
+    events = []
+    start = time.perf_counter()
+
+    async def send(message):
+        events.append((time.perf_counter() - start, message))
+
+    session = SpeechSession(service, RATE, send)
+    chunk = int(CHUNK_S * RATE) * 2
+    for i, offset in enumerate(range(0, len(pcm), chunk)):
+        # Real time: chunk i is only "recorded" at (i + 1) * CHUNK_S
+        await asyncio.sleep(max(0.0, (i + 1) * CHUNK_S - (time.perf_counter() - start)))
+        await session.feed(pcm[offset:offset + chunk])
+    await session.finish()
+
+    print(f"{'utterance':>10}{'speech s':>10}{'partials':>10}{'1st partial after start':>25}{'final after end':>17}")
+    for u, (speech_start, speech_end) in enumerate(spans, 1):
+        partials = [at for at, m in events if m["type"] == "partial" and m["utterance"] == u]
+        finals = [at for at, m in events if m["type"] == "final" and m["utterance"] == u]
+        first = f"{(partials[0] - speech_start) * 1e3:.0f} ms" if partials else "-"
+        final = f"{(finals[0] - speech_end) * 1e3:.0f} ms" if finals else "missing"
+        print(f"{u:>10}{speech_end - speech_start:>10.1f}{len(partials):>10}{first:>25}{final:>17}")
+    print(f"(the final waits for {VAD_END_SILENCE_MS} ms of silence, VAD_END_SILENCE_MS, before decoding)")
+
+
+async def run_upload(service, pcm, spans):
+    start = time.perf_counter()
+    # The browser records everything first, then uploads it
+    await asyncio.sleep(len(pcm) / 2 / RATE)
+    await service.transcribe(AudioClip(pcm, RATE))
+    done = time.perf_counter() - start
+    print(f"\nrecord-then-upload: transcript {(done - spans[0][1]) * 1e3:.0f} ms after the first utterance ended, "
+          f"{(done - spans[-1][1]) * 1e3:.0f} ms after the last")
+
+
+async def main(args):
+    backend = BACKENDS[args.backend](**({"rtf": args.rtf} if args.backend == "stub" else {}))
+    service = ASRService(backend)
+    service.warm_up()
+    pcm, spans = make_stream(args.utterances)
+    print(f"{len(pcm) / 2 / RATE:.1f}s of audio, {args.utterances} utterances, {args.backend} backend\n")
+    await run_stream(service, pcm, spans)
+    await run_upload(service, pcm, spans)
+    service.shutdown()
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="stub", choices=sorted(BACKENDS))
+    parser.add_argument("--rtf", type=float, default=0.1, help="stub decoding time per second of audio")
+    parser.add_argument("--utterances", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,52 @@
+# benchmarks/bench_symptom_batch.py
+# Throughput of bulk symptom extraction (messages/second) for different
+# nlp.pipe batch sizes and worker process counts, against one
+# extract() call per message. Results must match extract() exactly.
+#
+#   cd backend && python -m benchmarks.bench_symptom_batch [--messages 20000]
+import os
+import time
+import argparse
+
+from symptom_extractor import SymptomExtractor, load_nlp
+from benchmarks.bench_symptom_extraction import build_corpus
+
+BATCH_SIZES = [1, 16, 64, 256, 1024]
+
+
+def throughput(fn, corpus):
+    start = time.perf_counter()
+    results = fn(corpus)
+    return results, len(corpus) / (time.perf_counter() - start)
+
+
+def main_():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    corpus = build_corpus(n_random=args.messages)[:args.messages]
+    # Caching disabled: backfill messages are mostly distinct
+    extractor = SymptomExtractor(nlp=load_nlp(), cache_size=0)
+    expected, base = throughput(lambda texts: [extractor.extract(t) for t in texts], corpus)
+    print(f"{len(corpus)} messages, {os.cpu_count()} cores")
+    print(f"{'extract() per message':40}{base:12.0f} msg/s")
+
+    process_counts = sorted({1, 2, min(4, os.cpu_count() or 1)})
+    failures = 0
+    for n_process in process_counts:
+        for batch_size in BATCH_SIZES:
+            results, rate = throughput(
+                lambda texts: list(extractor.extract_many(texts, batch_size=batch_size, n_process=n_process)),
+                corpus,
+            )
+            failures += results != expected
+            print(f"{f'extract_many(batch={batch_size}, n_process={n_process})':40}"
+                  f"{rate:12.0f} msg/s  ({rate / base:.1f}x)")
+    if failures:
+        print(f"{failures} configurations returned different results")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main_()
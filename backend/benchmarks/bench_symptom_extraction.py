@@ -0,0 +1,109 @@
+# benchmarks/bench_symptom_extraction.py
+# Latency comparison for symptom extraction. On a random corpus without
+# negation cues the extractor is compared with the old full-pipeline
+# bag-of-substrings implementation; differences there are expected (longest
+# match, word-start matching) and only reported. (Symptoms, negations and
+# offsets on a labelled corpus are checked in tests/test_symptom_extractor.py.)
+#
+#   cd backend && python -m benchmarks.bench_symptom_extraction
+import time
+import random
+
+import spacy
+
+from symptom_extractor import (
+    SPACY_MODEL, SYMPTOM_KEYWORDS, SYMPTOM_SYNONYMS, SymptomExtractor, load_nlp,
+)
+
+
+# === Reference implementation (before the extractor) ===
+def make_old_extract(nlp):
+    def old_extract_symptoms_from_text(user_input):
+        raw_text = user_input.lower()
+        doc = nlp(raw_text)
+        lemmatized_text = " ".join([token.lemma_ for token in doc])
+        symptoms_found = set()
+        for symptom in SYMPTOM_KEYWORDS:
+            if symptom in lemmatized_text or symptom in raw_text:
+                symptoms_found.add(symptom)
+        for synonym, mapped_symptom in SYMPTOM_SYNONYMS.items():
+            if (synonym in raw_text or synonym in lemmatized_text) and mapped_symptom in SYMPTOM_KEYWORDS:
+                symptoms_found.add(mapped_symptom)
+        return list(symptoms_found)
+    return old_extract_symptoms_from_text
+
+
+HANDWRITTEN = [
+    "", "Hello doctor", "I have had a headache and fever since Monday.",
+    "I've been feeling tired and exhausted, kind of queasy too",
+    "Coughing a lot, coughs at night, sore throat", "throwing up twice, threw up yesterday",
+    "My belly pain gets worse after meals; upset stomach", "Painful joints, painless lump",
+    "Feeling dizzy and lightheaded, blurred sight in one eye", "ITCHY RASH ON ARMS",
+    "breathless on stairs, shortness of breath at rest", "chills and fevers, diarrhoea",
+    "I'm sick of waiting", "Headaches every morning",
+]
+
+
+def build_corpus(seed=0, n_random=2000):
+    rng = random.Random(seed)
+    phrases = SYMPTOM_KEYWORDS + list(SYMPTOM_SYNONYMS)
+    filler = ["i", "have", "had", "a", "my", "since", "and", "bad", "the", "feeling",
+              "very", "yesterday", "doctor", "it", "gets", "worse", "at", "night"]
+    inflect = ["{}", "{}s", "{}ing", "{}ed", "{}y", "{}.", "{},", "({})"]
+    corpus = list(HANDWRITTEN)
+    for _ in range(n_random):
+        words = []
+        for _ in range(rng.randint(1, 20)):
+            if rng.random() < 0.2:
+                words.append(rng.choice(inflect).format(rng.choice(phrases)))
+            else:
+                words.append(rng.choice(filler))
+        text = " ".join(words)
+        corpus.append(text.capitalize() if rng.random() < 0.5 else text)
+    return corpus
+
+
+def timed(fn, corpus, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(corpus)
+        best = min(best, time.perf_counter() - start)
+    return best / len(corpus) * 1e6
+
+
+def main():
+    corpus = build_corpus()
+
+    start = time.perf_counter()
+    full_nlp = spacy.load(SPACY_MODEL)
+    full_load = time.perf_counter() - start
+    start = time.perf_counter()
+    trimmed_nlp = load_nlp()
+    trimmed_load = time.perf_counter() - start
+    print(f"pipeline load: full {full_nlp.pipe_names} {full_load * 1e3:.0f} ms, "
+          f"trimmed {trimmed_nlp.pipe_names} {trimmed_load * 1e3:.0f} ms")
+
+    old = make_old_extract(full_nlp)
+    # Caching disabled so the latency below is the extraction itself
+    extractor = SymptomExtractor(nlp=trimmed_nlp, cache_size=0)
+
+    diffs = [text for text in corpus if set(old(text)) != set(extractor.extract(text))]
+    print(f"{'agrees with the old bag':32} {len(corpus) - len(diffs)}/{len(corpus)}")
+    for text in diffs[:5]:
+        print(f"    {text!r}: {sorted(old(text))} -> {extractor.extract(text)}")
+
+    rows = [
+        ("old (full pipeline + scans)", lambda texts: [old(t) for t in texts]),
+        ("analyze()", lambda texts: [extractor.analyze(t) for t in texts]),
+        ("analyze_many()", lambda texts: list(extractor.analyze_many(texts))),
+    ]
+    base = None
+    for name, fn in rows:
+        us = timed(fn, corpus)
+        base = base or us
+        print(f"{name:32}{us:10.1f}us/text  ({base / us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
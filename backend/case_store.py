@@ -0,0 +1,166 @@
+# case_store.py
+"""
+In-memory store of the virtual-patient cases in cases/.
+
+Every case is parsed and validated once, and its persona preamble (the whole
+patient prompt up to the final "Doctor:" line) is rendered once into an
+immutable string. Building a prompt on the hot path is then a dict lookup
+plus one concatenation, and the prefix is byte-stable per case, which is
+what provider-side context caching keys on.
+
+The directory is re-scanned at most every CASE_RELOAD_INTERVAL seconds;
+only added, changed or deleted files are re-read.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from typing import NamedTuple, Optional, Dict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CASE_DIR = os.path.join(BASE_DIR, "cases")
+CASE_RELOAD_INTERVAL = float(os.getenv("CASE_RELOAD_INTERVAL", "2"))
+
+# Every doctor message is appended after this marker
+DOCTOR_LINE = "Doctor: "
+
+logger = logging.getLogger(__name__)
+
+
+class CaseEntry(NamedTuple):
+    case: dict
+    # Both None when the case lacks the fields the patient persona needs
+    persona: Optional[str]
+    prompt_prefix: Optional[str]
+    fingerprint: tuple
+
+
+def render_persona(case: dict) -> str:
+    """Patient persona and instructions: the part of the prompt that never changes for a case."""
+    p = case["patient_profile"]
+    symptoms = ', '.join(case['symptoms'])
+    med_hist = ', '.join(case['additional_info']['medical_history'])
+    fam_hist = ', '.join(case['additional_info']['family_history'])
+
+    return f"""You are a virtual patient named {p['name']}, age {p['age']}, gender {p['gender']}.
+You are speaking to a doctor during a consultation. Your main complaint is: {p['chief_complaint']}.
+Your symptoms include: {symptoms}.
+Medical History: {med_hist}
+Family History: {fam_hist}
+
+INSTRUCTIONS:
+- Always respond **as the patient**, not as an AI or assistant.
+- Only answer **medical or personal health-related** questions, including:
+  - Your pain, symptoms, medical/family history, or recent changes.
+  - Basic identity and emotional state (name, tell me, how you’re feeling, etc.).
+- **Do NOT** answer questions about science, math, geography, or anything unrelated to your condition.
+  - For those, politely deflect and redirect the conversation to your health.
+- Doctor may use multiple languages for input. You must understand and respond accordingly as a **virtual patient**.
+- Maintain a natural, emotional, and human tone.
+
+"""
+
+
+def render_prompt_prefix(case: dict) -> str:
+    """Patient persona prompt, ending right where the doctor's message goes."""
+    return render_persona(case) + DOCTOR_LINE
+
+
+class CaseStore:
+    def __init__(self, case_dir=CASE_DIR, reload_interval=CASE_RELOAD_INTERVAL):
+        self.case_dir = case_dir
+        self.reload_interval = reload_interval
+        self._entries: Dict[str, CaseEntry] = {}
+        # id(entry.case) -> entry: cases are looked up by the dict get() returned,
+        # since a file's "case_id" field need not match its name
+        self._by_case: Dict[int, CaseEntry] = {}
+        self._next_scan = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self):
+        fingerprints = {}
+        try:
+            with os.scandir(self.case_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json"):
+                        st = entry.stat()
+                        fingerprints[entry.name[:-len(".json")]] = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            logger.warning(f"[CASES] Case directory {self.case_dir} not found")
+        return fingerprints
+
+    def _load(self, case_id, fingerprint) -> Optional[CaseEntry]:
+        path = os.path.join(self.case_dir, f"{case_id}.json")
+        try:
+            with open(path, "r") as f:
+                case = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[CASE INVALID] {path}: {e}")
+            return None
+        try:
+            persona = render_persona(case)
+            prefix = persona + DOCTOR_LINE
+        except (KeyError, TypeError) as e:
+            logger.warning(f"[CASE INVALID] {path}: missing {e} for the patient prompt")
+            persona = prefix = None
+        return CaseEntry(case=case, persona=persona, prompt_prefix=prefix, fingerprint=fingerprint)
+
+    def refresh(self, force=False):
+        # One thread rescans; the others keep reading the current snapshot
+        if not self._lock.acquire(blocking=force or not self._entries):
+            return
+        try:
+            if not force and time.monotonic() < self._next_scan:
+                return
+            current = self._entries
+            entries = {}
+            for case_id, fingerprint in self._scan().items():
+                entry = current.get(case_id)
+                if entry is None or entry.fingerprint != fingerprint:
+                    entry = self._load(case_id, fingerprint)
+                if entry is not None:
+                    entries[case_id] = entry
+            self._entries = entries
+            self._by_case = {id(entry.case): entry for entry in entries.values()}
+            self._next_scan = time.monotonic() + self.reload_interval
+        finally:
+            self._lock.release()
+
+    def _snapshot(self) -> Dict[str, CaseEntry]:
+        if time.monotonic() >= self._next_scan:
+            self.refresh()
+        return self._entries
+
+    def get(self, case_id: str) -> Optional[dict]:
+        """Parsed case (shared between requests: treat it as read-only)."""
+        entry = self._snapshot().get(case_id)
+        return entry.case if entry else None
+
+    def _entry_for(self, case: dict) -> Optional[CaseEntry]:
+        self._snapshot()
+        entry = self._by_case.get(id(case))
+        # `is`: an id can be reused once a replaced case is garbage-collected
+        if entry is not None and entry.case is case and entry.prompt_prefix is not None:
+            return entry
+        return None
+
+    def prompt_prefix(self, case: dict) -> str:
+        entry = self._entry_for(case)
+        return entry.prompt_prefix if entry else render_prompt_prefix(case)
+
+    def persona(self, case: dict) -> str:
+        entry = self._entry_for(case)
+        return entry.persona if entry else render_persona(case)
+
+    def list_cases(self):
+        return [
+            {"id": case_id, "title": entry.case.get("title", "Untitled Case")}
+            for case_id, entry in sorted(self._snapshot().items())
+        ]
+
+    def __len__(self):
+        return len(self._snapshot())
+
+
+case_store = CaseStore()
@@ -0,0 +1,296 @@
+# chat_buffer.py
+"""
+Write-behind buffer for chat messages.
+
+/store_chat and /store_chat/batch append messages here and return; one
+background task writes them with insert_many(ordered=False), as soon as
+CHAT_FLUSH_MAX_DOCS are pending or CHAT_FLUSH_INTERVAL_MS after the oldest
+arrived, so a burst of turns costs one round-trip instead of one each.
+
+- Every message gets its _id when it is buffered, so retrying a batch that
+  partly succeeded is idempotent (duplicate-key errors count as written).
+- A batch that fails with a transient error (network, failover, write
+  concern) stays at the front of the queue and is retried with backoff,
+  for as long as MongoDB is unreachable; messages keep their order. On any
+  other error its messages are inserted one by one. Only those refused for
+  their own content (InvalidDocument, DocumentTooLarge, a validation
+  error) are dead-lettered: appended as extended JSON to
+  CHAT_DEAD_LETTER_PATH and logged, and add(wait=True) raises
+  ChatWriteError for them. A poison message therefore can't hold up the
+  ones behind it, and an outage never empties the buffer into the file.
+- Backpressure: at most CHAT_BUFFER_MAX_DOCS wait in memory. When MongoDB
+  falls behind or is down, add() waits for room and raises BufferFull
+  after CHAT_BUFFER_PUT_TIMEOUT_S (the routes answer 503 with Retry-After).
+- Reads that must see a session's latest messages (/chat_history,
+  /delete_session) call flush() first when that session has pending ones.
+- stop() writes everything still pending before the database is closed,
+  so a graceful shutdown loses nothing.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from collections import deque
+
+from bson import ObjectId, json_util
+from bson.errors import InvalidDocument
+from pymongo.errors import (BulkWriteError, ConnectionFailure, DuplicateKeyError, ExecutionTimeout, WriteConcernError,
+                            WriteError)
+
+from database import database
+
+CHAT_FLUSH_MAX_DOCS = int(os.getenv("CHAT_FLUSH_MAX_DOCS", "200"))
+CHAT_FLUSH_INTERVAL_MS = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", "100"))
+CHAT_BUFFER_MAX_DOCS = int(os.getenv("CHAT_BUFFER_MAX_DOCS", "5000"))
+CHAT_BUFFER_PUT_TIMEOUT_S = float(os.getenv("CHAT_BUFFER_PUT_TIMEOUT_S", "5"))
+CHAT_SHUTDOWN_FLUSH_TIMEOUT_S = float(os.getenv("CHAT_SHUTDOWN_FLUSH_TIMEOUT_S", "30"))
+# Retry delay after a failed batch, doubling up to the max
+CHAT_RETRY_BACKOFF_S = float(os.getenv("CHAT_RETRY_BACKOFF_S", "0.2"))
+CHAT_RETRY_BACKOFF_MAX_S = float(os.getenv("CHAT_RETRY_BACKOFF_MAX_S", "5"))
+# Messages refused for their content; empty to only log them
+CHAT_DEAD_LETTER_PATH = os.getenv("CHAT_DEAD_LETTER_PATH", "chat_dead_letter.ndjson")
+
+DUPLICATE_KEY = 11000
+
+logger = logging.getLogger(__name__)
+
+
+class BufferFull(Exception):
+    pass
+
+
+class ChatWriteError(Exception):
+    """Some of the messages were refused by MongoDB and dead-lettered."""
+
+    def __init__(self, failed: dict):
+        # {_id: error}
+        self.failed = failed
+        super().__init__(f"{len(failed)} chat messages could not be written: {next(iter(failed.values()))}")
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether writing the same batch again may succeed."""
+    if isinstance(error, BulkWriteError):
+        # Per-document write errors are the documents' fault; write concern ones aren't
+        return bool(error.details.get("writeConcernErrors"))
+    if isinstance(error, (ConnectionFailure, WriteConcernError, ExecutionTimeout)):
+        return True
+    if hasattr(error, "has_error_label") and error.has_error_label("RetryableWriteError"):
+        return True
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+def is_document_error(error: Exception) -> bool:
+    """Whether the server (or the encoder) refused this document for its content."""
+    return isinstance(error, (InvalidDocument, WriteError)) and not isinstance(error, DuplicateKeyError)
+
+
+class ChatWriteBuffer:
+    def __init__(self, get_collection, max_batch=CHAT_FLUSH_MAX_DOCS, interval_ms=CHAT_FLUSH_INTERVAL_MS,
+                 max_pending=CHAT_BUFFER_MAX_DOCS, put_timeout=CHAT_BUFFER_PUT_TIMEOUT_S,
+                 dead_letter_path=CHAT_DEAD_LETTER_PATH):
+        # Resolved per flush so the buffer follows database.connect()
+        self.get_collection = get_collection
+        self.max_batch = max_batch
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.dead_letter_path = dead_letter_path or None
+        self.pending = deque()
+        # Sequence numbers: every buffered message gets the next one, and
+        # messages are written in order, so "written" is a single counter.
+        # Entries are (seq, doc, failures): failures is the {_id: error} dict
+        # of a waiting add(), None otherwise.
+        self.added_seq = 0
+        self.written_seq = 0
+        self.counters = {"messages": 0, "written": 0, "batches": 0, "retries": 0, "rejected": 0,
+                         "dead_lettered": 0}
+        self._changed = None
+        self._task = None
+        self._stopping = False
+
+    # === Producers ===
+    async def add(self, docs: list, wait: bool = False) -> list:
+        """
+        Buffer chat documents (an _id is assigned to each); returns their ids.
+
+        Waits for room while the buffer is full and raises BufferFull after
+        put_timeout. With wait=True, returns only once they are written, and
+        raises ChatWriteError if any was dead-lettered instead.
+        """
+        if self._task is None:
+            raise RuntimeError("Chat buffer is not running; call start() first")
+        if len(docs) > self.max_pending:
+            raise ValueError(f"At most {self.max_pending} messages at once")
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: len(self.pending) + len(docs) <= self.max_pending),
+                    self.put_timeout,
+                )
+            except asyncio.TimeoutError:
+                self.counters["rejected"] += len(docs)
+                raise BufferFull(f"{len(self.pending)} chat messages waiting to be written")
+            failures = {} if wait else None
+            for doc in docs:
+                doc.setdefault("_id", ObjectId())
+                self.added_seq += 1
+                self.pending.append((self.added_seq, doc, failures))
+            seq = self.added_seq
+            self.counters["messages"] += len(docs)
+            self._changed.notify_all()
+        if wait:
+            await self.wait_written(seq)
+            if failures:
+                raise ChatWriteError(failures)
+        return [doc["_id"] for doc in docs]
+
+    async def wait_written(self, seq: int):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.written_seq >= seq)
+
+    async def flush(self):
+        """Return once everything buffered so far is written."""
+        await self.wait_written(self.added_seq)
+
+    def has_pending(self, **match) -> bool:
+        """Whether a pending message has all the given field values."""
+        return any(all(doc.get(k) == v for k, v in match.items()) for _, doc, _ in self.pending)
+
+    # === Writer ===
+    async def _next_batch(self) -> list:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.pending or self._stopping)
+            # Give a burst time to fill the batch, unless it is full or we're shutting down
+            deadline = time.monotonic() + self.interval
+            while len(self.pending) < self.max_batch and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: len(self.pending) >= self.max_batch or self._stopping),
+                        remaining,
+                    )
+                except asyncio.TimeoutError:
+                    break
+            n = min(len(self.pending), self.max_batch)
+            # Left in the deque until written: they count against max_pending
+            # and a concurrent has_pending() still sees them
+            return [self.pending[i] for i in range(n)]
+
+    async def _insert(self, docs: list) -> list:
+        """insert_many; returns [(doc, error)] for the documents the server refused."""
+        try:
+            await self.get_collection().insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                raise
+            # Duplicate keys were written by an earlier attempt of this batch
+            return [(docs[err["index"]], err.get("errmsg", str(err.get("code"))))
+                    for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY]
+        return []
+
+    async def _insert_each(self, docs: list) -> list:
+        """
+        Insert one at a time to isolate the documents at fault; returns
+        [(doc, error)]. Any error that isn't about the document itself is
+        raised, and the batch retried as a whole.
+        """
+        rejected = []
+        for doc in docs:
+            try:
+                await self.get_collection().insert_one(doc)
+            except DuplicateKeyError:
+                pass
+            except Exception as e:
+                if not is_document_error(e):
+                    raise
+                rejected.append((doc, repr(e)))
+        return rejected
+
+    def _write_dead_letters(self, rejected: list):
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for doc, error in rejected:
+                f.write(json_util.dumps({"failed_at": datetime.utcnow(), "error": error, "doc": doc}) + "\n")
+
+    async def _dead_letter(self, rejected: list):
+        self.counters["dead_lettered"] += len(rejected)
+        ids = [str(doc.get("_id")) for doc, _ in rejected]
+        logger.error(f"[CHAT] ❌ {len(rejected)} chat messages could not be written ({rejected[0][1]}): {ids}")
+        if self.dead_letter_path:
+            try:
+                await asyncio.to_thread(self._write_dead_letters, rejected)
+            except Exception as e:
+                logger.error(f"[CHAT] ❌ Could not write to {self.dead_letter_path}, messages lost: {e}")
+
+    async def _write(self, docs: list) -> list:
+        """Write a batch; returns [(doc, error)] for the documents refused for their content."""
+        try:
+            return await self._insert(docs)
+        except Exception as e:
+            if is_transient(e):
+                raise
+            logger.warning(f"[CHAT] ⚠️ Writing {len(docs)} messages failed ({e!r}), trying them one by one")
+            return await self._insert_each(docs)
+
+    async def _run(self):
+        backoff = CHAT_RETRY_BACKOFF_S
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                return  # stopping and drained
+            docs = [doc for _, doc, _ in batch]
+            try:
+                rejected = await self._write(docs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Stays at the head of the queue; add() blocks, then refuses, while it does
+                self.counters["retries"] += 1
+                logger.warning(f"[CHAT] ⚠️ Writing {len(batch)} messages failed, retrying in {backoff:.1f}s: {e!r}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, CHAT_RETRY_BACKOFF_MAX_S)
+                continue
+            backoff = CHAT_RETRY_BACKOFF_S
+            if rejected:
+                await self._dead_letter(rejected)
+                # Report them to add() calls waiting on this batch
+                waiting = {id(doc): failures for _, doc, failures in batch if failures is not None}
+                for doc, error in rejected:
+                    if id(doc) in waiting:
+                        waiting[id(doc)][doc["_id"]] = error
+            async with self._changed:
+                for _ in batch:
+                    self.pending.popleft()
+                self.written_seq = batch[-1][0]
+                self.counters["written"] += len(batch) - len(rejected)
+                self.counters["batches"] += 1
+                self._changed.notify_all()
+
+    def start(self):
+        self._changed = asyncio.Condition()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout=CHAT_SHUTDOWN_FLUSH_TIMEOUT_S):
+        """Write everything still buffered, then stop the writer."""
+        if self._task is None:
+            return
+        async with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.error(f"[CHAT] ❌ Shutdown flush timed out; {len(self.pending)} chat messages not written")
+        self._task = None
+        logger.info(f"[CHAT] Buffer stopped: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": len(self.pending), "running": self._task is not None}
+
+
+chat_buffer = ChatWriteBuffer(lambda: database.chats)
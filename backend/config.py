@@ -157,6 +157,15 @@ INTENTS = [
     "irrelevant"           # Non-medical queries
 ]
 
+# ==== General Knowledge Blocking Keywords ====
+GENERAL_KNOWLEDGE_TOPICS = [
+    "newton", "physics", "math", "formula", "president", "country",
+    "earth", "space", "galaxy", "ai", "machine learning"
+]
+
+# ==== Small-talk Phrases ====
+IRRELEVANT_PHRASES = ["hello", "hi", "how are you", "what is your name", "who are you"]
+
 # ==== Rejection Message ====
 REJECTION_MESSAGE = (
     "⚠️ I'm here to assist with **medical education and training** only. "
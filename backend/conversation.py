@@ -0,0 +1,153 @@
+# conversation.py
+"""
+Server-side memory for multi-turn /chat sessions.
+
+Each session keeps a rolling window of its most recent turns plus a
+compressed summary of everything older. Prompts are assembled as
+
+    persona prefix + summary + recent turns + "Doctor: <message>"
+
+and the history part is capped at CHAT_TOKEN_BUDGET (estimated) tokens, so
+prompt size and LLM latency stay flat however long a session runs. State is
+cached in memory and persisted as one document per session in the chat
+history collection (kind = "conversation_state").
+"""
+import os
+import time
+import logging
+
+from cache import TTLCache
+from case_store import case_store, DOCTOR_LINE
+from database import database
+
+# Tokens available to summary + recent turns (the persona is not counted)
+CHAT_TOKEN_BUDGET = int(os.getenv("CHAT_TOKEN_BUDGET", "1200"))
+# Share of the budget the summary of older turns may use
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+# Recent doctor/patient exchanges kept verbatim (if they fit the budget)
+CHAT_RECENT_EXCHANGES = int(os.getenv("CHAT_RECENT_EXCHANGES", "6"))
+CHAT_MEMORY_CACHE_SIZE = int(os.getenv("CHAT_MEMORY_CACHE_SIZE", "2048"))
+CHAT_MEMORY_CACHE_TTL = float(os.getenv("CHAT_MEMORY_CACHE_TTL", "3600"))
+
+STATE_KIND = "conversation_state"
+SPEAKERS = {"doctor": "Doctor", "patient": "Patient"}
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English; no tokenizer needed for a budget
+    return len(text) // 4 + 1
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+class ConversationState:
+    def __init__(self, session_id, case_id, summary=None, turns=None):
+        self.session_id = session_id
+        self.case_id = case_id
+        # Compressed one-liners for exchanges that left the window, oldest first
+        self.summary = summary or []
+        # Recent turns, oldest first: {"role": "doctor" | "patient", "content": str}
+        self.turns = turns or []
+
+    def to_document(self) -> dict:
+        return {
+            "session_id": self.session_id,
+            "kind": STATE_KIND,
+            "case_id": self.case_id,
+            "summary": self.summary,
+            "turns": self.turns,
+            "updated_at": time.time(),
+        }
+
+    @classmethod
+    def from_document(cls, doc):
+        return cls(doc["session_id"], doc.get("case_id"), doc.get("summary"), doc.get("turns"))
+
+
+def summarize_exchange(doctor: str, patient: str) -> str:
+    """Extractive compression of one exchange into a single short line."""
+    return f"- Doctor asked: {_clip(doctor, 80)} / You said: {_clip(patient, 120)}"
+
+
+def render_history(state: ConversationState) -> str:
+    parts = []
+    if state.summary:
+        parts.append("Earlier in this consultation (summary):\n" + "\n".join(state.summary) + "\n\n")
+    if state.turns:
+        parts.append("Conversation so far:\n" + "\n".join(
+            f"{SPEAKERS[t['role']]}: {t['content']}" for t in state.turns
+        ) + "\n\n")
+    return "".join(parts)
+
+
+def build_prompt(case: dict, state: ConversationState, user_input: str) -> str:
+    return (case_store.persona(case) + render_history(state) + DOCTOR_LINE + user_input).rstrip()
+
+
+def compact(state: ConversationState, budget=CHAT_TOKEN_BUDGET, summary_budget=CHAT_SUMMARY_TOKENS,
+            recent_exchanges=CHAT_RECENT_EXCHANGES):
+    """Fold the oldest exchanges into the summary until the history fits the budget."""
+    def turns_tokens():
+        return sum(estimate_tokens(t["content"]) + 2 for t in state.turns)
+
+    while state.turns and (
+        len(state.turns) > 2 * recent_exchanges
+        or turns_tokens() + sum(estimate_tokens(line) for line in state.summary) > budget
+    ):
+        doctor = state.turns.pop(0)
+        patient = state.turns.pop(0) if state.turns and state.turns[0]["role"] == "patient" else {"content": ""}
+        state.summary.append(summarize_exchange(doctor["content"], patient["content"]))
+        # The summary itself is bounded too: the oldest lines go first
+        while len(state.summary) > 1 and sum(estimate_tokens(line) for line in state.summary) > summary_budget:
+            state.summary.pop(0)
+
+
+class ConversationMemory:
+    def __init__(self, get_collection):
+        # Called on use: the collection only exists once the database is connected
+        self.get_collection = get_collection
+        self.cache = TTLCache(maxsize=CHAT_MEMORY_CACHE_SIZE, ttl=CHAT_MEMORY_CACHE_TTL)
+
+    async def load(self, session_id: str, case_id: str) -> ConversationState:
+        state = self.cache.get(session_id)
+        if state is not None and state.case_id == case_id:
+            return state
+        try:
+            doc = await self.get_collection().find_one({"session_id": session_id, "kind": STATE_KIND})
+        except Exception as e:
+            logger.warning(f"[CHAT MEMORY] Could not load session {session_id}: {e}")
+            doc = None
+        if doc is not None and doc.get("case_id") == case_id:
+            state = ConversationState.from_document(doc)
+        else:
+            state = ConversationState(session_id, case_id)
+        self.cache.set(session_id, state)
+        return state
+
+    async def record(self, state: ConversationState, doctor_message: str, patient_reply: str):
+        state.turns.append({"role": "doctor", "content": doctor_message})
+        state.turns.append({"role": "patient", "content": patient_reply})
+        compact(state)
+        self.cache.set(state.session_id, state)
+        try:
+            await self.get_collection().update_one(
+                {"session_id": state.session_id, "kind": STATE_KIND},
+                {"$set": state.to_document()},
+                upsert=True,
+            )
+        except Exception as e:
+            logger.warning(f"[CHAT MEMORY] Could not save session {state.session_id}: {e}")
+
+    async def forget(self, session_id: str):
+        """Drop a session's memory, cached and stored (on /delete_session)."""
+        self.cache.pop(session_id)
+        await self.get_collection().delete_many({"session_id": session_id, "kind": STATE_KIND})
+
+
+# Multi-turn /chat memory, persisted next to the chat history
+conversation_memory = ConversationMemory(lambda: database.chats)
@@ -0,0 +1,111 @@
+# database.py
+"""
+MongoDB access for the API, on motor (asyncio).
+
+One AsyncIOMotorClient per process, with its connection pool and timeouts
+taken from the environment. The FastAPI lifespan calls connect() before
+serving and close() on shutdown; routes reach collections through the
+module-level `database` (database.users, database.chats, ...).
+
+Tests and local runs can use an in-process stand-in instead of a server:
+either MONGO_URI=mongomock:// (needs the mongomock-motor package) or
+database.connect(client=<any motor-compatible client>).
+
+Batch jobs (extract_symptoms.py) that don't run an event loop use
+sync_database(), a plain pymongo handle with the same settings.
+"""
+import os
+import logging
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_DB = os.getenv("MONGO_DB", "meditrain")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+# How long a request waits for a free pooled connection before failing
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+FAKE_URI_SCHEME = "mongomock://"
+
+# Collection names
+USERS = "users"
+CHATS = "chat_history"
+SESSIONS = "chat_sessions"
+REPORT_JOBS = "report_jobs"
+
+logger = logging.getLogger(__name__)
+
+
+def client_options() -> dict:
+    return {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    }
+
+
+class Database:
+    def __init__(self):
+        self.client = None
+        self.db = None
+
+    def connect(self, uri=MONGO_URI, db_name=MONGO_DB, client=None):
+        """Create the client (no I/O happens until the first operation)."""
+        if client is None:
+            if uri.startswith(FAKE_URI_SCHEME):
+                from mongomock_motor import AsyncMongoMockClient
+                client = AsyncMongoMockClient()
+            else:
+                from motor.motor_asyncio import AsyncIOMotorClient
+                client = AsyncIOMotorClient(uri, **client_options())
+        self.client = client
+        self.db = client[db_name]
+        logger.info(f"[DB] Using database {db_name!r} (pool up to {MONGO_MAX_POOL_SIZE} connections)")
+
+    async def ping(self):
+        await self.client.admin.command("ping")
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = self.db = None
+
+    def collection(self, name):
+        if self.db is None:
+            raise RuntimeError("Database is not connected; call database.connect() first")
+        return self.db[name]
+
+    @property
+    def users(self):
+        return self.collection(USERS)
+
+    @property
+    def chats(self):
+        return self.collection(CHATS)
+
+    @property
+    def sessions(self):
+        return self.collection(SESSIONS)
+
+    @property
+    def report_jobs(self):
+        return self.collection(REPORT_JOBS)
+
+
+database = Database()
+
+
+def sync_database(uri=MONGO_URI, db_name=MONGO_DB):
+    """Blocking pymongo handle with the same settings, for scripts."""
+    if uri.startswith(FAKE_URI_SCHEME):
+        import mongomock
+        return mongomock.MongoClient()[db_name]
+    from pymongo import MongoClient
+    return MongoClient(uri, **client_options())[db_name]
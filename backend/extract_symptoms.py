@@ -0,0 +1,87 @@
+# extract_symptoms.py
+# Bulk symptom extraction, NDJSON in / NDJSON out (same format as
+# POST /extract_symptoms/batch), or in place over chat_history:
+#
+#   python extract_symptoms.py messages.ndjson > symptoms.ndjson
+#   cat messages.ndjson | python extract_symptoms.py --n-process 4
+#   python extract_symptoms.py --from-chats          # tag untagged chat messages
+import sys
+import argparse
+import logging
+from collections import deque
+
+from symptom_extractor import (
+    SYMPTOM_BATCH_SIZE, SYMPTOM_N_PROCESS, symptom_extractor, read_ndjson_texts, ndjson_results,
+)
+
+# Updates per bulk_write when tagging chat_history in place
+WRITE_BATCH_SIZE = 1000
+
+
+def extract_file(path, out, batch_size, n_process):
+    source = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        for chunk in ndjson_results(read_ndjson_texts(source), batch_size=batch_size, n_process=n_process):
+            out.write(chunk)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+def tag_chats(batch_size, n_process, retag=False):
+    """Store symptoms and spans on chat_history messages, as store_chat does (untagged ones unless retag)."""
+    from pymongo import UpdateOne
+    from database import CHATS, sync_database
+
+    chat_collection = sync_database()[CHATS]
+
+    query = {"message": {"$type": "string"}}
+    if not retag:
+        query["symptom_spans"] = {"$exists": False}
+    cursor = chat_collection.find(query, {"message": 1}, batch_size=batch_size)
+    # nlp.pipe reads ahead, so ids queue up until their result comes out
+    ids = deque()
+
+    def messages():
+        for doc in cursor:
+            ids.append(doc["_id"])
+            yield doc["message"]
+
+    ops, tagged = [], 0
+    for analysis in symptom_extractor.analyze_many(messages(), batch_size, n_process):
+        update = {"symptoms": analysis["symptoms"], "symptom_spans": analysis["spans"]}
+        ops.append(UpdateOne({"_id": ids.popleft()}, {"$set": update}))
+        if len(ops) >= WRITE_BATCH_SIZE:
+            chat_collection.bulk_write(ops, ordered=False)
+            tagged += len(ops)
+            ops = []
+            logging.info(f"[SYMPTOMS] Tagged {tagged} messages")
+    if ops:
+        chat_collection.bulk_write(ops, ordered=False)
+        tagged += len(ops)
+    logging.info(f"[SYMPTOMS] Done: {tagged} messages tagged")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract symptoms from many messages at once.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help='NDJSON file of strings or {"id", "text"} objects (default: stdin)')
+    parser.add_argument("--batch-size", type=int, default=SYMPTOM_BATCH_SIZE,
+                        help="texts per nlp.pipe batch")
+    parser.add_argument("--n-process", type=int, default=SYMPTOM_N_PROCESS,
+                        help="spaCy worker processes (-1: one per core)")
+    parser.add_argument("--from-chats", action="store_true",
+                        help="read chat_history from MongoDB and store symptoms/symptom_spans on each message")
+    parser.add_argument("--retag", action="store_true",
+                        help="with --from-chats, also redo messages that already have symptoms")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.from_chats:
+        tag_chats(args.batch_size, args.n_process, retag=args.retag)
+    else:
+        extract_file(args.input, sys.stdout, args.batch_size, args.n_process)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# indexes.py
+"""
+MongoDB indexes for the hot query shapes, created at startup.
+
+Each index mirrors one query shape, equality fields first, then the sort
+key (followed by _id, the keyset pagination tie-breaker, see pagination.py):
+
+  chat_history   {user_email, session_id} sorted by timestamp  /chat_history, /delete_session
+                 {session_id, kind}                            conversation memory, /delete_session
+                 {email}                                       main.get_sessions
+  chat_sessions  {email, case_id} sorted by created_at desc    /sessions?case_id=
+                 {email} sorted by created_at desc             /sessions
+                 {email, session_id}                           /update_session, /delete_session
+  users          {email} (unique)                              /register, /login
+  report_jobs    {status} sorted by created_at                 unfinished jobs at startup (report_jobs.py)
+                 {expires_at} (TTL)                            drops finished jobs after their retention
+
+create_indexes() is a no-op for indexes that already exist with the same
+keys and options, so this runs on every start. A failure (e.g. duplicate emails blocking
+the unique index) is logged and leaves the other indexes in place.
+"""
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from database import CHATS, SESSIONS, USERS, REPORT_JOBS
+
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    CHATS: [
+        IndexModel([("user_email", ASCENDING), ("session_id", ASCENDING), ("timestamp", ASCENDING),
+                    ("_id", ASCENDING)], name="user_session_time_id"),
+        IndexModel([("session_id", ASCENDING), ("kind", ASCENDING)], name="session_kind"),
+        # Only legacy documents carry "email"; sparse keeps the index small
+        IndexModel([("email", ASCENDING)], name="email", sparse=True),
+    ],
+    SESSIONS: [
+        IndexModel([("email", ASCENDING), ("case_id", ASCENDING), ("created_at", DESCENDING),
+                    ("_id", DESCENDING)], name="email_case_created_id"),
+        IndexModel([("email", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+                   name="email_created_id"),
+        IndexModel([("email", ASCENDING), ("session_id", ASCENDING)], name="email_session"),
+    ],
+    USERS: [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    REPORT_JOBS: [
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created"),
+        # Unfinished jobs have no expires_at and are never removed
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Fields each route returns; everything else stays on the server
+CHAT_HISTORY_FIELDS = {"role": 1, "message": 1, "symptoms": 1, "symptom_spans": 1, "timestamp": 1}
+SESSION_FIELDS = {"session_id": 1, "email": 1, "case_id": 1, "session_name": 1, "created_at": 1}
+LOGIN_FIELDS = {"_id": 0, "username": 1, "password": 1}
+
+
+async def ensure_indexes(db, indexes=INDEXES):
+    """Create every declared index; returns {collection: [index names]}."""
+    created = {}
+    for collection, models in indexes.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except Exception as e:
+            logger.warning(f"[DB] Could not create indexes on {collection}: {e}")
+    logger.info(f"[DB] Indexes in place: {created}")
+    return created
+
+
+def ensure_indexes_sync(db, indexes=INDEXES):
+    """Same as ensure_indexes() for a pymongo database (scripts, benchmarks)."""
+    created = {}
+    for collection, models in indexes.items():
+        try:
+            created[collection] = db[collection].create_indexes(models)
+        except Exception as e:
+            logger.warning(f"[DB] Could not create indexes on {collection}: {e}")
+    return created
@@ -0,0 +1,120 @@
+# keyword_matcher.py
+"""
+Single-pass multi-keyword matching (Aho–Corasick) for the message filters.
+
+All keyword lists from config.py are compiled once, at import, into one
+automaton with a dense transition table, so checking a message against
+every list is one linear walk over its characters instead of one `in`
+scan or regex search per keyword.
+
+Two matching modes reproduce the checks this replaces exactly:
+  - substring (default): same as `keyword in text`
+  - word_boundary=True:  same as re.search(rf'\\b{re.escape(keyword)}\\b', text)
+Keywords are matched verbatim (case-sensitive), as before.
+"""
+from collections import deque
+
+from config import (
+    ALLOWED_KEYWORDS, BANNED_TOPICS, BANNED_SENTENCES,
+    GENERAL_KNOWLEDGE_TOPICS, IRRELEVANT_PHRASES,
+)
+
+
+def _is_word(ch: str) -> bool:
+    # What `\b` considers a word character for str patterns
+    return ch.isalnum() or ch == "_"
+
+
+class KeywordMatcher:
+    def __init__(self, categories: dict):
+        """`categories` maps a category name to its list of keywords."""
+        self.names = list(categories)
+        goto = [{}]
+        # Per state: keywords ending here, as (category bit, length, first char is word, last char is word)
+        outputs = [[]]
+        for bit_index, name in enumerate(self.names):
+            bit = 1 << bit_index
+            for keyword in categories[name]:
+                if not keyword:
+                    continue
+                state = 0
+                for ch in keyword:
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        outputs.append([])
+                    state = nxt
+                outputs[state].append((bit, len(keyword), _is_word(keyword[0]), _is_word(keyword[-1])))
+
+        # Breadth-first failure links, folded into a complete transition
+        # table so the scan never has to follow a failure chain. A state's
+        # failure target is shallower, hence already complete when reached.
+        fail = [0] * len(goto)
+        delta = [dict(edges) for edges in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            target = fail[state]
+            outputs[state] = outputs[state] + outputs[target]
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[target].get(ch, 0)
+                queue.append(nxt)
+            for ch, nxt in delta[target].items():
+                delta[state].setdefault(ch, nxt)
+
+        self._delta = delta
+        self._outputs = [tuple(out) for out in outputs]
+        self._masks = [0] * len(outputs)
+        for state, out in enumerate(outputs):
+            for bit, _, _, _ in out:
+                self._masks[state] |= bit
+        self._names_by_mask = {}
+
+    def __len__(self):
+        return len(self._delta)
+
+    def scan(self, text: str, word_boundary=False) -> int:
+        """Bitmask of the categories with at least one keyword in `text`."""
+        delta = self._delta
+        state = 0
+        found = 0
+        if not word_boundary:
+            masks = self._masks
+            for ch in text:
+                state = delta[state].get(ch, 0)
+                found |= masks[state]
+            return found
+
+        outputs = self._outputs
+        last = len(text) - 1
+        for i, ch in enumerate(text):
+            state = delta[state].get(ch, 0)
+            for bit, length, first_is_word, last_is_word in outputs[state]:
+                if found & bit:
+                    continue
+                start = i - length + 1
+                before = _is_word(text[start - 1]) if start > 0 else False
+                after = _is_word(text[i + 1]) if i < last else False
+                if before != first_is_word and after != last_is_word:
+                    found |= bit
+        return found
+
+    def matched(self, text: str, word_boundary=False) -> frozenset:
+        """Names of the categories with at least one keyword in `text`."""
+        mask = self.scan(text, word_boundary)
+        names = self._names_by_mask.get(mask)
+        if names is None:
+            names = frozenset(name for i, name in enumerate(self.names) if mask >> i & 1)
+            self._names_by_mask[mask] = names
+        return names
+
+
+MESSAGE_FILTER = KeywordMatcher({
+    "banned_sentence": BANNED_SENTENCES,
+    "banned_topic": BANNED_TOPICS,
+    "allowed": ALLOWED_KEYWORDS,
+    "general_knowledge": GENERAL_KNOWLEDGE_TOPICS,
+    "irrelevant": IRRELEVANT_PHRASES,
+})
@@ -0,0 +1,264 @@
+# llm_client.py
+"""
+Async access to the LLM for every route that needs one.
+
+Requests go through a shared `LLMClient` that caps how many completions are
+in flight at once (LLM_MAX_IN_FLIGHT), applies a per-request timeout
+(LLM_TIMEOUT) and never blocks the event loop. The backend is chosen with
+LLM_BACKEND: "gemini" (default) or "fake", a local stand-in that needs no
+network and is meant for load tests and offline development.
+"""
+import os
+import asyncio
+import logging
+import threading
+
+from dotenv import load_dotenv
+
+from cache import ResponseCache
+
+load_dotenv()
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MODEL_NAME = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+# Response cache for deterministic prompts (/extract, /generate_report).
+# LLM_CACHE_DB enables the on-disk SQLite tier; leave it empty for memory only.
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")
+LLM_CACHE_DB_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DB_MAX_ENTRIES", "100000"))
+# Simulated completion time of the fake backend, in seconds
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.5"))
+# Delay between streamed chunks of the fake backend, in seconds
+FAKE_LLM_TOKEN_DELAY = float(os.getenv("FAKE_LLM_TOKEN_DELAY", "0.05"))
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+# === Backends ===
+class GeminiBackend:
+    name = "gemini"
+
+    def __init__(self, model_name=LLM_MODEL_NAME, api_key=None):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._model.generate_content_async(prompt)
+        return response.text.strip()
+
+    async def stream(self, prompt: str):
+        response = await self._model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend:
+    """Answers after `latency` seconds without touching the network."""
+    name = "fake"
+
+    def __init__(self, model_name="fake-llm", latency=FAKE_LLM_LATENCY, token_delay=FAKE_LLM_TOKEN_DELAY):
+        self.model_name = model_name
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def _reply(self, prompt: str) -> str:
+        last_line = prompt.strip().splitlines()[-1] if prompt.strip() else ""
+        return f"[fake reply] {last_line[:200]}"
+
+    async def generate(self, prompt: str) -> str:
+        await asyncio.sleep(self.latency)
+        return self._reply(prompt)
+
+    async def stream(self, prompt: str):
+        for i, word in enumerate(self._reply(prompt).split(" ")):
+            await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else " " + word
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "fake": FakeBackend,
+}
+
+
+# === Client ===
+class LLMClient:
+    def __init__(self, backend, max_in_flight=LLM_MAX_IN_FLIGHT, timeout=LLM_TIMEOUT, cache=None):
+        self.backend = backend
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.cache = cache
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.model_name
+
+    async def generate(self, prompt: str, timeout=None) -> str:
+        """Complete `prompt`, raising LLMTimeout / LLMError on failure."""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        timeout = timeout or self.timeout
+        try:
+            reply = await asyncio.wait_for(self.backend.generate(prompt), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise LLMTimeout(f"LLM did not answer within {timeout}s")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            raise LLMError(str(e)) from e
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+        self.completed += 1
+        return reply
+
+    async def generate_cached(self, prompt: str, namespace: str, timeout=None) -> str:
+        """
+        Like generate(), but serve repeated prompts from the response cache.
+
+        Only use for prompts whose answer may be reused verbatim. `namespace`
+        (usually the endpoint name) only affects the hit/miss metrics.
+        """
+        if self.cache is None:
+            return await self.generate(prompt, timeout)
+        key = ResponseCache.key(self.model_name, prompt)
+        # The SQLite tier does blocking I/O, keep it off the event loop
+        if self.cache.disk is not None:
+            reply = await asyncio.to_thread(self.cache.get, namespace, key)
+        else:
+            reply = self.cache.get(namespace, key)
+        if reply is not None:
+            return reply
+        reply = await self.generate(prompt, timeout)
+        if self.cache.disk is not None:
+            await asyncio.to_thread(self.cache.set, key, reply)
+        else:
+            self.cache.set(key, reply)
+        return reply
+
+    async def stream(self, prompt: str, timeout=None):
+        """
+        Yield the completion of `prompt` chunk by chunk as the model produces it.
+
+        The in-flight slot is held until the stream ends; `timeout` bounds the
+        wait for each chunk rather than the whole completion.
+        """
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        timeout = timeout or self.timeout
+        chunks = self.backend.stream(prompt).__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    raise LLMTimeout(f"LLM stream stalled for {timeout}s")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    raise LLMError(str(e)) from e
+                yield chunk
+        finally:
+            await chunks.aclose()
+            self.in_flight -= 1
+            self._semaphore.release()
+        self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "model": self.model_name,
+            "max_in_flight": self.max_in_flight,
+            "timeout": self.timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+
+_client = None
+# The startup warm-up thread and the first request may race to create it
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                backend_cls = BACKENDS.get(LLM_BACKEND)
+                if backend_cls is None:
+                    raise ValueError(f"Unknown LLM_BACKEND {LLM_BACKEND!r}, expected one of {sorted(BACKENDS)}")
+                cache = ResponseCache(
+                    maxsize=LLM_CACHE_SIZE,
+                    ttl=LLM_CACHE_TTL,
+                    db_path=LLM_CACHE_DB or None,
+                    db_max_entries=LLM_CACHE_DB_MAX_ENTRIES,
+                )
+                _client = LLMClient(backend_cls(), cache=cache)
+                logger.info(
+                    f"[LLM] Using {LLM_BACKEND} backend ({_client.model_name}), max {LLM_MAX_IN_FLIGHT} in flight"
+                )
+    return _client
+
+
+async def run_until_disconnect(request, awaitable, poll_interval=0.25):
+    """
+    Await `awaitable`, cancelling it as soon as the HTTP client disconnects.
+
+    Raises ClientDisconnected in that case, so no paid completion keeps
+    running for a response nobody will read.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
@@ -1,26 +1,90 @@
 # main.py
-from fastapi import FastAPI, Query, UploadFile, File, Form
+from startup import Startup  # first, so the import-time measurement covers everything below
+from fastapi import FastAPI, Query, UploadFile, File, Form, Request, Response, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import pandas as pd
-from sklearn.metrics import accuracy_score
+from pydantic import BaseModel, Field, ValidationError
+from fastapi.concurrency import run_in_threadpool
+from typing import Optional
+from contextlib import asynccontextmanager
 from auth import *
 # Local imports
 from config import *
 from utils import *
 from auth import router as auth_router
-from ml_model import predict_diagnosis
+from llm_client import get_llm_client, run_until_disconnect, ClientDisconnected, LLMError
+from case_store import case_store
+from database import database
+from chat_buffer import chat_buffer
+from report_jobs import report_jobs, job_view, JobQueueFull, REPORT_JOB_POLL_S, QUEUED, RUNNING
+from asr import get_asr, ASRError, ASRBusy, ASRTimeout, NoSpeech
+from audio import preprocess, UnsupportedAudio
+from speech_stream import SpeechSession
+from indexes import ensure_indexes
+from conversation import ConversationState, build_prompt, conversation_memory
+from ml_model import predict_diagnosis, predict_diagnosis_batch, model_registry
+from symptom_extractor import symptom_extractor, read_ndjson_texts, ndjson_results
 from utils import accuracy_score as similarity_score
+import asyncio
 import logging
+import time
 # from fastapi import UploadFile, File
-import speech_recognition as sr
-from io import BytesIO
-import wave
-from fastapi.responses import JSONResponse
-from report_generator import generate_medical_report
+from fastapi.responses import JSONResponse, StreamingResponse
+from report_generator import get_report_renderer, report_fields, report_key, iter_chunks
+
+# === Startup ===
+startup = Startup()
+
+@startup.component("diagnosis_model")
+def load_diagnosis_model():
+    # Load the model once so the first /predict_diagnosis request isn't a cold one
+    model_registry.refresh(force=True)
+
+@startup.component("symptom_extractor")
+def load_symptom_extractor():
+    symptom_extractor.warm_up()
+
+@startup.component("cases")
+def load_cases():
+    case_store.refresh(force=True)
+
+@startup.component("llm_client")
+def load_llm_client():
+    get_llm_client()
+
+@startup.component("asr", required=False)
+def load_asr():
+    get_asr().warm_up()
+
+@startup.component("report_workers", required=False)
+def load_report_workers():
+    get_report_renderer().warm_up()
+
+@startup.component("database")
+async def ping_database():
+    await database.ping()
+
+@startup.component("indexes", required=False)
+async def create_indexes():
+    await ensure_indexes(database.db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if database.client is None:
+        database.connect()
+    chat_buffer.start()
+    report_jobs.start()
+    startup.start()
+    yield
+    await startup.stop()
+    # Write buffered chat messages while the database is still open
+    await chat_buffer.stop()
+    await report_jobs.stop()
+    get_asr().shutdown()
+    get_report_renderer().shutdown()
+    database.close()
 
 # === App Initialization ===
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # === CORS Configuration ===
 app.add_middleware(
@@ -34,31 +98,27 @@ app.add_middleware(
 # === Routers ===
 app.include_router(auth_router)
 
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody is listening any more; 499 only shows up in the access log
+    return Response(status_code=499)
+
+async def llm_reply(request: Request, prompt: str, cache_namespace: str = None) -> str:
+    """
+    Await an LLM completion off the event loop, cancelled on client disconnect.
+
+    With `cache_namespace`, identical prompts are answered from the response cache.
+    """
+    client = get_llm_client()
+    if cache_namespace:
+        completion = client.generate_cached(prompt, cache_namespace)
+    else:
+        completion = client.generate(prompt)
+    return await run_until_disconnect(request, completion)
+
 # === Startup Log ===
 print("🚀 Starting FastAPI backend at http://127.0.0.1:8000")
 
-# === General Knowledge Blocking Keywords ===
-GENERAL_KNOWLEDGE_TOPICS = [
-    "newton", "physics", "math", "formula", "president", "country",
-    "earth", "space", "galaxy", "ai", "machine learning"
-]
-
-# === Message Filtering ===
-def is_general_knowledge_question(text: str) -> bool:
-    return any(topic in text.lower() for topic in GENERAL_KNOWLEDGE_TOPICS)
-
-def is_irrelevant_message(message: str) -> bool:
-    banned = ["hello", "hi", "how are you", "what is your name", "who are you"]
-    return any(phrase in message.lower() for phrase in banned)
-
-def is_medical_input(user_input: str) -> bool:
-    input_lower = user_input.lower()
-    return (
-        not any(sentence in input_lower for sentence in BANNED_SENTENCES) and
-        not any(word in input_lower for word in BANNED_TOPICS) and
-        any(keyword in input_lower for keyword in ALLOWED_KEYWORDS)
-    )
-
 def calculate_accuracy(predicted: str, actual: str) -> float:
     similarity = similarity_score(predicted, actual)
     # return round(accuracy_score(predicted, actual), 2)
@@ -74,43 +134,186 @@ def root():
 def deployment_status():
     return {"message": "Render Deployment Active"}
 
+@app.get("/health/live", tags=["Health"])
+def liveness():
+    # The process is up and serving; says nothing about dependencies
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["Health"])
+def readiness():
+    return JSONResponse(startup.info(), status_code=200 if startup.ready else 503)
+
+@app.get("/health/chat_buffer", tags=["Health"])
+def chat_buffer_health():
+    return chat_buffer.stats()
+
+@app.get("/health/asr", tags=["Health"])
+def asr_health():
+    return get_asr().stats()
+
+@app.get("/health/reports", tags=["Health"])
+def reports_health():
+    return get_report_renderer().stats()
+
+@app.get("/health/report_jobs", tags=["Health"])
+def report_jobs_health():
+    return report_jobs.stats()
+
+@app.get("/health/model", tags=["ML"])
+def model_health():
+    return model_registry.info()
+
+@app.get("/health/llm", tags=["LLM"])
+def llm_health():
+    return get_llm_client().stats()
+
 class SymptomInput(BaseModel):
     text: str
 
 @app.post("/extract_symptoms")
 def get_extracted_symptoms(symptom_input: SymptomInput):
-    extracted = extract_symptoms_from_text(symptom_input.text)
-    return {"symptoms": extracted}
+    # {"symptoms": [...], "spans": [{start, end, text, symptom, synonym, negated}, ...]}
+    return symptom_extractor.analyze(symptom_input.text)
+
+class SymptomBatchInput(BaseModel):
+    texts: list[str]
+
+# Upper bound per request; larger backfills should use extract_symptoms.py
+SYMPTOM_BATCH_MAX_TEXTS = int(os.getenv("SYMPTOM_BATCH_MAX_TEXTS", "100000"))
+
+@app.post("/extract_symptoms/batch")
+async def get_extracted_symptoms_batch(request: Request):
+    """
+    Bulk symptom extraction. Accepts {"texts": [...]} or, with
+    Content-Type: application/x-ndjson, one JSON string or {"id", "text"}
+    object per line. Streams back NDJSON results in input order.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            records = list(read_ndjson_texts(body.splitlines()))
+        else:
+            records = [(None, text) for text in SymptomBatchInput.model_validate_json(body).texts]
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(records) > SYMPTOM_BATCH_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {SYMPTOM_BATCH_MAX_TEXTS} texts per request")
+    # Sync generator: Starlette iterates it in the threadpool, off the event loop
+    return StreamingResponse(ndjson_results(records), media_type="application/x-ndjson")
 
 class ChatRequest(BaseModel):
     case_id: str
     user_message: str
+    # With a session id the patient remembers earlier turns of the consultation
+    session_id: Optional[str] = None
 
-@app.post("/chat", tags=["LLM"])
-async def chat_with_patient(data: ChatRequest):
+CHAT_ERROR_REPLY = "Sorry, I couldn't process that right now."
+
+def prepare_patient_turn(data: ChatRequest, state: ConversationState = None):
     """
-    Handles doctor-patient chat interaction using LLM.
+    Validate a doctor message for the virtual patient.
+
+    Returns (prompt, None) when the LLM should answer, or (None, reply)
+    with a canned reply when it shouldn't be called at all. With a
+    conversation `state`, the prompt includes the session history.
     """
     case = load_case(data.case_id)
     if not case:
-        return {"reply": "Case not found."}
+        return None, "Case not found."
 
     user_msg = data.user_message.strip()
     if user_msg in ["Could not understand audio", ""]:
-        return {"reply": "Sorry, I couldn't hear you clearly. Could you please repeat that?"}
-    
+        return None, "Sorry, I couldn't hear you clearly. Could you please repeat that?"
+
     if not user_msg:
-        return {"reply": case.get("intro_message", "Hello doctor, I'm not feeling well.")}
+        return None, case.get("intro_message", "Hello doctor, I'm not feeling well.")
 
     if is_general_knowledge_question(user_msg):
-        return {"reply": "I'm not sure about that, Doctor. Can we talk about my health instead?"}
+        return None, "I'm not sure about that, Doctor. Can we talk about my health instead?"
+
+    if state is not None:
+        return build_prompt(case, state, user_msg), None
+    return generate_prompt(case, user_msg), None
+
+async def load_conversation(data: ChatRequest):
+    if not data.session_id:
+        return None
+    return await conversation_memory.load(data.session_id, data.case_id)
+
+@app.post("/chat", tags=["LLM"])
+async def chat_with_patient(data: ChatRequest, request: Request):
+    """
+    Handles doctor-patient chat interaction using LLM.
+    """
+    return {"reply": await patient_turn(data, lambda prompt: llm_reply(request, prompt))}
+
+async def patient_turn(data: ChatRequest, complete) -> str:
+    """The patient's reply to one doctor message; `complete(prompt)` awaits the LLM."""
+    state = await load_conversation(data)
+    prompt, reply = prepare_patient_turn(data, state)
+    if prompt is None:
+        return reply
 
-    prompt = generate_prompt(case, user_msg)
     try:
-        reply = call_llm(prompt)
-    except Exception as e:
-        reply = "Sorry, I couldn't process that right now."
-    return {"reply": reply}
+        reply = await complete(prompt)
+    except LLMError as e:
+        logging.warning(f"[LLM ERROR] {e}")
+        return CHAT_ERROR_REPLY
+    if state is not None:
+        await conversation_memory.record(state, data.user_message.strip(), reply)
+    return reply
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream", tags=["LLM"])
+async def chat_with_patient_stream(data: ChatRequest):
+    """
+    Same as /chat, but streams the reply as Server-Sent Events.
+
+    Emits `token` events ({"text": ...}) while the model generates, then one
+    `done` event with the full reply and timings: ttft_ms (time to first
+    token) and total_ms. A failed completion ends with an `error` event.
+    """
+    state = await load_conversation(data)
+    prompt, canned_reply = prepare_patient_turn(data, state)
+
+    async def events():
+        start = time.perf_counter()
+        if prompt is None:
+            yield sse_event("token", {"text": canned_reply})
+            yield sse_event("done", {"reply": canned_reply, "ttft_ms": 0.0, "total_ms": 0.0, "chunks": 1})
+            return
+
+        parts, ttft_ms = [], None
+        try:
+            async for chunk in get_llm_client().stream(prompt):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                parts.append(chunk)
+                yield sse_event("token", {"text": chunk})
+        except LLMError as e:
+            logging.warning(f"[LLM ERROR] {e}")
+            yield sse_event("error", {"reply": CHAT_ERROR_REPLY})
+            return
+        reply = "".join(parts).strip()
+        if state is not None:
+            await conversation_memory.record(state, data.user_message.strip(), reply)
+        yield sse_event("done", {
+            "reply": reply,
+            "ttft_ms": round(ttft_ms or 0.0, 1),
+            "total_ms": round((time.perf_counter() - start) * 1000, 1),
+            "chunks": len(parts),
+        })
+
+    # Starlette cancels the generator (and with it the LLM stream) on disconnect
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 class ChatInput(BaseModel):
     message: str
@@ -155,23 +358,55 @@ class ReportInput(BaseModel):
     duration: str = "unknown"
 
 @app.post("/generate_report")
-def create_report(input: ReportInput):
-    report = generate_diagnosis_report(
+async def create_report(input: ReportInput, request: Request):
+    prompt = diagnosis_report_prompt(
         input.name, input.age, input.gender,
         input.symptoms, input.diagnosis, input.duration
     )
+    try:
+        report = await llm_reply(request, prompt, cache_namespace="generate_report")
+    except LLMError as e:
+        report = f"❌ Error generating report: {str(e)}"
     return {"report": report}
 
+@app.post("/generate_report/jobs", status_code=202, tags=["LLM"])
+async def submit_report_job(input: ReportInput, response: Response):
+    """
+    Queue the same report as /generate_report and return at once with its
+    job id; poll GET /generate_report/jobs/{job_id} for the result.
+    """
+    prompt = diagnosis_report_prompt(
+        input.name, input.age, input.gender,
+        input.symptoms, input.diagnosis, input.duration
+    )
+    try:
+        job_id, deduplicated = await report_jobs.submit(input.model_dump(), prompt)
+    except JobQueueFull as e:
+        logging.warning(f"[REPORT] {e}")
+        raise HTTPException(status_code=503, detail="Too many reports in progress, retry shortly",
+                            headers={"Retry-After": str(REPORT_JOB_POLL_S)})
+    response.headers["Location"] = f"/generate_report/jobs/{job_id}"
+    return {"job_id": job_id, "deduplicated": deduplicated}
+
+@app.get("/generate_report/jobs/{job_id}", tags=["LLM"])
+async def get_report_job(job_id: str, response: Response):
+    doc = await report_jobs.get(job_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if doc["status"] in (QUEUED, RUNNING):
+        response.headers["Retry-After"] = str(REPORT_JOB_POLL_S)
+    return job_view(doc)
+
 class ExtractRequest(BaseModel):
     conversation: str
 
 @app.post("/extract")
-def extract_diagnosis_treatment(data: ExtractRequest):
-    prompt = (
-        f"From the following conversation, extract diagnosis and treatment:\n"
-        f"{data.conversation}\n\nFormat:\nDiagnosis: <...>\nTreatment: <...>"
-    )
-    llm_response = call_llm(prompt)
+async def extract_diagnosis_treatment(data: ExtractRequest, request: Request):
+    try:
+        llm_response = await llm_reply(request, extraction_prompt(data.conversation), cache_namespace="extract")
+    except LLMError as e:
+        logging.warning(f"[LLM ERROR] {e}")
+        llm_response = LLM_ERROR_REPLY
     diagnosis, treatment = extract_diagnosis_and_treatment(llm_response)
     return {"diagnosis": diagnosis, "treatment": treatment}
 
@@ -185,9 +420,29 @@ def get_prediction(input: DiagnosisInput):
     diagnosis = predict_diagnosis(input.symptoms, input.age, input.gender)
     return {"diagnosis": diagnosis}
 
+# Upper bound per request; the whole batch is scored in one call
+PREDICT_BATCH_MAX_ITEMS = int(os.getenv("PREDICT_BATCH_MAX_ITEMS", "1000"))
+
+class BatchDiagnosisInput(BaseModel):
+    # 1..PREDICT_BATCH_MAX_ITEMS patients; larger lists are rejected with 422
+    items: list[DiagnosisInput] = Field(..., min_length=1, max_length=PREDICT_BATCH_MAX_ITEMS)
+    top_k: int = Field(3, ge=1, le=10)
+
+@app.post("/predict_diagnosis_batch", tags=["ML"])
+def get_batch_prediction(input: BatchDiagnosisInput):
+    results = predict_diagnosis_batch(
+        [(item.symptoms, item.age, item.gender) for item in input.items],
+        top_k=input.top_k,
+    )
+    return {"results": results}
+
 @app.get("/get_sessions", tags=["Chat History"])
-def get_sessions(email: str = Query(...)):
-    sessions = chat_collection.find({"email": email})
+async def get_sessions(email: str = Query(...)):
+    # Only the fields returned below, and only the last message of each
+    sessions = await database.chats.find(
+        {"email": email},
+        {"case_id": 1, "timestamp": 1, "messages": {"$slice": -1}},
+    ).to_list(None)
     return [
         {
             "session_id": str(session["_id"]),
@@ -207,50 +462,99 @@ def redirect_docs():
 
 @app.post("/speech-to-text")
 async def speech_to_text(audio_file: UploadFile = File(...)):
+    """
+    Transcribe an uploaded recording (WAV, FLAC, OGG or AIFF).
+
+    The audio is downmixed, resampled to the recognizer's rate and trimmed
+    to the speech before recognition (audio.py); `audio` in the response
+    describes the upload and the seconds actually sent to the recognizer.
+    """
     audio_data = await audio_file.read()
-    print(audio_data[:50])  # Print first 100 bytes for debugging
-    # logging.info(f"Received audio file: {audio_file.filename}, size: {len(audio_data)} bytes")
-    recognizer = sr.Recognizer()
-    print("Initializing speech recognition...")
-    print(recognizer)
+    logging.info(f"[ASR] Received {audio_file.filename!r}, {len(audio_data)} bytes")
+    asr = get_asr()
     try:
-        print("Converting audio to text...")
-        # Convert bytes to wav file in memory
-        with BytesIO(audio_data) as wav_buffer:
-            # with wave.open(wav_buffer, 'rb') as wav_file:
-            with sr.AudioFile(wav_buffer) as source:
-                audio = recognizer.record(source)
-                print("Audio recorded successfully.", audio)
-                text = recognizer.recognize_google(audio)
-                print("Speech recognition completed.", text)
-        return {"text": text}
-    except sr.UnknownValueError:
+        clip, info = await run_in_threadpool(preprocess, audio_data, asr.backend.sample_rate)
+        if clip is None:
+            raise NoSpeech()
+        text = await asr.transcribe(clip)
+    except UnsupportedAudio as e:
+        return JSONResponse({"text": f"Error: {e}"}, status_code=415)
+    except ValueError as e:
+        return JSONResponse({"text": f"Error: {e}"}, status_code=400)
+    except NoSpeech:
         return {"text": "Could not understand audio"}
-    except Exception as e:
-        return {"text": f"Error: {e}"}
+    except ASRBusy as e:
+        return JSONResponse({"text": f"Error: {e}"}, status_code=503, headers={"Retry-After": "1"})
+    except ASRTimeout as e:
+        return JSONResponse({"text": f"Error: {e}"}, status_code=504)
+    except ASRError as e:
+        logging.warning(f"[ASR ERROR] {e}")
+        return JSONResponse({"text": f"Error: {e}"}, status_code=502)
+    return {"text": text, "audio": info}
+
+@app.websocket("/ws/speech")
+async def speech_websocket(websocket: WebSocket, sample_rate: int = 16000,
+                           case_id: Optional[str] = None, session_id: Optional[str] = None):
+    """
+    Streaming speech-to-text.
+
+    The client sends binary frames of 16-bit little-endian mono PCM at
+    `sample_rate` as it records, and the text frame {"type": "end"} when it
+    stops. The server sends JSON events: speech_start, partial (interim
+    transcript of the utterance so far), final (per utterance, after the
+    speaker pauses), error, and done once everything is decoded. With
+    `case_id` (and optionally `session_id`), each final transcript goes
+    straight to the /chat pipeline and the patient's answer follows as a
+    reply event.
+    """
+    await websocket.accept()
+    if not 8000 <= sample_rate <= 48000:
+        await websocket.close(code=1003, reason="sample_rate must be 8000-48000")
+        return
 
+    async def send(message: dict):
+        await websocket.send_json(message)
 
-#
+    async def answer(text: str, utterance: int):
+        data = ChatRequest(case_id=case_id, user_message=text, session_id=session_id)
+        reply = await patient_turn(data, get_llm_client().generate)
+        await send({"type": "reply", "utterance": utterance, "reply": reply})
+
+    session = SpeechSession(get_asr(), sample_rate, send, on_final=answer if case_id else None)
+    await send({"type": "ready", "sample_rate": sample_rate})
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                await session.feed(message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    control = {}
+                if control.get("type") == "end":
+                    break
+                await send({"type": "error", "detail": 'Expected PCM bytes or {"type": "end"}'})
+        await session.finish()
+        await send({"type": "done", "utterances": session.utterances})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.close()
 
 @app.get("/cases")
 def get_cases():
     try:
-        files = os.listdir("cases")  # path relative to main.py
-        cases_list = []
-        for f in files:
-            if f.endswith(".json"):
-                with open(os.path.join("cases", f), "r") as file:
-                    case_data = json.load(file)
-                    cases_list.append({
-                        "id": f.replace(".json", ""),
-                        "title": case_data.get("title", "Untitled Case")
-                    })
-        return JSONResponse(content=cases_list)
+        return JSONResponse(content=case_store.list_cases())
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=500)
 
-@app.post("/generate_report")
-def generate_report_endpoint(
+@app.post("/generate_report/pdf")
+async def generate_report_pdf(
+    request: Request,
     session_id: str = Form(...),
     patient_name: str = Form(...),
     symptoms: str = Form(...),  # comma-separated
@@ -258,19 +562,34 @@ def generate_report_endpoint(
     treatment: str = Form(...),
     remarks: str = Form(...)
 ):
-    file_path = generate_medical_report(
-        session_id,
-        patient_name,
-        symptoms.split(","),
-        diagnosis,
-        treatment,
-        remarks
-    )
-    return {"status": "success", "file_path": file_path}
+    """
+    The report as a PDF download, rendered in the report worker pool and
+    cached by content (report_generator.py). The ETag is the content key:
+    send it back as If-None-Match to get a 304 instead of the file.
+    """
+    fields = report_fields(session_id, patient_name, symptoms.split(","), diagnosis, treatment, remarks)
+    etag = f'"{report_key(fields)}"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=86400"}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    try:
+        pdf = await get_report_renderer().get(fields)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Rendering the report timed out")
+    filename = "".join(c for c in f"report_{session_id}" if c.isalnum() or c in "_-") + ".pdf"
+    headers.update({
+        "Content-Length": str(len(pdf)),
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    })
+    return StreamingResponse(iter_chunks(pdf), media_type="application/pdf", headers=headers)
 
 
 @app.post("/doctor-chat")
-async def doctor_chat(input: dict):
+async def doctor_chat(input: dict, request: Request):
     user_msg = input.get("message", "")
-    reply = call_llm(user_msg)  # Use Gemini/GPT/OpenAI/Gemini API
+    try:
+        reply = await llm_reply(request, user_msg)
+    except LLMError as e:
+        logging.warning(f"[LLM ERROR] {e}")
+        reply = LLM_ERROR_REPLY
     return {"reply": reply}
@@ -1,12 +1,19 @@
 
 import os
+import io
 import json
-import pandas as pd
-from sklearn.preprocessing import MultiLabelBinarizer
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report
+import time
+import hashlib
+import logging
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
 import joblib
+from tree_ensemble import FlatForest, export_forest, forest_path_for
+from cache import TTLCache
 
 # Define base directory and file paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -15,31 +22,103 @@ MODEL_PATH = os.path.join(BASE_DIR, "diagnosis_model.pkl")
 ENCODER_PATH = os.path.join(BASE_DIR, "symptom_encoder.pkl")
 METRICS_PATH = os.path.join(BASE_DIR, "model_metrics.json")
 
+# How often (seconds) the registry re-stats the pickles to pick up a retrained model
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+# Bounds of the (symptoms, age, gender) -> diagnosis cache
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+# Parsed case features, refreshed only for new or changed case files
+CASE_FEATURES_CACHE = os.path.join(BASE_DIR, "case_features.cache")
+# Every training run is written to its own directory under here
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+
+CASE_COLUMNS = ["file", "mtime_ns", "size", "age", "gender", "symptoms", "diagnosis"]
+
+
+def _parse_case_file(path):
+    """Read one case file into a feature row (runs in worker processes)."""
+    st = os.stat(path)
+    try:
+        with open(path, "r") as f:
+            case = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"[CASE SKIPPED] {path}: {e}")
+        case = {}
+    patient = case.get("patient_profile", {})
+    return {
+        "file": os.path.basename(path),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "age": patient.get("age"),
+        "gender": patient.get("gender"),
+        "symptoms": case.get("symptoms", []),
+        "diagnosis": case.get("correct_diagnosis"),
+    }
+
+
+def _write_atomic(path, dump):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    dump(tmp_path)
+    os.replace(tmp_path, path)
+
+
 # Load all cases from the folder
-def load_case_data():
-    data = []
-    for file in os.listdir(CASE_FOLDER):
-        if file.endswith(".json"):
-            with open(os.path.join(CASE_FOLDER, file), "r") as f:
-                case = json.load(f)
-
-                patient = case.get("patient_profile", {})
-                age = patient.get("age")
-                gender = patient.get("gender")
-                symptoms = case.get("symptoms", [])
-                diagnosis = case.get("correct_diagnosis")
-
-                if age is not None and gender is not None and diagnosis is not None:
-                    data.append({
-                        "age": age,
-                        "gender": gender,
-                        "symptoms": symptoms,
-                        "diagnosis": diagnosis
-                    })
-    return pd.DataFrame(data)
+def load_case_data(workers=None, cache_path=CASE_FEATURES_CACHE):
+    """
+    Return one row per valid case in CASE_FOLDER.
+
+    Case files are parsed by a pool of `workers` processes (default: one per
+    core). Parsed rows are kept in `cache_path` together with each file's
+    mtime/size, so later runs only parse files that are new or changed.
+    Pass cache_path=None to always parse everything.
+    """
+    # Training-only dependencies are imported here, not at module import:
+    # the API process only needs them if it unpickles a model
+    import pandas as pd
+
+    files = sorted(f for f in os.listdir(CASE_FOLDER) if f.endswith(".json"))
+
+    cached = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            cached = {row["file"]: row for row in joblib.load(cache_path).to_dict("records")}
+        except Exception as e:
+            logger.warning(f"[CASE CACHE] Ignoring unreadable {cache_path}: {e}")
+
+    rows, stale = [], []
+    for file in files:
+        st = os.stat(os.path.join(CASE_FOLDER, file))
+        row = cached.get(file)
+        if row is not None and row["mtime_ns"] == st.st_mtime_ns and row["size"] == st.st_size:
+            rows.append(row)
+        else:
+            stale.append(os.path.join(CASE_FOLDER, file))
+
+    if stale:
+        if len(stale) == 1 or workers == 1:
+            rows.extend(map(_parse_case_file, stale))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(stale) // ((workers or os.cpu_count() or 1) * 4))
+                rows.extend(pool.map(_parse_case_file, stale, chunksize=chunksize))
+
+    all_rows = pd.DataFrame(rows, columns=CASE_COLUMNS).sort_values("file", ignore_index=True)
+    if cache_path and (stale or len(cached) != len(files)):
+        _write_atomic(cache_path, lambda tmp: joblib.dump(all_rows, tmp))
+    logger.info(f"[CASES] {len(files)} case files, {len(stale)} parsed, {len(files) - len(stale)} from cache")
+
+    valid = all_rows["age"].notna() & all_rows["gender"].notna() & all_rows["diagnosis"].notna()
+    return all_rows.loc[valid, ["age", "gender", "symptoms", "diagnosis"]].reset_index(drop=True)
 
 # Preprocess the data for ML model
 def preprocess_data(df):
+    import pandas as pd
+    from sklearn.preprocessing import MultiLabelBinarizer
+
     df["gender"] = df["gender"].map({"male": 0, "female": 1})
     df = df.dropna(subset=["gender"])
 
@@ -48,55 +127,331 @@ def preprocess_data(df):
     symptoms_df = pd.DataFrame(symptoms_encoded, columns=mlb.classes_)
 
     X = pd.concat([df[["age", "gender"]].reset_index(drop=True), symptoms_df], axis=1)
-    y = df["diagnosis"]
+    y = df["diagnosis"].reset_index(drop=True)
 
     return X, y, mlb
 
 # Train and save the model and encoder
-def train_model():
-    df = load_case_data()
+def train_model(n_jobs=-1, workers=None, cache_path=CASE_FEATURES_CACHE, models_dir=MODELS_DIR, promote=True):
+    """
+    Train on every case and write a versioned model directory.
+
+    Model, encoder, flat forest and metrics are written to a temporary
+    directory under `models_dir` that is renamed into place once complete.
+    With `promote`, the new files then atomically replace MODEL_PATH,
+    ENCODER_PATH and METRICS_PATH, where the running registry picks them up.
+    Returns the version directory, or None when there is no data.
+    """
+    from sklearn.model_selection import train_test_split
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import classification_report
+
+    df = load_case_data(workers=workers, cache_path=cache_path)
     if df.empty:
         print("❌ No valid case data found.")
-        return
+        return None
 
     X, y, mlb = preprocess_data(df)
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
     model.fit(X_train, y_train)
+    # Training parallelism shouldn't leak into inference
+    model.n_jobs = None
 
     y_pred = model.predict(X_test)
     report = classification_report(y_test, y_pred, output_dict=True)
-    with open(METRICS_PATH, "w") as f:
+
+    os.makedirs(models_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=models_dir)
+    tmp_model_path = os.path.join(tmp_dir, os.path.basename(MODEL_PATH))
+    joblib.dump(model, tmp_model_path)
+    joblib.dump(mlb, os.path.join(tmp_dir, os.path.basename(ENCODER_PATH)))
+    with open(os.path.join(tmp_dir, os.path.basename(METRICS_PATH)), "w") as f:
         json.dump(report, f, indent=2)
+    with open(tmp_model_path, "rb") as f:
+        model_sha = hashlib.sha256(f.read()).hexdigest()
+    export_forest(model, tmp_model_path, model_sha)
+
+    version = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{model_sha[:8]}"
+    version_dir = os.path.join(models_dir, version)
+    os.rename(tmp_dir, version_dir)
+
+    if promote:
+        # The encoder goes first: the registry validates the model's feature
+        # names against it, so a half-promoted pair is rejected, never served.
+        for target in (ENCODER_PATH, forest_path_for(MODEL_PATH), METRICS_PATH, MODEL_PATH):
+            source = os.path.join(version_dir, os.path.basename(target))
+            _write_atomic(target, lambda tmp: shutil.copyfile(source, tmp))
+
+    print(f"✅ Model trained and saved to {version_dir}. Metrics saved to model_metrics.json.")
+    return version_dir
+
+# === Model Registry ===
+@dataclass(frozen=True)
+class LoadedModel:
+    model: object
+    mlb: object
+    version: str
+    loaded_at: float
+    # symptom name -> column in the feature matrix (after "age" and "gender")
+    symptom_index: dict
+    n_features: int
+    # Flat-array copy of the forest used for inference (see tree_ensemble.py)
+    forest: FlatForest
+
+
+FEATURE_PREFIX = ["age", "gender"]
+GENDER_CODES = {"male": 0, "female": 1}
+
+
+def _file_fingerprint(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the diagnosis model and symptom encoder.
+
+    The pickles are loaded once and kept resident. Every `reload_interval`
+    seconds a request re-stats the files; if their mtime/size changed, the
+    content hash is recomputed and, when it differs, a new `LoadedModel` is
+    loaded and swapped in with a single reference assignment. Callers always
+    see a consistent (model, encoder, version) snapshot.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, encoder_path=ENCODER_PATH,
+                 reload_interval=MODEL_RELOAD_INTERVAL):
+        self.model_path = model_path
+        self.encoder_path = encoder_path
+        self.reload_interval = reload_interval
+        self._current = None
+        self._fingerprint = None
+        self._next_check = 0.0
+        self._reloads = 0
+        self._last_error = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def get(self) -> LoadedModel:
+        current = self._current
+        if current is None or time.monotonic() >= self._next_check:
+            self.refresh()
+            current = self._current
+        if current is None:
+            raise FileNotFoundError("Model or encoder file not found. Train the model first.")
+        return current
+
+    def refresh(self, force=False) -> bool:
+        """Reload the pickles if they changed on disk. Returns True on swap."""
+        # Only one thread checks the disk; the others keep serving the
+        # current snapshot instead of queueing behind the reload.
+        if not self._lock.acquire(blocking=self._current is None or force):
+            return False
+        try:
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                fingerprint = (_file_fingerprint(self.model_path), _file_fingerprint(self.encoder_path))
+            except FileNotFoundError:
+                if self._current is None:
+                    raise FileNotFoundError("Model or encoder file not found. Train the model first.")
+                logger.warning("[MODEL] Model files disappeared, keeping version %s", self._current.version)
+                return False
+            if not force and fingerprint == self._fingerprint:
+                return False
+
+            with open(self.model_path, "rb") as f:
+                model_bytes = f.read()
+            with open(self.encoder_path, "rb") as f:
+                encoder_bytes = f.read()
+            model_sha = hashlib.sha256(model_bytes).hexdigest()
+            digest = hashlib.sha256(model_bytes)
+            digest.update(encoder_bytes)
+            version = digest.hexdigest()[:12]
+            self._fingerprint = fingerprint
+            if self._current is not None and self._current.version == version and not force:
+                return False
+
+            try:
+                model = joblib.load(io.BytesIO(model_bytes))
+                mlb = joblib.load(io.BytesIO(encoder_bytes))
+                feature_names = FEATURE_PREFIX + list(mlb.classes_)
+                expected = len(feature_names)
+                if getattr(model, "n_features_in_", expected) != expected:
+                    raise ValueError(
+                        f"model expects {model.n_features_in_} features, encoder provides {expected}"
+                    )
+                trained_names = getattr(model, "feature_names_in_", None)
+                if trained_names is not None:
+                    if list(trained_names) != feature_names:
+                        raise ValueError("model feature order does not match the encoder classes")
+                    # Column order is verified once here, so inference can pass
+                    # plain arrays without sklearn's per-call name check.
+                    del model.feature_names_in_
+                forest = self._load_forest(model, model_sha)
+            except Exception as e:
+                # Typically a half-written retrain; try again on the next check.
+                self._fingerprint = None
+                self._last_error = str(e)
+                logger.warning("[MODEL] Failed to load version %s: %s", version, e)
+                if self._current is None:
+                    raise
+                return False
+
+            self._current = LoadedModel(
+                model=model,
+                mlb=mlb,
+                version=version,
+                loaded_at=time.time(),
+                symptom_index={s: i + len(FEATURE_PREFIX) for i, s in enumerate(mlb.classes_)},
+                n_features=expected,
+                forest=forest,
+            )
+            self._reloads += 1
+            self._last_error = None
+            logger.info("[MODEL] Loaded diagnosis model version %s", version)
+            for listener in self._listeners:
+                listener(self._current)
+            return True
+        finally:
+            self._lock.release()
+
+    def add_listener(self, callback):
+        """Call `callback(loaded_model)` after every successful swap."""
+        self._listeners.append(callback)
+
+    def _load_forest(self, model, model_sha):
+        path = forest_path_for(self.model_path)
+        if os.path.exists(path):
+            forest = FlatForest.load(path)
+            if forest.model_sha == model_sha:
+                return forest
+            logger.warning("[MODEL] %s was exported from another model, rebuilding it", path)
+        # No usable export on disk: flattening in memory only takes a moment
+        return FlatForest.from_model(model, model_sha=model_sha)
+
+    def info(self) -> dict:
+        current = self._current
+        return {
+            "loaded": current is not None,
+            "version": current.version if current else None,
+            "loaded_at": current.loaded_at if current else None,
+            "classes": [str(c) for c in current.model.classes_] if current else [],
+            "n_symptoms": len(current.mlb.classes_) if current else 0,
+            "forest_trees": current.forest.n_trees if current else 0,
+            "reloads": self._reloads,
+            "last_error": self._last_error,
+            "prediction_cache": prediction_cache.stats(),
+        }
+
+
+model_registry = ModelRegistry()
+
+# Recent predictions, keyed by model version + canonical input. Entries of an
+# old version can't be hit again, so the whole cache is dropped on swap.
+prediction_cache = TTLCache(maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+model_registry.add_listener(lambda loaded: prediction_cache.clear())
+
+def _encode_rows(loaded, items):
+    """
+    Build one float32 feature matrix for a list of (symptoms, age, gender).
+
+    Returns (X, valid, errors): X holds only the valid rows, `valid` maps
+    them back to item positions and `errors` maps item position -> message.
+    """
+    index = loaded.symptom_index
+    valid, errors = [], {}
+    ages, genders, rows, cols = [], [], [], []
+    for i, (symptoms, age, gender) in enumerate(items):
+        gender_val = GENDER_CODES.get(gender.lower())
+        if gender_val is None:
+            errors[i] = "Gender must be 'male' or 'female'"
+            continue
+        columns = {index[s] for s in symptoms if s in index}
+        if not columns:
+            errors[i] = "❌ None of the symptoms are recognized from the training data."
+            continue
+        row = len(valid)
+        valid.append(i)
+        ages.append(age)
+        genders.append(gender_val)
+        rows.extend([row] * len(columns))
+        cols.extend(columns)
+
+    X = np.zeros((len(valid), loaded.n_features), dtype=np.float32)
+    if valid:
+        X[:, 0] = ages
+        X[:, 1] = genders
+        X[rows, cols] = 1.0
+    return X, valid, errors
+
+
+def predict_diagnosis_batch(items, top_k=3):
+    """
+    Score many (symptoms, age, gender) inputs with a single predict_proba call.
+
+    Every item gets a result dict in input order: either `diagnosis` plus the
+    `top_k` most probable classes, or an `error` for rows that can't be scored.
+    """
+    loaded = model_registry.get()
+    X, valid, errors = _encode_rows(loaded, items)
+
+    results = [{"index": i, "error": errors.get(i)} for i in range(len(items))]
+    if valid:
+        classes = loaded.forest.classes
+        proba = loaded.forest.predict_proba(X)
+        # Stable sort keeps argmax tie-breaking identical to model.predict
+        order = np.argsort(-proba, axis=1, kind="stable")[:, :max(top_k, 1)]
+        for row, i in enumerate(valid):
+            ranked = order[row]
+            results[i] = {
+                "index": i,
+                "diagnosis": str(classes[ranked[0]]),
+                "top_k": [
+                    {"diagnosis": str(classes[c]), "probability": float(proba[row, c])}
+                    for c in ranked[:top_k]
+                ],
+            }
+    return results
+
+
+_row_buffers = threading.local()
+
+
+def _row_buffer(loaded):
+    # One preallocated (1, n_features) row per thread and model version;
+    # sync routes run in FastAPI's threadpool, so it can't be shared.
+    cached = getattr(_row_buffers, "entry", None)
+    if cached is None or cached[0] != loaded.version:
+        cached = (loaded.version, np.zeros((1, loaded.n_features), dtype=np.float32))
+        _row_buffers.entry = cached
+    return cached[1]
 
-    joblib.dump(model, MODEL_PATH)
-    joblib.dump(mlb, ENCODER_PATH)
-    print("✅ Model trained and saved successfully. Metrics saved to model_metrics.json.")
 
 # Predict diagnosis from new input
 def predict_diagnosis(symptoms, age, gender):
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(ENCODER_PATH):
-        raise FileNotFoundError("Model or encoder file not found. Train the model first.")
+    loaded = model_registry.get()
 
-    model = joblib.load(MODEL_PATH)
-    mlb = joblib.load(ENCODER_PATH)
-
-    if gender.lower() not in ["male", "female"]:
+    gender_val = GENDER_CODES.get(gender.lower())
+    if gender_val is None:
         raise ValueError("Gender must be 'male' or 'female'")
 
-    gender_val = 0 if gender.lower() == "male" else 1
-
-    known_symptoms = set(mlb.classes_)
-    filtered_symptoms = [s for s in symptoms if s in known_symptoms]
-    if not filtered_symptoms:
+    index = loaded.symptom_index
+    columns = sorted({index[s] for s in symptoms if s in index})
+    if not columns:
         raise ValueError("❌ None of the symptoms are recognized from the training data.")
 
-    symptoms_vector = mlb.transform([filtered_symptoms])
-
-    input_df = pd.DataFrame(
-        [[age, gender_val] + list(symptoms_vector[0])],
-        columns=["age", "gender"] + list(mlb.classes_)
-    )
+    key = (loaded.version, tuple(columns), age, gender_val)
+    diagnosis = prediction_cache.get(key)
+    if diagnosis is not None:
+        return diagnosis
 
-    return model.predict(input_df)[0]
+    row = _row_buffer(loaded)
+    row.fill(0.0)
+    row[0, 0] = age
+    row[0, 1] = gender_val
+    row[0, columns] = 1.0
+    diagnosis = loaded.forest.predict(row)[0]
+    prediction_cache.set(key, diagnosis)
+    return diagnosis
@@ -0,0 +1,103 @@
+# pagination.py
+"""
+Keyset pagination and NDJSON streaming over MongoDB cursors.
+
+Pages are ordered by (sort field, _id), and `after` is an opaque token
+holding the last item's pair, so fetching the next page is one range
+query on the index, however deep the page:
+
+    {"$or": [{field: {"$gt": v}}, {field: v, "_id": {"$gt": id}}]}
+
+($lt for descending order). Unlike skip/limit, a page never re-reads the
+documents before it, and inserts between requests don't shift pages.
+"""
+import json
+import base64
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from pymongo import ASCENDING
+
+# Upper bound for ?limit= on paginated routes
+MAX_PAGE_SIZE = 1000
+# Documents per write on NDJSON streams (and per cursor batch)
+STREAM_CHUNK_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, _id) -> str:
+    if isinstance(value, datetime):
+        value = {"$date": value.isoformat()}
+    raw = json.dumps([value, str(_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """(sort value, ObjectId) from an `after` token."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, _id = json.loads(raw)
+        if isinstance(value, dict):
+            value = datetime.fromisoformat(value["$date"])
+        return value, ObjectId(_id)
+    except (ValueError, TypeError, KeyError, InvalidId) as e:
+        raise InvalidCursor(f"Invalid pagination cursor: {e}")
+
+
+def keyset_filter(field: str, direction: int, after):
+    """Extra query clause selecting the documents that come after `after` = (value, _id)."""
+    value, _id = after
+    op = "$gt" if direction == ASCENDING else "$lt"
+    if value is None:
+        # Missing values sort first: after them come the documents that have one
+        if direction == ASCENDING:
+            return {"$or": [{field: None, "_id": {op: _id}}, {field: {"$ne": None}}]}
+        return {field: None, "_id": {op: _id}}
+    return {"$or": [{field: {op: value}}, {field: value, "_id": {op: _id}}]}
+
+
+def page_query(query: dict, field: str, direction: int, after_token: str = None) -> dict:
+    if not after_token:
+        return query
+    return {"$and": [query, keyset_filter(field, direction, decode_cursor(after_token))]}
+
+
+def sort_spec(field: str, direction: int):
+    return [(field, direction), ("_id", direction)]
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def ndjson_line(doc: dict) -> str:
+    return json.dumps(doc, default=json_default) + "\n"
+
+
+async def ndjson_stream(cursor, transform, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield NDJSON for every document of a motor cursor as it arrives.
+
+    `transform` (sync or async) turns a document into the dict to send. At
+    most one chunk of documents is held in memory, whatever the total.
+    """
+    lines = []
+    async for doc in cursor.batch_size(chunk_size):
+        item = transform(doc)
+        if hasattr(item, "__await__"):
+            item = await item
+        lines.append(ndjson_line(item))
+        if len(lines) >= chunk_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
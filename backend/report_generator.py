@@ -1,41 +1,250 @@
 # report_generator.py
-from fpdf import FPDF
-from datetime import datetime
+"""
+PDF medical reports, rendered off the event loop and cached by content.
+
+Rendering (FPDF, CPU-bound) runs in a pool of REPORT_WORKERS processes.
+Each worker imports FPDF and loads the font metrics once, when it starts,
+so a report only pays for its own layout. Finished PDFs are
+content-addressed: the key is a SHA-256 of the report fields, so
+identical requests share one render. That includes concurrent ones, which
+wait for the same in-flight job. The key doubles as the ETag, so a client
+revalidating with If-None-Match gets a 304 without anything being rendered.
+
+PDFs are kept in an in-memory LRU (REPORT_CACHE_SIZE) and, with
+REPORT_CACHE_DIR set, also as <key>.pdf files that survive restarts.
+"""
 import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import TTLCache
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", "")
+REPORT_TIMEOUT = float(os.getenv("REPORT_TIMEOUT", "30"))
+# Bytes per chunk of a streamed PDF response
+REPORT_CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+# === Rendering (runs in the worker processes) ===
+_pdf_class = None
+
+
+def _latin1(text) -> str:
+    # The core PDF fonts only cover Latin-1
+    return str(text).encode("latin-1", "replace").decode("latin-1")
 
-class MedicalReportPDF(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 14)
-        self.cell(0, 10, 'Medical Diagnosis Report', ln=True, align='C')
-        self.ln(10)
 
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', align='C')
+def _init_worker():
+    """Per-worker setup: import FPDF, build the layout class, load font metrics."""
+    global _pdf_class
+    from fpdf import FPDF
 
-def generate_medical_report(session_id, patient_name, symptoms, diagnosis, treatment, remarks):
-    pdf = MedicalReportPDF()
+    class MedicalReportPDF(FPDF):
+        def header(self):
+            self.set_font('Arial', 'B', 14)
+            self.cell(0, 10, 'Medical Diagnosis Report', ln=True, align='C')
+            self.ln(10)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Page {self.page_no()}', align='C')
+
+    _pdf_class = MedicalReportPDF
+    # The first set_font() of each style loads its metrics; do it now, not on a request
+    warm = MedicalReportPDF()
+    warm.add_page()
+    for style in ('', 'B', 'I'):
+        warm.set_font('Arial', style, 12)
+
+
+def render_report(fields: dict) -> bytes:
+    """PDF bytes for one report (see report_fields())."""
+    if _pdf_class is None:
+        _init_worker()
+    pdf = _pdf_class()
     pdf.add_page()
 
     pdf.set_font('Arial', '', 12)
-    date = datetime.now().strftime("%d-%m-%Y %H:%M")
-
-    pdf.cell(0, 10, f"Patient Name: {patient_name}", ln=True)
-    pdf.cell(0, 10, f"Session ID: {session_id}", ln=True)
-    pdf.cell(0, 10, f"Date: {date}", ln=True)
+    pdf.cell(0, 10, _latin1(f"Patient Name: {fields['patient_name']}"), ln=True)
+    pdf.cell(0, 10, _latin1(f"Session ID: {fields['session_id']}"), ln=True)
+    pdf.cell(0, 10, _latin1(f"Date: {fields['date']}"), ln=True)
     pdf.ln(10)
 
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, "Symptoms:", ln=True)
-    pdf.set_font('Arial', '', 12)
-    pdf.multi_cell(0, 10, ", ".join(symptoms))
+    sections = [
+        ("Symptoms:", ", ".join(fields["symptoms"])),
+        ("Diagnosis:", fields["diagnosis"]),
+        ("Treatment:", fields["treatment"]),
+        ("Remarks:", fields["remarks"]),
+    ]
+    for title, text in sections:
+        pdf.set_font('Arial', 'B', 12)
+        pdf.cell(0, 10, title, ln=True)
+        pdf.set_font('Arial', '', 12)
+        pdf.multi_cell(0, 10, _latin1(text))
+
+    out = pdf.output(dest='S')
+    # fpdf 1.7 returns a latin-1 str, fpdf2 a bytearray
+    return out.encode('latin-1') if isinstance(out, str) else bytes(out)
+
+
+def report_fields(session_id, patient_name, symptoms, diagnosis, treatment, remarks, date=None) -> dict:
+    return {
+        "session_id": session_id,
+        "patient_name": patient_name,
+        "symptoms": [s.strip() for s in symptoms if s.strip()],
+        "diagnosis": diagnosis,
+        "treatment": treatment,
+        "remarks": remarks,
+        # The day, not the time: asking again later today is the same document
+        "date": date or datetime.now().strftime("%d-%m-%Y"),
+    }
+
+
+def report_key(fields: dict) -> str:
+    canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def generate_medical_report(session_id, patient_name, symptoms, diagnosis, treatment, remarks) -> bytes:
+    """Render synchronously in this process (scripts; the API uses ReportRenderer)."""
+    return render_report(report_fields(session_id, patient_name, symptoms, diagnosis, treatment, remarks))
+
+
+# === Service (runs in the API process) ===
+class ReportRenderer:
+    def __init__(self, workers=REPORT_WORKERS, cache_size=REPORT_CACHE_SIZE, cache_dir=REPORT_CACHE_DIR,
+                 timeout=REPORT_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self.cache = TTLCache(maxsize=cache_size)
+        self.cache_dir = cache_dir or None
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._in_flight = {}  # key -> task of the render in progress
+        self.renders = 0
+        self.shared = 0
+        self.disk_hits = 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: the API process has threads (motor, ASR pool) that fork would copy mid-state
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+                )
+            return self._executor
+
+    def warm_up(self):
+        """Start every worker (each runs _init_worker) before the first report."""
+        list(self.executor.map(_noop, range(self.workers)))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def _read_disk(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key, pdf):
+        # Write then rename, so a reader never sees half a file
+        tmp = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp, self._path(key))
+
+    async def get(self, fields: dict) -> bytes:
+        """PDF for `fields`, from the cache or rendered once in the pool."""
+        key = report_key(fields)
+        pdf = self.cache.get(key)
+        if pdf is not None:
+            return pdf
+        task = self._in_flight.get(key)
+        if task is None:
+            # A task of its own: a client hanging up doesn't cancel it for the others
+            task = self._in_flight[key] = asyncio.create_task(self._load_or_render(key, fields))
+            task.add_done_callback(lambda t: self._render_done(key, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _render_done(self, key, task):
+        del self._in_flight[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"[REPORT] Rendering failed: {task.exception()!r}")
+
+    async def _load_or_render(self, key, fields):
+        if self.cache_dir:
+            pdf = await asyncio.to_thread(self._read_disk, key)
+            if pdf is not None:
+                self.disk_hits += 1
+                self.cache.set(key, pdf)
+                return pdf
+        loop = asyncio.get_running_loop()
+        try:
+            pdf = await asyncio.wait_for(loop.run_in_executor(self.executor, render_report, fields), self.timeout)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory): start a fresh pool next time
+            self.shutdown()
+            raise
+        self.renders += 1
+        self.cache.set(key, pdf)
+        if self.cache_dir:
+            await asyncio.to_thread(self._write_disk, key, pdf)
+        return pdf
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "renders": self.renders,
+            "shared": self.shared,
+            "disk_hits": self.disk_hits,
+            "in_flight": len(self._in_flight),
+            "cache": self.cache.stats(),
+        }
+
+
+def _noop(_):
+    return None
+
+
+def iter_chunks(data: bytes, size=REPORT_CHUNK_SIZE):
+    view = memoryview(data)
+    for start in range(0, len(view), size):
+        yield bytes(view[start:start + size])
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
 
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, "Diagnosis:", ln=True)
-    pdf.set_font('Arial', '', 12)
-    pdf.multi_cell(0, 10, diagnosis)
 
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, "Treatment:", ln=True)
-    p
+def get_report_renderer() -> ReportRenderer:
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = ReportRenderer()
+    return _renderer
@@ -0,0 +1,254 @@
+# report_jobs.py
+"""
+Background jobs for LLM diagnosis reports.
+
+POST /generate_report/jobs stores a job record in MongoDB (report_jobs) and
+returns its id at once; GET /generate_report/jobs/{id} reports its status
+(queued, running, done or failed) and, once done, the report. The LLM call
+runs on one of REPORT_JOB_WORKERS worker tasks, so a slow completion holds
+neither a request nor its connection.
+
+- At most REPORT_JOB_WORKERS jobs generate at once; up to
+  REPORT_JOB_MAX_QUEUE more wait. Past that, submit() raises JobQueueFull
+  (the route answers 503 with Retry-After).
+- A job is keyed by a SHA-256 of its prompt. Submitting a job identical to
+  one still queued or running returns that job instead of a new one; a
+  repeat after it finished is answered by the LLM response cache.
+- Records are persisted before the job is queued. Jobs a previous process
+  left queued or running are queued again by start(), oldest first, as
+  room frees up (they count against the same bound). A job is started at
+  most REPORT_JOB_MAX_ATTEMPTS times: one that keeps taking the process
+  down with it is marked failed instead of looping across restarts. This
+  assumes one API process per database, as the write-behind chat buffer does.
+- Finished records expire REPORT_JOB_RETENTION_S after they finish (TTL
+  index on expires_at, see indexes.py).
+"""
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from database import database
+from llm_client import get_llm_client
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "4"))
+REPORT_JOB_MAX_QUEUE = int(os.getenv("REPORT_JOB_MAX_QUEUE", "200"))
+REPORT_JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "3"))
+REPORT_JOB_RETENTION_S = float(os.getenv("REPORT_JOB_RETENTION_S", str(7 * 24 * 3600)))
+# Suggested polling interval for clients, sent as Retry-After
+REPORT_JOB_POLL_S = int(os.getenv("REPORT_JOB_POLL_S", "1"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def job_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def job_view(doc: dict) -> dict:
+    """What the status route returns for a job record."""
+    view = {
+        "job_id": doc["_id"],
+        "status": doc["status"],
+        "params": doc.get("params"),
+        "attempts": doc.get("attempts", 0),
+        "created_at": doc.get("created_at"),
+        "started_at": doc.get("started_at"),
+        "finished_at": doc.get("finished_at"),
+    }
+    if doc["status"] == DONE:
+        view["report"] = doc.get("result")
+    elif doc["status"] == FAILED:
+        view["error"] = doc.get("error")
+    return view
+
+
+async def generate_report_text(prompt: str) -> str:
+    # Same cache namespace as the synchronous /generate_report
+    return await get_llm_client().generate_cached(prompt, "generate_report")
+
+
+class ReportJobQueue:
+    def __init__(self, get_collection, generate=generate_report_text, workers=REPORT_JOB_WORKERS,
+                 max_queue=REPORT_JOB_MAX_QUEUE, max_attempts=REPORT_JOB_MAX_ATTEMPTS,
+                 retention_s=REPORT_JOB_RETENTION_S):
+        # Resolved per call so the queue follows database.connect()
+        self.get_collection = get_collection
+        self.generate = generate
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retention = timedelta(seconds=retention_s)
+        self._queue = None
+        self._tasks = []
+        self._in_flight = {}  # key -> id of the queued or running job
+        self._room = None  # set when a job finishes
+        self.pending = 0  # jobs queued or running (or being inserted)
+        self.running = 0
+        self.counters = {"submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0, "rejected": 0,
+                         "recovered": 0, "abandoned": 0}
+
+    def _full(self) -> bool:
+        return self.pending >= self.workers + self.max_queue
+
+    def _reserve(self, key, job_id):
+        self._in_flight.setdefault(key, job_id)
+        self.pending += 1
+
+    def _release(self, key, job_id):
+        if self._in_flight.get(key) == job_id:
+            del self._in_flight[key]
+        self.pending -= 1
+        self._room.set()
+
+    # === Producers ===
+    async def submit(self, params: dict, prompt: str) -> tuple:
+        """Queue a report job; returns (job id, whether an identical job was already pending)."""
+        if self._queue is None:
+            raise RuntimeError("Report job queue is not running; call start() first")
+        key = job_key(prompt)
+        job_id = self._in_flight.get(key)
+        if job_id is not None:
+            self.counters["deduplicated"] += 1
+            return job_id, True
+        if self._full():
+            self.counters["rejected"] += 1
+            raise JobQueueFull(f"{self.pending} report jobs already running or queued")
+        job_id = uuid.uuid4().hex
+        # Claimed before the insert, so an identical submit during it finds this job
+        self._reserve(key, job_id)
+        doc = {"_id": job_id, "key": key, "status": QUEUED, "params": params, "prompt": prompt,
+               "attempts": 0, "created_at": datetime.utcnow()}
+        try:
+            await self.get_collection().insert_one(doc)
+        except BaseException:
+            self._release(key, job_id)
+            raise
+        self._queue.put_nowait((job_id, key, prompt))
+        self.counters["submitted"] += 1
+        return job_id, False
+
+    async def get(self, job_id: str):
+        """The job record, or None if there is no such job (or it expired)."""
+        return await self.get_collection().find_one({"_id": job_id}, {"prompt": 0, "key": 0})
+
+    # === Workers ===
+    async def _update(self, job_id, fields, inc=None):
+        update = {"$set": fields}
+        if inc:
+            update["$inc"] = inc
+        await self.get_collection().update_one({"_id": job_id}, update)
+
+    async def _finish(self, job_id, fields):
+        finished = datetime.utcnow()
+        await self._update(job_id, {**fields, "finished_at": finished, "expires_at": finished + self.retention})
+
+    async def _run_job(self, job_id, key, prompt):
+        try:
+            await self._update(job_id, {"status": RUNNING, "started_at": datetime.utcnow()}, {"attempts": 1})
+            try:
+                report = await self.generate(prompt)
+            except asyncio.CancelledError:
+                raise  # shutting down: left "running", start() picks it up again
+            except Exception as e:
+                self.counters["failed"] += 1
+                logger.warning(f"[REPORT] Job {job_id} failed: {e}")
+                fields = {"status": FAILED, "error": str(e)}
+            else:
+                self.counters["completed"] += 1
+                fields = {"status": DONE, "result": report}
+            await self._finish(job_id, fields)
+        finally:
+            self._release(key, job_id)
+
+    async def _work(self):
+        while True:
+            job_id, key, prompt = await self._queue.get()
+            self.running += 1
+            try:
+                await self._run_job(job_id, key, prompt)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The record couldn't be written; the job stays as it was
+                logger.error(f"[REPORT] ❌ Job {job_id} record not updated: {e}")
+            finally:
+                self.running -= 1
+
+    async def _recover(self, started):
+        """Queue again the jobs an earlier process left unfinished, as room frees up."""
+        # Jobs submitted since start() are already queued
+        query = {"status": {"$in": [QUEUED, RUNNING]}, "created_at": {"$lt": started}}
+        try:
+            # Ids only: prompts are read one at a time, when there is room for the job
+            cursor = self.get_collection().find(query, {"key": 1, "attempts": 1}).sort("created_at", 1)
+            unfinished = await cursor.to_list(None)
+            for doc in unfinished:
+                if doc.get("attempts", 0) >= self.max_attempts:
+                    # Started that often without finishing: likely what took the process down
+                    self.counters["abandoned"] += 1
+                    await self._finish(doc["_id"], {"status": FAILED,
+                                                    "error": f"Gave up after {doc['attempts']} attempts"})
+                    continue
+                while self._full():
+                    self._room.clear()
+                    await self._room.wait()
+                self._reserve(doc["key"], doc["_id"])
+                try:
+                    job = await self.get_collection().find_one({"_id": doc["_id"]}, {"prompt": 1})
+                except BaseException:
+                    self._release(doc["key"], doc["_id"])
+                    raise
+                # An identical job submitted since keeps the dedup slot; this
+                # one still runs (from the response cache) so its record finishes
+                self._queue.put_nowait((doc["_id"], doc["key"], job["prompt"]))
+                self.counters["recovered"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"[REPORT] Could not recover unfinished report jobs: {e}")
+            return
+        if self.counters["recovered"] or self.counters["abandoned"]:
+            logger.info(f"[REPORT] Recovered {self.counters['recovered']} unfinished report jobs, "
+                        f"gave up on {self.counters['abandoned']}")
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._room = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._recover(datetime.utcnow())))
+
+    async def stop(self):
+        """Cancel the workers; unfinished jobs keep their records and resume on the next start()."""
+        if self._queue is None:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._in_flight.clear()
+        self.pending = 0
+        logger.info(f"[REPORT] Job queue stopped: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "max_attempts": self.max_attempts,
+            "pending": self.pending,
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+report_jobs = ReportJobQueue(lambda: database.report_jobs)
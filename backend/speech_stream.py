@@ -0,0 +1,190 @@
+# speech_stream.py
+"""
+Streaming speech recognition for the /ws/speech websocket.
+
+The browser sends 16-bit mono PCM as it records. A SpeechSession splits the
+stream into utterances with the energy VAD (audio.py): an utterance starts
+after VAD_START_MS of speech (keeping VAD_PREROLL_MS before it so onsets
+aren't clipped) and ends after VAD_END_SILENCE_MS of silence, or at
+ASR_MAX_UTTERANCE_S. While someone speaks, the audio so far is decoded
+every ASR_PARTIAL_INTERVAL_S and sent as a partial transcript (skipped
+while the previous partial is still decoding); when the utterance ends the
+whole of it is decoded once more for the final transcript.
+
+All decoding goes through the shared ASRService, so websocket sessions and
+/speech-to-text uploads share the same bounded worker pool. Finals are
+delivered in utterance order, each handed to `on_final` (main.py uses it to
+answer through the /chat pipeline) before the next one.
+"""
+import os
+import time
+import asyncio
+import logging
+
+from asr import ASRError, ASRBusy, NoSpeech
+from audio import EnergyVAD, frame_energy_db, pcm_samples, pcm_clip
+
+VAD_START_MS = int(os.getenv("VAD_START_MS", "90"))
+VAD_END_SILENCE_MS = int(os.getenv("VAD_END_SILENCE_MS", "600"))
+VAD_PREROLL_MS = int(os.getenv("VAD_PREROLL_MS", "300"))
+ASR_PARTIAL_INTERVAL_S = float(os.getenv("ASR_PARTIAL_INTERVAL_S", "0.8"))
+ASR_MAX_UTTERANCE_S = float(os.getenv("ASR_MAX_UTTERANCE_S", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class SpeechSession:
+    def __init__(self, asr, sample_rate: int, send, on_final=None):
+        """
+        `send(message: dict)` delivers events to the client; `on_final(text,
+        utterance)` (optional) is awaited after each final transcript.
+        """
+        self.asr = asr
+        self.sample_rate = sample_rate
+        self.send = send
+        self.on_final = on_final
+        self.vad = EnergyVAD(sample_rate)
+        frame_ms = 1000 * self.vad.frame_len / sample_rate
+        self.start_frames = max(1, round(VAD_START_MS / frame_ms))
+        self.end_frames = max(1, round(VAD_END_SILENCE_MS / frame_ms))
+        self.preroll_frames = round(VAD_PREROLL_MS / frame_ms)
+        self.max_bytes = int(ASR_MAX_UTTERANCE_S * sample_rate) * 2
+        self.partial_bytes = int(ASR_PARTIAL_INTERVAL_S * sample_rate) * 2
+
+        self._carry = b""  # incomplete frame from the previous chunk
+        self._recent = []  # frames before speech start: pre-roll and the start run
+        self._voiced_run = 0
+        self._silent_run = 0
+        self.utterance = None  # bytearray while speech is in progress
+        self.utterances = 0
+        self._partial_at = 0
+        self._partial_task = None
+        self._finals = None  # last final task; each waits for the one before
+        self._tasks = set()
+        self.received_bytes = 0
+
+    # === Input ===
+    async def feed(self, pcm: bytes):
+        """Process one chunk of PCM from the client."""
+        self.received_bytes += len(pcm)
+        data = self._carry + pcm
+        frame_bytes = self.vad.frame_bytes
+        n = len(data) // frame_bytes
+        self._carry = data[n * frame_bytes:]
+        if n == 0:
+            return
+        flags = self.vad.voiced(frame_energy_db(pcm_samples(data[: n * frame_bytes]), self.vad.frame_len))
+        for i, voiced in enumerate(flags.tolist()):
+            frame = data[i * frame_bytes:(i + 1) * frame_bytes]
+            if self.utterance is None:
+                await self._idle_frame(frame, voiced)
+            else:
+                await self._speech_frame(frame, voiced)
+        if self.utterance is not None:
+            self._maybe_partial()
+
+    async def _idle_frame(self, frame, voiced):
+        self._recent.append(frame)
+        self._voiced_run = self._voiced_run + 1 if voiced else 0
+        if self._voiced_run >= self.start_frames:
+            self.utterances += 1
+            self.utterance = bytearray(b"".join(self._recent))
+            self._recent = []
+            self._silent_run = 0
+            self._partial_at = len(self.utterance)
+            await self.send({"type": "speech_start", "utterance": self.utterances,
+                             "at": round(self.received_bytes / 2 / self.sample_rate, 3)})
+        else:
+            del self._recent[: max(0, len(self._recent) - self.preroll_frames - self.start_frames)]
+
+    async def _speech_frame(self, frame, voiced):
+        self.utterance += frame
+        self._silent_run = 0 if voiced else self._silent_run + 1
+        if self._silent_run >= self.end_frames or len(self.utterance) >= self.max_bytes:
+            await self.end_utterance()
+
+    # === Decoding ===
+    def _maybe_partial(self):
+        if len(self.utterance) - self._partial_at < self.partial_bytes:
+            return
+        if self._partial_task is not None and not self._partial_task.done():
+            return
+        self._partial_at = len(self.utterance)
+        self._partial_task = self._spawn(self._partial(bytes(self.utterance), self.utterances))
+
+    async def _partial(self, pcm, utterance):
+        try:
+            text = await self.asr.transcribe(self._clip(pcm))
+        except ASRError:
+            return  # NoSpeech, busy, slow: the final transcript still comes
+        if utterance == self.utterances and self.utterance is not None:
+            await self.send({"type": "partial", "utterance": utterance, "text": text})
+
+    async def end_utterance(self):
+        """Close the utterance in progress (if any) and decode it for the final transcript."""
+        if self.utterance is None:
+            return
+        # Trailing silence is no use to the recognizer
+        pcm = bytes(self.utterance[: len(self.utterance) - self._silent_run * self.vad.frame_bytes])
+        self.utterance = None
+        self._voiced_run = 0
+        if self._partial_task is not None:
+            self._partial_task.cancel()
+        self._finals = self._spawn(self._final(pcm, self.utterances, self._finals))
+
+    def _clip(self, pcm):
+        # Resampled to the recognizer's rate (cheap next to decoding)
+        return pcm_clip(pcm, self.sample_rate, self.asr.backend.sample_rate)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        # Nothing awaits these tasks' results, so report failures here
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"[ASR] Speech task failed: {task.exception()!r}")
+
+    async def _final(self, pcm, utterance, previous):
+        if previous is not None:
+            await asyncio.wait({previous})
+        try:
+            await self._deliver_final(pcm, utterance)
+        except Exception as e:
+            # Client gone or on_final failed; later utterances still get their turn
+            logger.warning(f"[ASR] Final transcript {utterance} not delivered: {e!r}")
+
+    async def _deliver_final(self, pcm, utterance):
+        start = time.perf_counter()
+        message = {"type": "final", "utterance": utterance, "duration": round(len(pcm) / 2 / self.sample_rate, 3)}
+        try:
+            text = await self.asr.transcribe(self._clip(pcm))
+        except NoSpeech:
+            text = ""
+        except ASRBusy as e:
+            await self.send({"type": "error", "utterance": utterance, "detail": str(e)})
+            return
+        except ASRError as e:
+            logger.warning(f"[ASR ERROR] {e}")
+            await self.send({"type": "error", "utterance": utterance, "detail": str(e)})
+            return
+        message.update(text=text, latency_ms=round((time.perf_counter() - start) * 1000, 1))
+        await self.send(message)
+        if text and self.on_final is not None:
+            await self.on_final(text, utterance)
+
+    async def finish(self):
+        """End of stream: finalize the last utterance and wait for every final."""
+        await self.end_utterance()
+        if self._finals is not None:
+            await asyncio.wait({self._finals})
+
+    async def close(self):
+        """Client went away: cancel pending work and wait until it has stopped."""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,123 @@
+# startup.py
+"""
+Application startup: parallel warm-up, readiness and liveness.
+
+Heavy dependencies (spaCy, sklearn through the model pickles, the Gemini
+SDK, speech_recognition) are imported on first use, not when `main` is
+imported, so uvicorn binds its port and answers /health/live within a
+moment of starting. The FastAPI lifespan then runs every registered
+warm-up component concurrently (blocking ones in worker threads);
+/health/ready returns 503 until all required components have loaded, and
+a per-component timing breakdown is logged once warm-up ends.
+"""
+import os
+import time
+import asyncio
+import logging
+
+# How long a single component may take before it is reported as failed
+STARTUP_COMPONENT_TIMEOUT = float(os.getenv("STARTUP_COMPONENT_TIMEOUT", "120"))
+
+logger = logging.getLogger(__name__)
+
+# Set when this module is first imported, i.e. early during `import main`
+IMPORT_STARTED = time.monotonic()
+
+
+class Component:
+    def __init__(self, name, load, required=True):
+        self.name = name
+        self.load = load
+        # Optional components are reported but don't gate readiness
+        self.required = required
+        self.status = "pending"
+        self.seconds = None
+        self.error = None
+
+    def info(self) -> dict:
+        return {
+            "status": self.status,
+            "required": self.required,
+            "seconds": None if self.seconds is None else round(self.seconds, 3),
+            "error": self.error,
+        }
+
+
+class Startup:
+    def __init__(self, timeout=STARTUP_COMPONENT_TIMEOUT):
+        self.timeout = timeout
+        self.components = {}
+        self.import_seconds = None
+        self.warm_up_seconds = None
+        self._task = None
+
+    def component(self, name, required=True):
+        """Decorator registering a warm-up function (blocking ones run in a thread)."""
+        def register(load):
+            self.components[name] = Component(name, load, required)
+            return load
+        return register
+
+    async def _run(self, component: Component):
+        component.status = "loading"
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(component.load):
+                await asyncio.wait_for(component.load(), self.timeout)
+            else:
+                # A timed-out thread can't be stopped; it is only reported as failed
+                await asyncio.wait_for(asyncio.to_thread(component.load), self.timeout)
+            component.status = "ready"
+        except asyncio.CancelledError:
+            component.status = "cancelled"
+            raise
+        except asyncio.TimeoutError:
+            component.status = "failed"
+            component.error = f"timed out after {self.timeout:.0f}s"
+        except Exception as e:
+            component.status = "failed"
+            component.error = f"{type(e).__name__}: {e}"
+        component.seconds = time.perf_counter() - start
+
+    async def warm_up(self):
+        start = time.perf_counter()
+        await asyncio.gather(*(self._run(c) for c in self.components.values()))
+        self.warm_up_seconds = time.perf_counter() - start
+        self.log_breakdown()
+
+    def start(self):
+        """Begin warming up in the background; the app serves liveness meanwhile."""
+        self.import_seconds = time.monotonic() - IMPORT_STARTED
+        self._task = asyncio.create_task(self.warm_up())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @property
+    def ready(self) -> bool:
+        return all(c.status == "ready" for c in self.components.values() if c.required)
+
+    def log_breakdown(self):
+        logger.info(f"[STARTUP] Imports {self.import_seconds:.2f}s, warm-up {self.warm_up_seconds:.2f}s (parallel)")
+        for c in sorted(self.components.values(), key=lambda c: -(c.seconds or 0)):
+            line = f"[STARTUP]   {c.name:<20} {c.status:<9} {c.seconds or 0:6.2f}s"
+            if c.error:
+                line += f"  {c.error}"
+            (logger.warning if c.status != "ready" and c.required else logger.info)(line)
+        if self.ready:
+            logger.info("[STARTUP] ✅ Ready")
+        else:
+            logger.warning("[STARTUP] ❌ Not ready: a required component failed")
+
+    def info(self) -> dict:
+        return {
+            "ready": self.ready,
+            "import_seconds": None if self.import_seconds is None else round(self.import_seconds, 3),
+            "warm_up_seconds": None if self.warm_up_seconds is None else round(self.warm_up_seconds, 3),
+            "components": {name: c.info() for name, c in self.components.items()},
+        }
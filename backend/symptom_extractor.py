@@ -0,0 +1,363 @@
+# symptom_extractor.py
+"""
+Symptom extraction for /extract_symptoms, /chat_diagnose and chat history.
+
+Only lemmas are needed from spaCy, so the pipeline is loaded without the
+dependency parser and NER, which are most of its CPU time (the tagger,
+attribute ruler and lemmatizer stay, so lemmas are unchanged).
+
+Every message is analyzed into spans: character offsets into the original
+text, the canonical symptom, the phrase (canonical name or synonym) that
+matched, and whether the mention is negated ("no fever", "denies cough").
+Phrases are matched over tokens with a phrase trie:
+  - a token matches a phrase word when the word is a prefix of the token or
+    of its lemma ("cough" finds "coughing"), or when the lemmas are equal
+    ("threw up" finds "throwing up");
+  - overlapping phrases resolve to the longest match ("abdominal pain" is
+    one span, not also "pain").
+Negation is NegEx-style: a cue ("no", "not", "denies", "negative for", ...)
+up to NEGATION_WINDOW words before the span, with no scope terminator
+("but", ".", ";", ...) in between.
+
+`symptoms` is the canonical symptoms of the non-negated spans, in
+SYMPTOM_KEYWORDS order.
+"""
+import os
+import json
+import logging
+from collections import deque
+from typing import NamedTuple
+
+from cache import TTLCache
+
+SPACY_MODEL = os.getenv("SPACY_MODEL", "en_core_web_sm")
+# Components that don't contribute to token.lemma_
+SPACY_EXCLUDE = ["parser", "ner"]
+SYMPTOM_CACHE_SIZE = int(os.getenv("SYMPTOM_CACHE_SIZE", "4096"))
+# Bulk extraction: texts per nlp.pipe batch and worker processes (1 = in-process)
+SYMPTOM_BATCH_SIZE = int(os.getenv("SYMPTOM_BATCH_SIZE", "256"))
+SYMPTOM_N_PROCESS = int(os.getenv("SYMPTOM_N_PROCESS", "1"))
+
+logger = logging.getLogger(__name__)
+
+# Clinical symptom keywords (canonical names)
+SYMPTOM_KEYWORDS = [
+    "fever", "cough", "headache", "fatigue", "nausea",
+    "vomiting", "diarrhea", "pain", "sore throat",
+    "chills", "shortness of breath", "dizziness",
+    "rash", "itching", "abdominal pain", "blurred vision"
+]
+
+# Synonyms or common variations mapped to canonical symptom keywords
+SYMPTOM_SYNONYMS = {
+    "tired": "fatigue",
+    "exhausted": "fatigue",
+    "sick": "nausea",
+    "queasy": "nausea",
+    "throwing up": "vomiting",
+    "upset stomach": "abdominal pain",
+    "belly pain": "abdominal pain",
+    "breathless": "shortness of breath",
+    "dizzy": "dizziness",
+    "lightheaded": "dizziness",
+    "blurred sight": "blurred vision",
+    "itchy": "itching",
+    "sore throat": "sore throat"
+}
+
+# === Negation ===
+NEGATION_CUES = {
+    "no", "not", "n't", "never", "without", "none", "nor", "neither",
+    "deny", "denies", "denied", "dont", "didnt", "doesnt", "havent", "hasnt", "hadnt",
+    "isnt", "wasnt", "arent", "cant",
+}
+NEGATION_PAIRS = {("negative", "for"), ("free", "of"), ("absence", "of"), ("ruled", "out")}
+# Words that end the scope of a preceding cue ("no fever but a cough", "not dizzy, just tired")
+SCOPE_TERMINATORS = {
+    "but", "however", "although", "though", "except", "yet", "apart", "aside", "just", "only",
+}
+# Punctuation that does not end a negation scope ("denies fever, chills")
+SCOPE_PUNCT = {",", "/", "-", "(", ")", "'", '"'}
+NEGATION_WINDOW = int(os.getenv("NEGATION_WINDOW", "5"))
+
+
+class Span(NamedTuple):
+    start: int
+    end: int
+    text: str
+    symptom: str
+    # Phrase that matched: the canonical name or one of its synonyms
+    synonym: str
+    negated: bool
+
+
+def load_nlp(exclude=SPACY_EXCLUDE):
+    # spaCy takes seconds to import, so only on first use. The model is
+    # installed at build time (see render.yaml); never download at runtime.
+    import spacy
+
+    try:
+        return spacy.load(SPACY_MODEL, exclude=exclude)
+    except OSError as e:
+        raise RuntimeError(
+            f"spaCy model {SPACY_MODEL!r} is not installed; run `python -m spacy download {SPACY_MODEL}` "
+            "when building the image"
+        ) from e
+
+
+def build_phrase_table(keywords=SYMPTOM_KEYWORDS, synonyms=SYMPTOM_SYNONYMS) -> tuple:
+    """(phrase, canonical symptom) pairs: every canonical name, then every synonym."""
+    table = {symptom: symptom for symptom in keywords}
+    for synonym, symptom in synonyms.items():
+        if symptom in keywords:
+            table.setdefault(synonym, symptom)
+    return tuple(table.items())
+
+
+def _lower(text: str) -> str:
+    # Offsets are computed on the lowercased text, so it must keep the length
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+class _Node:
+    __slots__ = ("next", "by_first", "end")
+
+    def __init__(self):
+        # phrase word -> _Node
+        self.next = {}
+        # first character -> [(phrase word, _Node)], to try only plausible words
+        self.by_first = {}
+        # (phrase, symptom) when a phrase ends here
+        self.end = None
+
+
+class _Token(NamedTuple):
+    lower: str
+    lemma: str
+    is_punct: bool
+    idx: int
+    length: int
+
+
+class SymptomExtractor:
+    def __init__(self, nlp=None, keywords=SYMPTOM_KEYWORDS, synonyms=SYMPTOM_SYNONYMS,
+                 cache_size=SYMPTOM_CACHE_SIZE):
+        self._nlp = nlp
+        self.keywords = list(keywords)
+        self.phrases = build_phrase_table(keywords, synonyms)
+        self._trie = None
+        # lemma -> phrase words with that lemma ("throw" -> {"throwing"})
+        self._lemma_words = {}
+        # Chat messages repeat a lot ("I have a fever"), results are tiny
+        self.cache = TTLCache(maxsize=cache_size)
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            self._nlp = load_nlp()
+        return self._nlp
+
+    @property
+    def trie(self) -> _Node:
+        if self._trie is None:
+            root = _Node()
+            for phrase, symptom in self.phrases:
+                words = phrase.split()
+                node = root
+                for word in words:
+                    child = node.next.get(word)
+                    if child is None:
+                        child = node.next[word] = _Node()
+                        node.by_first.setdefault(word[0], []).append((word, child))
+                    node = child
+                node.end = (phrase, symptom)
+                # Lemmatized in context, so "throwing up" gives "throw", "up"
+                doc = self.nlp(phrase)
+                if len(doc) == len(words):
+                    for word, token in zip(words, doc):
+                        if token.lemma_ and token.lemma_ != word:
+                            self._lemma_words.setdefault(token.lemma_, set()).add(word)
+            self._trie = root
+        return self._trie
+
+    def warm_up(self):
+        """Load spaCy and build the phrase trie ahead of the first request."""
+        self.trie
+
+    def _children(self, node: _Node, token: _Token):
+        """Children of `node` whose phrase word matches `token`."""
+        lower, lemma = token.lower, token.lemma
+        for word, child in node.by_first.get(lower[:1], ()):
+            if lower.startswith(word):
+                yield child
+        if lemma and lemma != lower:
+            for word, child in node.by_first.get(lemma[:1], ()):
+                if lemma.startswith(word) and not lower.startswith(word):
+                    yield child
+            for word in self._lemma_words.get(lemma, ()):
+                child = node.next.get(word)
+                if child is not None and not lower.startswith(word) and not lemma.startswith(word):
+                    yield child
+
+    def _longest_match(self, tokens, i):
+        """(index of the last token, phrase, symptom) of the longest phrase starting at tokens[i]."""
+        best = None
+        stack = [(self.trie, i)]
+        while stack:
+            node, k = stack.pop()
+            if node.end is not None and k > i:
+                phrase, symptom = node.end
+                if best is None or k - 1 > best[0] or (k - 1 == best[0] and len(phrase) > len(best[1])):
+                    best = (k - 1, phrase, symptom)
+            if k < len(tokens):
+                for child in self._children(node, tokens[k]):
+                    stack.append((child, k + 1))
+        return best
+
+    @staticmethod
+    def _negated(tokens, i) -> bool:
+        words = 0
+        for k in range(i - 1, -1, -1):
+            token = tokens[k]
+            lower = token.lower
+            if lower in SCOPE_TERMINATORS or (token.is_punct and lower not in SCOPE_PUNCT):
+                return False
+            if lower in NEGATION_CUES or (k + 1 < i and (lower, tokens[k + 1].lower) in NEGATION_PAIRS):
+                return True
+            if not token.is_punct:
+                words += 1
+                if words >= NEGATION_WINDOW:
+                    return False
+        return False
+
+    def _spans(self, text: str, doc) -> tuple:
+        # Plain tuples: spaCy token attributes are comparatively slow to read
+        tokens = [
+            _Token(token.lower_, token.lemma_, token.is_punct, token.idx, len(token))
+            for token in doc if not token.is_space
+        ]
+        trie = self.trie
+        spans = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i].lower[:1] not in trie.by_first and tokens[i].lemma not in self._lemma_words \
+                    and tokens[i].lemma[:1] not in trie.by_first:
+                i += 1
+                continue
+            match = self._longest_match(tokens, i)
+            if match is None:
+                i += 1
+                continue
+            last, phrase, symptom = match
+            start, end = tokens[i].idx, tokens[last].idx + tokens[last].length
+            spans.append(Span(start, end, text[start:end], symptom, phrase, self._negated(tokens, i)))
+            i = last + 1
+        return tuple(spans)
+
+    def _result(self, spans) -> dict:
+        present = {span.symptom for span in spans if not span.negated}
+        return {
+            "symptoms": [symptom for symptom in self.keywords if symptom in present],
+            "spans": [span._asdict() for span in spans],
+        }
+
+    def analyze(self, text: str) -> dict:
+        """{"symptoms": [...], "spans": [{start, end, text, symptom, synonym, negated}, ...]}"""
+        spans = self.cache.get(text)
+        if spans is None:
+            spans = self._spans(text, self.nlp(_lower(text)))
+            self.cache.set(text, spans)
+        return self._result(spans)
+
+    def extract(self, text: str) -> list:
+        """Canonical symptoms mentioned (and not negated) in `text`, in SYMPTOM_KEYWORDS order."""
+        return self.analyze(text)["symptoms"]
+
+    def analyze_many(self, texts, batch_size=SYMPTOM_BATCH_SIZE, n_process=SYMPTOM_N_PROCESS):
+        """
+        Yield analyze(text) for every text of an iterable, in order.
+
+        Texts are consumed lazily and go through nlp.pipe, so arbitrarily
+        long streams run in constant memory; n_process > 1 spreads the
+        spaCy work over that many worker processes.
+        """
+        self.trie
+        # nlp.pipe reads ahead, so originals queue up until their doc comes out
+        originals = deque()
+
+        def lowered():
+            for text in texts:
+                originals.append(text)
+                yield _lower(text)
+
+        for doc in self.nlp.pipe(lowered(), batch_size=batch_size, n_process=n_process):
+            yield self._result(self._spans(originals.popleft(), doc))
+
+    def extract_many(self, texts, batch_size=SYMPTOM_BATCH_SIZE, n_process=SYMPTOM_N_PROCESS):
+        """Yield extract(text) for every text of an iterable, in order (see analyze_many)."""
+        for analysis in self.analyze_many(texts, batch_size, n_process):
+            yield analysis["symptoms"]
+
+
+def read_ndjson_texts(lines):
+    """
+    Yield (id, text) for every non-blank NDJSON line.
+
+    A line is either a JSON string or an object with a "text" field and an
+    optional "id" that is echoed back with the result.
+    """
+    for line_no, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {line_no}: invalid JSON ({e})")
+        if isinstance(record, str):
+            yield None, record
+        elif isinstance(record, dict) and isinstance(record.get("text"), str):
+            yield record.get("id"), record["text"]
+        else:
+            raise ValueError(f'line {line_no}: expected a string or an object with a "text" string')
+
+
+def ndjson_results(records, extractor=None, batch_size=SYMPTOM_BATCH_SIZE, n_process=SYMPTOM_N_PROCESS):
+    """
+    Analyze (id, text) records and yield NDJSON, one chunk per batch.
+
+    Every line is {"index": i, "symptoms": [...], "spans": [...]} (plus "id"
+    when the record had one), in input order.
+    """
+    extractor = extractor or symptom_extractor
+    # nlp.pipe reads ahead, so ids queue up until their result comes out
+    ids = deque()
+
+    def texts():
+        for record_id, text in records:
+            ids.append(record_id)
+            yield text
+
+    lines = []
+    for index, analysis in enumerate(extractor.analyze_many(texts(), batch_size, n_process)):
+        result = {"index": index, **analysis}
+        record_id = ids.popleft()
+        if record_id is not None:
+            result["id"] = record_id
+        lines.append(json.dumps(result) + "\n")
+        if len(lines) >= batch_size:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+symptom_extractor = SymptomExtractor()
+
+
+def extract_symptoms_from_text(user_input):
+    return symptom_extractor.extract(user_input)
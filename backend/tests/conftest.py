@@ -0,0 +1,51 @@
+# tests/conftest.py
+# Tests run from backend/ (`cd backend && python -m pytest`) against an
+# in-process MongoDB stand-in (mongomock-motor) via database.connect(client=...).
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+from database import database
+from chat_buffer import chat_buffer
+from conversation import conversation_memory
+
+
+@pytest.fixture
+def db():
+    database.connect(client=AsyncMongoMockClient())
+    yield database
+    database.close()
+    conversation_memory.cache.clear()
+
+
+def _analyze(text):
+    # Stands in for the spaCy extractor, which these tests don't exercise
+    symptoms = [word for word in ("fever", "cough", "headache") if word in text.lower()]
+    return {"symptoms": symptoms, "spans": []}
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """The auth routes (users, sessions, chat history) with the chat buffer running."""
+    import auth
+    monkeypatch.setattr(auth.symptom_extractor, "analyze", _analyze)
+    monkeypatch.setattr(auth.symptom_extractor, "analyze_many", lambda texts: [_analyze(t) for t in texts])
+
+    @asynccontextmanager
+    async def lifespan(app):
+        chat_buffer.start()
+        yield
+        await chat_buffer.stop()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(auth.router)
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,93 @@
+# tests/test_audio.py
+import io
+import struct
+import wave
+
+import numpy as np
+import pytest
+
+import audio
+from audio import decode, preprocess
+
+
+def wav_bytes(pcm: bytes, channels=1, rate=16000, block_align=2, bits=16, tag=1) -> bytes:
+    """A WAV file with the given fmt fields, consistent or not."""
+    fmt = struct.pack("<HHIIHH", tag, channels, rate, rate * block_align, block_align, bits)
+    body = b"WAVE" + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", len(pcm)) + pcm
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+def tone(seconds=1.0, rate=16000, channels=1) -> bytes:
+    t = np.arange(int(seconds * rate)) / rate
+    samples = (0.5 * 32767 * np.sin(2 * np.pi * 440 * t)).astype("<i2")
+    return np.repeat(samples[:, None], channels, axis=1).tobytes()
+
+
+def test_decodes_stereo_wav():
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(tone(0.5, 44100, channels=2))
+    mono, rate, info = decode(buf.getvalue())
+    assert rate == 44100 and len(mono) == 22050
+    assert info["channels"] == 2
+    assert 0.45 < np.abs(mono).max() < 0.55
+
+
+@pytest.mark.parametrize("fields", [
+    {"block_align": 0},                          # would divide by zero
+    {"bits": 0},
+    {"channels": 2, "block_align": 3},           # frame doesn't split into channels
+    {"block_align": 2, "bits": 24},              # more bits than the sample holds
+    {"channels": 0},
+    {"rate": 0},
+])
+def test_malformed_wav_header_is_a_value_error(fields):
+    data = wav_bytes(tone(0.1), **fields)
+    with pytest.raises(ValueError):
+        decode(data)
+    with pytest.raises(ValueError):
+        preprocess(data, 16000)
+
+
+def test_truncated_wav_is_a_value_error():
+    with pytest.raises(ValueError):
+        decode(wav_bytes(tone(0.1))[:30])
+
+
+def test_silence_has_no_clip():
+    clip, info = preprocess(wav_bytes(bytes(32000)), 16000)
+    assert clip is None
+
+
+@pytest.mark.parametrize("fmt", ["AIFF", "FLAC"])
+def test_decodes_aiff_and_flac(fmt):
+    soundfile = pytest.importorskip("soundfile")
+    buf = io.BytesIO()
+    samples = np.frombuffer(tone(0.5, 22050), "<i2")
+    soundfile.write(buf, samples, 22050, format=fmt, subtype="PCM_16")
+    mono, rate, info = decode(buf.getvalue())
+    assert info["format"] == fmt.lower() and rate == 22050 and len(mono) == 11025
+    assert np.allclose(mono, samples / 32768, atol=1e-4)
+
+
+def flac_bytes(pcm: bytes, rate=16000) -> bytes:
+    soundfile = pytest.importorskip("soundfile")
+    buf = io.BytesIO()
+    soundfile.write(buf, np.frombuffer(pcm, "<i2"), rate, format="FLAC")
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("encode", [wav_bytes, flac_bytes], ids=["wav", "flac"])
+def test_overlong_upload_is_refused_before_decoding(monkeypatch, encode):
+    data = encode(tone(1.0))
+    monkeypatch.setattr(audio, "AUDIO_MAX_SECONDS", 0.5)
+
+    def to_mono(samples):
+        raise AssertionError("decoded an upload that was too long")
+
+    monkeypatch.setattr(audio, "to_mono", to_mono)
+    with pytest.raises(ValueError, match="longer than"):
+        decode(data)
@@ -0,0 +1,138 @@
+# tests/test_auth.py
+# Users, sessions and chat history through the HTTP routes of auth.py.
+import json
+
+import pytest
+
+from conversation import conversation_memory
+
+EMAIL = "doc@example.com"
+
+
+def create_sessions(client, n, case_id="case001"):
+    ids = []
+    for i in range(n):
+        r = client.post("/create_session", json={"email": EMAIL, "case_id": case_id, "session_name": f"S{i}"})
+        assert r.status_code == 200
+        ids.append(r.json()["session_id"])
+    return ids
+
+
+def store_chats(client, session_id, n):
+    messages = [{"email": EMAIL, "case_id": "case001", "session_id": session_id,
+                 "role": "user" if i % 2 == 0 else "bot", "message": f"message {i} with fever"}
+                for i in range(n)]
+    r = client.post("/store_chat/batch?wait=true", json={"messages": messages})
+    assert r.status_code == 200 and r.json()["stored"] == n
+
+
+def test_register_and_login(client):
+    user = {"username": "doc", "email": EMAIL, "password": "s3cret"}
+    assert client.post("/register", json=user).status_code == 200
+    assert client.post("/register", json=user).status_code == 400
+
+    r = client.post("/login", json={"email": EMAIL, "password": "s3cret"})
+    assert r.status_code == 200 and r.json()["username"] == "doc"
+    assert client.post("/login", json={"email": EMAIL, "password": "wrong"}).status_code == 401
+    assert client.post("/login", json={"email": "nobody@example.com", "password": "x"}).status_code == 401
+
+
+def test_session_crud(client):
+    [session_id] = create_sessions(client, 1)
+
+    sessions = client.get("/sessions", params={"email": EMAIL}).json()["sessions"]
+    assert [s["session_id"] for s in sessions] == [session_id]
+    assert sessions[0]["session_name"] == "S0"
+
+    r = client.put("/update_session", json={"email": EMAIL, "session_id": session_id, "new_name": "Renamed"})
+    assert r.status_code == 200
+    assert client.get("/sessions", params={"email": EMAIL}).json()["sessions"][0]["session_name"] == "Renamed"
+    r = client.put("/update_session", json={"email": EMAIL, "session_id": "missing", "new_name": "x"})
+    assert r.status_code == 404
+
+    store_chats(client, session_id, 3)
+    r = client.delete("/delete_session", params={"email": EMAIL, "session_id": session_id})
+    assert r.status_code == 200 and r.json()["chats_deleted"] == 3
+    assert client.get("/sessions", params={"email": EMAIL}).json()["sessions"] == []
+    history = client.get("/chat_history", params={"email": EMAIL, "case_id": session_id}).json()
+    assert history["chat_history"] == []
+    r = client.delete("/delete_session", params={"email": EMAIL, "session_id": session_id})
+    assert r.status_code == 404
+
+
+def test_delete_session_forgets_conversation_memory(client, db):
+    [session_id] = create_sessions(client, 1)
+
+    async def remember():
+        state = await conversation_memory.load(session_id, "case001")
+        await conversation_memory.record(state, "Where does it hurt?", "My head.")
+
+    client.portal.call(remember)
+    assert conversation_memory.cache.get(session_id) is not None
+
+    assert client.delete("/delete_session", params={"email": EMAIL, "session_id": session_id}).status_code == 200
+    assert conversation_memory.cache.get(session_id) is None
+    state = client.portal.call(conversation_memory.load, session_id, "case001")
+    assert state.turns == [] and state.summary == []
+
+
+def test_store_chat_then_history(client):
+    [session_id] = create_sessions(client, 1)
+    message = {"email": EMAIL, "case_id": "case001", "session_id": session_id, "role": "user",
+               "message": "I have a fever"}
+    r = client.post("/store_chat", json=message)
+    assert r.status_code == 200 and r.json()["symptoms"] == ["fever"]
+
+    # Still buffered or not, the history sees it
+    history = client.get("/chat_history", params={"email": EMAIL, "case_id": session_id}).json()["chat_history"]
+    assert [(m["role"], m["message"], m["symptoms"]) for m in history] == [("user", "I have a fever", ["fever"])]
+
+
+def test_sessions_pages_cover_everything_once(client):
+    ids = create_sessions(client, 7)
+    create_sessions(client, 2, case_id="case002")
+
+    seen, after = [], None
+    while True:
+        params = {"email": EMAIL, "case_id": "case001", "limit": 3}
+        if after:
+            params["after"] = after
+        page = client.get("/sessions", params=params).json()
+        seen += [s["session_id"] for s in page["sessions"]]
+        after = page["next_after"]
+        if after is None:
+            break
+    # Newest first
+    assert seen == ids[::-1]
+
+
+def test_chat_history_pages_and_stream(client):
+    [session_id] = create_sessions(client, 1)
+    store_chats(client, session_id, 10)
+    params = {"email": EMAIL, "case_id": session_id}
+
+    messages, after = [], None
+    while True:
+        page = client.get("/chat_history", params={**params, "limit": 4, **({"after": after} if after else {})}).json()
+        messages += [m["message"] for m in page["chat_history"]]
+        after = page["next_after"]
+        if after is None:
+            break
+    assert messages == [f"message {i} with fever" for i in range(10)]
+
+    r = client.get("/chat_history/stream", params=params)
+    assert r.headers["content-type"] == "application/x-ndjson"
+    streamed = [json.loads(line)["message"] for line in r.text.splitlines()]
+    assert streamed == messages
+
+
+@pytest.mark.parametrize("path,params", [
+    ("/sessions", {"email": EMAIL}),
+    ("/sessions/stream", {"email": EMAIL}),
+    ("/chat_history", {"email": EMAIL, "case_id": "s1"}),
+    ("/chat_history/stream", {"email": EMAIL, "case_id": "s1"}),
+])
+def test_bad_cursor_is_400(client, path, params):
+    r = client.get(path, params={**params, "after": "not-a-cursor"})
+    assert r.status_code == 400
+    assert "cursor" in r.json()["detail"]
@@ -0,0 +1,73 @@
+# tests/test_cache.py
+import cache
+from cache import ResponseCache, SQLiteCache, TTLCache
+
+
+class Clock:
+    """Stands in for the time module inside cache.py."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    ttl_cache.set("a", 1)
+    clock.now += 59
+    assert ttl_cache.get("a") == 1
+    clock.now += 2
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.stats()["hits"] == 1 and ttl_cache.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    lru = TTLCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    lru.get("a")
+    lru.set("c", 3)
+    assert lru.get("b") is None and lru.get("a") == 1 and lru.get("c") == 3
+
+
+def test_sqlite_cache_expires_entries(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite"), ttl=60)
+    disk.set("a", "reply")
+    clock.now += 30
+    assert disk.get("a") == "reply"
+    clock.now += 31
+    assert disk.get("a") is None
+    # Expired rows are deleted, not just hidden
+    assert disk._conn.execute("SELECT COUNT(*) FROM cache").fetchone() == (0,)
+    disk.close()
+
+
+def test_sqlite_cache_trims_to_max_entries(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite"), max_entries=10)
+    for i in range(256):
+        disk.set(f"k{i}", "v")
+    assert disk._conn.execute("SELECT COUNT(*) FROM cache").fetchone() == (10,)
+    assert disk.get("k255") == "v" and disk.get("k0") is None
+    disk.close()
+
+
+def test_response_cache_expiry_covers_both_tiers(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    responses = ResponseCache(ttl=60, db_path=str(tmp_path / "cache.sqlite"))
+    key = ResponseCache.key("model", "prompt")
+    responses.set(key, "reply")
+    assert responses.get("extract", key) == "reply"
+    clock.now += 61
+    assert responses.get("extract", key) is None
+    assert responses.stats()["endpoints"]["extract"] == {"memory_hits": 1, "disk_hits": 0, "misses": 1}
+    assert ResponseCache.key("model", "prompt") != ResponseCache.key("other model", "prompt")
@@ -0,0 +1,38 @@
+# tests/test_case_store.py
+import json
+
+from case_store import CaseStore, render_prompt_prefix
+
+
+def write_case(folder, filename, case_id, name):
+    case = {
+        "case_id": case_id,
+        "title": f"Case of {name}",
+        "patient_profile": {"name": name, "age": 40, "gender": "F", "chief_complaint": "headache"},
+        "symptoms": ["headache"],
+        "additional_info": {"medical_history": ["none"], "family_history": ["none"]},
+    }
+    (folder / f"{filename}.json").write_text(json.dumps(case))
+
+
+def test_prefix_is_cached_per_file_even_when_case_id_differs(tmp_path):
+    # As in cases/: case006.json carries case_id "case002"
+    write_case(tmp_path, "case002", "case002", "Ann")
+    write_case(tmp_path, "case006", "case002", "Bea")
+    store = CaseStore(case_dir=str(tmp_path), reload_interval=3600)
+
+    for filename, name in (("case002", "Ann"), ("case006", "Bea")):
+        case = store.get(filename)
+        prefix = store.prompt_prefix(case)
+        assert f"named {name}," in prefix
+        # The precomputed string itself, not a re-render
+        assert prefix is store._entries[filename].prompt_prefix
+
+
+def test_unknown_case_dict_is_rendered(tmp_path):
+    write_case(tmp_path, "case001", "case001", "Ann")
+    store = CaseStore(case_dir=str(tmp_path), reload_interval=3600)
+    copy = json.loads(json.dumps(store.get("case001")))
+    copy["patient_profile"]["name"] = "Changed"
+    assert store.prompt_prefix(copy) == render_prompt_prefix(copy)
+    assert "named Changed," in store.prompt_prefix(copy)
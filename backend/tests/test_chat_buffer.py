@@ -0,0 +1,243 @@
+# tests/test_chat_buffer.py
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import json_util
+from mongomock_motor import AsyncMongoMockClient
+from bson.errors import InvalidDocument
+from pymongo.errors import (AutoReconnect, BulkWriteError, DocumentTooLarge, DuplicateKeyError, OperationFailure,
+                            WriteError)
+
+from chat_buffer import ChatWriteBuffer, BufferFull, ChatWriteError, is_document_error, is_transient
+
+
+class FlakyCollection:
+    """Wraps a collection: every `fail_every`-th insert_many writes half the batch, then drops the connection."""
+
+    def __init__(self, collection, fail_every=0, delay=0.0):
+        self.collection = collection
+        self.fail_every = fail_every
+        self.delay = delay
+        self.calls = 0
+
+    async def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail_every and self.calls % self.fail_every == 0:
+            await self.collection.insert_many(docs[: len(docs) // 2], ordered=ordered)
+            raise AutoReconnect("simulated network error")
+        return await self.collection.insert_many(docs, ordered=ordered)
+
+    async def insert_one(self, doc):
+        return await self.collection.insert_one(doc)
+
+
+def messages(n, session_id="s1"):
+    return [{"user_email": "doc@example.com", "session_id": session_id, "role": "user",
+             "message": f"message {i}", "timestamp": datetime.utcnow()} for i in range(n)]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def produce(buffer, docs, producers=20):
+    async def client(share):
+        for doc in share:
+            await buffer.add([doc])
+    await asyncio.gather(*(client(docs[i::producers]) for i in range(producers)))
+
+
+def test_stop_writes_everything_exactly_once(tmp_path):
+    async def scenario():
+        raw = AsyncMongoMockClient()["test"]["chats"]
+        collection = FlakyCollection(raw, fail_every=3, delay=0.005)
+        buffer = ChatWriteBuffer(lambda: collection, max_batch=50, interval_ms=5, max_pending=1000,
+                                 dead_letter_path=str(tmp_path / "dead.ndjson"))
+        buffer.start()
+        await produce(buffer, messages(1000))
+        await buffer.stop()
+        ids = [doc["_id"] async for doc in raw.find({}, {"_id": 1})]
+        return ids, buffer
+
+    ids, buffer = run(scenario())
+    assert len(ids) == 1000
+    assert len(set(ids)) == 1000
+    assert buffer.counters["retries"] > 0
+    assert buffer.counters["written"] == 1000 and buffer.counters["dead_lettered"] == 0
+
+
+def test_wait_returns_once_written(tmp_path):
+    async def scenario():
+        raw = AsyncMongoMockClient()["test"]["chats"]
+        buffer = ChatWriteBuffer(lambda: raw, interval_ms=50, dead_letter_path=str(tmp_path / "dead.ndjson"))
+        buffer.start()
+        [_id] = await buffer.add(messages(1), wait=True)
+        found = await raw.find_one({"_id": _id})
+        await buffer.stop()
+        return found
+
+    assert run(scenario())["message"] == "message 0"
+
+
+def test_backpressure_refuses_when_full(tmp_path):
+    async def scenario():
+        raw = AsyncMongoMockClient()["test"]["chats"]
+        buffer = ChatWriteBuffer(lambda: FlakyCollection(raw, delay=0.2), max_batch=10, interval_ms=1,
+                                 max_pending=20, put_timeout=0.02, dead_letter_path=str(tmp_path / "dead.ndjson"))
+        buffer.start()
+        refused = 0
+        for doc in messages(100):
+            try:
+                await buffer.add([doc])
+            except BufferFull:
+                refused += 1
+            assert len(buffer.pending) <= 20
+        await buffer.stop()
+        return refused, await raw.count_documents({})
+
+    refused, written = run(scenario())
+    assert refused > 0
+    assert written == 100 - refused
+
+
+def test_poison_message_is_dead_lettered_and_the_rest_written(tmp_path):
+    dead = tmp_path / "dead.ndjson"
+
+    async def scenario():
+        raw = AsyncMongoMockClient()["test"]["chats"]
+        buffer = ChatWriteBuffer(lambda: raw, max_batch=10, interval_ms=5, dead_letter_path=str(dead))
+        buffer.start()
+        docs = messages(10)
+        docs[3]["symptoms"] = {"not", "encodable"}  # a set: InvalidDocument
+        await buffer.add(docs)
+        await buffer.add(messages(5, session_id="s2"), wait=True)
+        await buffer.stop()
+        return raw, buffer
+
+    raw, buffer = run(scenario())
+    assert run(raw.count_documents({"session_id": "s1"})) == 9
+    assert run(raw.count_documents({"session_id": "s2"})) == 5
+    assert buffer.counters["dead_lettered"] == 1
+    [line] = dead.read_text().splitlines()
+    record = json_util.loads(line)
+    assert record["doc"]["message"] == "message 3" and "encode" in record["error"]
+
+
+def test_documents_refused_by_the_server_are_dead_lettered(tmp_path):
+    dead = tmp_path / "dead.ndjson"
+
+    class Validating:
+        """Refuses empty messages the way a collection validator would."""
+
+        def __init__(self, collection):
+            self.collection = collection
+
+        async def insert_many(self, docs, ordered=True):
+            bad = [i for i, doc in enumerate(docs) if not doc["message"]]
+            await self.collection.insert_many([d for i, d in enumerate(docs) if i not in bad], ordered=ordered)
+            if bad:
+                raise BulkWriteError({"writeErrors": [{"index": i, "code": 121, "errmsg": "Document failed validation"}
+                                                      for i in bad], "writeConcernErrors": [], "nInserted": 0})
+
+    async def scenario():
+        raw = AsyncMongoMockClient()["test"]["chats"]
+        buffer = ChatWriteBuffer(lambda: Validating(raw), max_batch=10, interval_ms=5, dead_letter_path=str(dead))
+        buffer.start()
+        docs = messages(6)
+        docs[1]["message"] = docs[4]["message"] = ""
+        with pytest.raises(ChatWriteError):
+            await buffer.add(docs, wait=True)
+        await buffer.stop()
+        return await raw.count_documents({}), buffer
+
+    written, buffer = run(scenario())
+    assert written == 4
+    assert buffer.counters["dead_lettered"] == 2 and buffer.counters["retries"] == 0
+    assert len(dead.read_text().splitlines()) == 2
+
+
+def test_outage_keeps_messages_buffered_and_applies_backpressure(tmp_path, monkeypatch):
+    import chat_buffer
+    monkeypatch.setattr(chat_buffer, "CHAT_RETRY_BACKOFF_S", 0.001)
+    monkeypatch.setattr(chat_buffer, "CHAT_RETRY_BACKOFF_MAX_S", 0.005)
+    dead = tmp_path / "dead.ndjson"
+
+    class Outage:
+        def __init__(self, collection):
+            self.collection = collection
+            self.down = True
+
+        async def insert_many(self, docs, ordered=True):
+            if self.down:
+                raise AutoReconnect("connection refused")
+            return await self.collection.insert_many(docs, ordered=ordered)
+
+        async def insert_one(self, doc):
+            if self.down:
+                raise AutoReconnect("connection refused")
+            return await self.collection.insert_one(doc)
+
+    async def scenario():
+        raw = AsyncMongoMockClient()["test"]["chats"]
+        outage = Outage(raw)
+        buffer = ChatWriteBuffer(lambda: outage, max_batch=5, interval_ms=1, max_pending=10, put_timeout=0.05,
+                                 dead_letter_path=str(dead))
+        buffer.start()
+        waiting = asyncio.create_task(buffer.add(messages(5), wait=True))
+        await buffer.add(messages(5, session_id="s2"))
+        with pytest.raises(BufferFull):
+            await buffer.add(messages(1, session_id="s3"))
+        await asyncio.sleep(0.1)
+        # Still retrying, well past what used to be the retry cap
+        assert not waiting.done() and len(buffer.pending) == 10 and buffer.counters["retries"] > 10
+        outage.down = False
+        ids = await asyncio.wait_for(waiting, 5)
+        await buffer.stop()
+        return ids, await raw.count_documents({}), buffer
+
+    ids, written, buffer = run(scenario())
+    assert len(ids) == 5 and written == 10
+    assert buffer.counters["written"] == 10 and buffer.counters["dead_lettered"] == 0
+    assert not dead.exists()
+
+
+def test_waiting_add_reports_dead_lettered_messages(tmp_path):
+    async def scenario():
+        raw = AsyncMongoMockClient()["test"]["chats"]
+        buffer = ChatWriteBuffer(lambda: raw, interval_ms=5, dead_letter_path=str(tmp_path / "dead.ndjson"))
+        buffer.start()
+        docs = messages(3)
+        docs[1]["symptoms"] = {"not", "encodable"}
+        with pytest.raises(ChatWriteError) as caught:
+            await buffer.add(docs, wait=True)
+        await buffer.stop()
+        return docs, caught.value, await raw.count_documents({})
+
+    docs, error, written = run(scenario())
+    assert list(error.failed) == [docs[1]["_id"]]
+    assert written == 2
+
+
+@pytest.mark.parametrize("error,refused", [
+    (InvalidDocument("cannot encode object"), True),
+    (DocumentTooLarge("too large"), True),
+    (WriteError("Document failed validation", 121), True),
+    (DuplicateKeyError("E11000", 11000), False),
+    (AutoReconnect("x"), False),
+    (OperationFailure("not authorized", 13), False),
+])
+def test_is_document_error(error, refused):
+    assert is_document_error(error) is refused
+
+
+@pytest.mark.parametrize("error,transient", [
+    (AutoReconnect("x"), True),
+    (ConnectionError("x"), True),
+    (BulkWriteError({"writeErrors": [], "writeConcernErrors": [{"code": 64}]}), True),
+    (BulkWriteError({"writeErrors": [{"index": 0, "code": 121}], "writeConcernErrors": []}), False),
+    (ValueError("x"), False),
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
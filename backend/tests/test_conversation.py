@@ -0,0 +1,73 @@
+# tests/test_conversation.py
+import asyncio
+
+from case_store import case_store
+from conversation import (
+    CHAT_RECENT_EXCHANGES, CHAT_TOKEN_BUDGET, STATE_KIND,
+    ConversationMemory, build_prompt, estimate_tokens, render_history,
+)
+from database import database
+
+
+class FakeLLM:
+    """Answers every prompt with a reply of `reply_chars` characters, recording the prompts."""
+
+    def __init__(self, reply_chars=40):
+        self.reply_chars = reply_chars
+        self.prompts = []
+
+    async def generate(self, prompt):
+        self.prompts.append(prompt)
+        n = len(self.prompts)
+        return (f"reply {n}: " + "it hurts here and there " * 100)[:self.reply_chars]
+
+
+async def converse(memory, llm, exchanges, doctor_chars=40, session_id="s1"):
+    """What /chat does per turn: load the state, build the prompt, generate, record."""
+    case = case_store.get("case001")
+    for n in range(exchanges):
+        message = (f"question {n}: " + "where does it hurt " * 50)[:doctor_chars]
+        state = await memory.load(session_id, "case001")
+        reply = await llm.generate(build_prompt(case, state, message))
+        await memory.record(state, message, reply)
+    return await memory.load(session_id, "case001")
+
+
+def test_old_turns_move_into_the_summary(db):
+    exchanges = 2 * CHAT_RECENT_EXCHANGES + 3
+
+    async def scenario():
+        memory = ConversationMemory(lambda: database.chats)
+        state = await converse(memory, FakeLLM(), exchanges)
+        stored = await database.chats.find_one({"session_id": "s1", "kind": STATE_KIND})
+        return state, stored
+
+    state, stored = asyncio.run(scenario())
+    # Short turns: only the window size triggers compaction
+    assert len(state.turns) == 2 * CHAT_RECENT_EXCHANGES
+    assert len(state.summary) == exchanges - CHAT_RECENT_EXCHANGES
+    assert state.turns[0]["content"].startswith(f"question {exchanges - CHAT_RECENT_EXCHANGES}:")
+    assert "question 0:" in state.summary[0] and "reply 1:" in state.summary[0]
+    assert not any(t["content"].startswith("question 0:") for t in state.turns)
+    assert stored["summary"] == state.summary and stored["turns"] == state.turns
+
+
+def test_prompt_stays_within_the_token_budget(db):
+    llm = FakeLLM(reply_chars=600)
+
+    async def scenario():
+        memory = ConversationMemory(lambda: database.chats)
+        return await converse(memory, llm, 40, doctor_chars=300)
+
+    state = asyncio.run(scenario())
+    assert state.summary
+    history = sum(estimate_tokens(t["content"]) + 2 for t in state.turns)
+    history += sum(estimate_tokens(line) for line in state.summary)
+    assert history <= CHAT_TOKEN_BUDGET
+    # Past the first few turns, prompt size is flat however long the session runs
+    sizes = [estimate_tokens(p) for p in llm.prompts]
+    persona = estimate_tokens(case_store.persona(case_store.get("case001")))
+    assert max(sizes) <= persona + CHAT_TOKEN_BUDGET + 100
+    assert max(sizes[20:]) - min(sizes[20:]) < 100
+    assert "Earlier in this consultation (summary):" in llm.prompts[-1]
+    assert estimate_tokens(render_history(state)) <= CHAT_TOKEN_BUDGET + 50
@@ -0,0 +1,106 @@
+# tests/test_keyword_matcher.py
+# Every message filter must make exactly the same decision as the
+# per-keyword scans the automaton replaced.
+import random
+import re
+
+import pytest
+
+import utils
+from config import (
+    ALLOWED_KEYWORDS, BANNED_TOPICS, BANNED_SENTENCES,
+    GENERAL_KNOWLEDGE_TOPICS, IRRELEVANT_PHRASES,
+)
+from keyword_matcher import KeywordMatcher
+
+
+# === Reference implementations (before the automaton) ===
+def old_is_general_knowledge_question(text):
+    return any(topic in text.lower() for topic in GENERAL_KNOWLEDGE_TOPICS)
+
+
+def old_is_irrelevant_message(message):
+    return any(phrase in message.lower() for phrase in IRRELEVANT_PHRASES)
+
+
+def old_is_medical_input(user_input):
+    input_lower = user_input.lower()
+    return (
+        not any(sentence in input_lower for sentence in BANNED_SENTENCES) and
+        not any(word in input_lower for word in BANNED_TOPICS) and
+        any(keyword in input_lower for keyword in ALLOWED_KEYWORDS)
+    )
+
+
+def old_is_allowed_message(message):
+    normalized = utils.normalize_text(message)
+    for banned in BANNED_TOPICS:
+        if re.search(rf'\b{re.escape(banned)}\b', normalized):
+            return False
+    for keyword in ALLOWED_KEYWORDS:
+        if re.search(rf'\b{re.escape(keyword)}\b', normalized):
+            return True
+    return False
+
+
+HANDWRITTEN = [
+    "", " ", "Hello doctor", "hi", "this is fine", "Where does it hurt?",
+    "I have had a headache and fever since Monday.",
+    "Do you watch IPL? Who is your favorite cricketer?",
+    "What is the capital of France?", "Tell me about Newton's laws of physics",
+    "My stomach pain gets worse after meals", "Is this correct: MI presents with chest pain",
+    "x-ray shows a fracture", "follow-up in 2 weeks", "ECG, CBC and LFT done",
+    "I love you", "You look beautiful today", "Explain the mechanism of aspirin",
+    "painful painless pain-free", "hithere hi-there hi_there", "AI and machine learning in radiology",
+    "Are you single? \\bwife\\b", "sleeplessness and sleepy", "I'm feeling dizzy and nauseous",
+    "Café fever – naïve résumé", "treatment plan for asthma, dose and route",
+]
+
+
+def build_corpus(seed=0, n_random=1000):
+    """The texts above, every keyword in assorted wrappers and cases, and random keyword soup."""
+    rng = random.Random(seed)
+    keywords = ALLOWED_KEYWORDS + BANNED_TOPICS + BANNED_SENTENCES + GENERAL_KNOWLEDGE_TOPICS + IRRELEVANT_PHRASES
+    filler = ["the", "patient", "has", "had", "since", "and", "my", "x", "ok", "is", "a", "very", "of"]
+    wrappers = ["{}", " {} ", "{}!", "({})", "-{}-", "a{}", "{}s", "_{}_", "{}.", "'{}'", "{}?"]
+    corpus = list(HANDWRITTEN)
+    for keyword in keywords:
+        for wrapper in wrappers:
+            corpus.append("I think " + wrapper.format(keyword) + " matters")
+            corpus.append(wrapper.format(keyword.upper()))
+    for _ in range(n_random):
+        words = [rng.choice(keywords if rng.random() < 0.3 else filler) for _ in range(rng.randint(1, 14))]
+        glue = rng.choice([" ", " ", ", ", "-", ""])
+        corpus.append(glue.join(words))
+    return corpus
+
+
+CORPUS = build_corpus()
+
+
+@pytest.mark.parametrize("old,new", [
+    (old_is_general_knowledge_question, utils.is_general_knowledge_question),
+    (old_is_irrelevant_message, utils.is_irrelevant_message),
+    (old_is_medical_input, utils.is_medical_input),
+    (old_is_allowed_message, utils.is_allowed_message),
+], ids=lambda fn: fn.__name__)
+def test_filter_matches_the_old_scans(old, new):
+    differs = [text for text in CORPUS if old(text) != new(text)]
+    assert not differs, differs[:5]
+    # Not trivially all-False or all-True
+    assert len({new(text) for text in CORPUS}) == 2
+
+
+@pytest.mark.parametrize("text,substring,whole_word", [
+    ("painful", {"k"}, set()),
+    ("a pain.", {"k"}, {"k"}),
+    ("pain_x", {"k"}, set()),
+    ("(pain)", {"k"}, {"k"}),
+    ("x-ray", {"x"}, {"x"}),
+    ("box-ray", {"x"}, set()),
+    ("", set(), set()),
+])
+def test_matching_modes(text, substring, whole_word):
+    matcher = KeywordMatcher({"k": ["pain"], "x": ["x-ray"], "empty": [""]})
+    assert matcher.matched(text) == substring
+    assert matcher.matched(text, word_boundary=True) == whole_word
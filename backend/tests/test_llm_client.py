@@ -0,0 +1,135 @@
+# tests/test_llm_client.py
+import asyncio
+
+import pytest
+
+from cache import ResponseCache
+from llm_client import ClientDisconnected, FakeBackend, LLMClient, LLMError, LLMTimeout, run_until_disconnect
+
+
+class CountingBackend(FakeBackend):
+    """FakeBackend that records calls and the peak number running at once."""
+
+    def __init__(self, latency=0.02, token_delay=0.005, fail=False):
+        super().__init__(latency=latency, token_delay=token_delay)
+        self.fail = fail
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def _tracked(self, awaitable):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await awaitable
+        finally:
+            self.active -= 1
+
+    async def generate(self, prompt):
+        reply = await self._tracked(super().generate(prompt))
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        return reply
+
+    async def stream(self, prompt):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            async for chunk in super().stream(prompt):
+                yield chunk
+        finally:
+            self.active -= 1
+
+
+def test_in_flight_completions_are_bounded():
+    backend = CountingBackend()
+    client = LLMClient(backend, max_in_flight=3)
+
+    async def scenario():
+        async def streamed(prompt):
+            return "".join([chunk async for chunk in client.stream(prompt)])
+        return await asyncio.gather(*(client.generate(f"prompt {i}") for i in range(10)),
+                                    *(streamed(f"streamed {i}") for i in range(5)))
+
+    replies = asyncio.run(scenario())
+    assert backend.peak == 3 and backend.calls == 15
+    assert replies[0] == "[fake reply] prompt 0" and replies[-1] == "[fake reply] streamed 4"
+    assert client.completed == 15 and client.in_flight == 0 and client.waiting == 0
+
+
+def test_timeout_raises_and_frees_the_slot():
+    backend = CountingBackend(latency=1)
+    client = LLMClient(backend, max_in_flight=1, timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(LLMTimeout):
+            await client.generate("slow")
+        backend.latency = 0
+        return await client.generate("fast")
+
+    assert asyncio.run(scenario()) == "[fake reply] fast"
+    assert client.timeouts == 1 and client.in_flight == 0
+
+
+def test_stalled_stream_times_out():
+    client = LLMClient(CountingBackend(token_delay=1), timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(LLMTimeout):
+            async for _ in client.stream("stalls"):
+                pass
+
+    asyncio.run(scenario())
+    assert client.timeouts == 1 and client.in_flight == 0
+
+
+def test_backend_errors_become_llm_errors():
+    client = LLMClient(CountingBackend(fail=True))
+    with pytest.raises(LLMError, match="quota exceeded"):
+        asyncio.run(client.generate("x"))
+    assert client.failed == 1 and client.in_flight == 0
+
+
+def test_cache_hit_skips_the_backend(tmp_path):
+    db_path = str(tmp_path / "llm_cache.sqlite")
+    backend = CountingBackend()
+    client = LLMClient(backend, cache=ResponseCache(db_path=db_path))
+
+    async def scenario():
+        first = await client.generate_cached("same prompt", "extract")
+        second = await client.generate_cached("same prompt", "extract")
+        other = await client.generate_cached("other prompt", "extract")
+        return first, second, other
+
+    first, second, other = asyncio.run(scenario())
+    assert first == second and other != first
+    assert backend.calls == 2
+    assert client.cache.stats()["endpoints"]["extract"] == {"memory_hits": 1, "disk_hits": 0, "misses": 2}
+
+    # A new process: the SQLite tier still has the reply
+    restarted = LLMClient(CountingBackend(), cache=ResponseCache(db_path=db_path))
+    assert asyncio.run(restarted.generate_cached("same prompt", "extract")) == first
+    assert restarted.backend.calls == 0
+    assert restarted.cache.stats()["endpoints"]["extract"]["disk_hits"] == 1
+
+
+def test_disconnect_cancels_the_completion():
+    backend = CountingBackend(latency=5)
+    client = LLMClient(backend)
+
+    class Request:
+        polls = 0
+
+        async def is_disconnected(self):
+            self.polls += 1
+            return self.polls >= 2
+
+    async def scenario():
+        with pytest.raises(ClientDisconnected):
+            await asyncio.wait_for(run_until_disconnect(Request(), client.generate("x"), poll_interval=0.01), 1)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert backend.active == 0 and client.in_flight == 0 and client.completed == 0
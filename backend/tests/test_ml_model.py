@@ -0,0 +1,74 @@
+# tests/test_ml_model.py
+import json
+import os
+import random
+
+import joblib
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import ml_model
+
+
+def case_inputs():
+    """(symptoms, age, gender) of every case in cases/, plus each single-symptom variant."""
+    inputs = []
+    for file in sorted(os.listdir(ml_model.CASE_FOLDER)):
+        if file.endswith(".json"):
+            with open(os.path.join(ml_model.CASE_FOLDER, file)) as f:
+                case = json.load(f)
+            patient = case["patient_profile"]
+            inputs.append((case["symptoms"], patient["age"], patient["gender"]))
+            inputs.extend(([s], patient["age"], patient["gender"]) for s in case["symptoms"])
+    return inputs
+
+
+@pytest.fixture
+def small_model(tmp_path, monkeypatch):
+    """A 10-tree forest over the cases' symptoms, trained the way train_model does, loaded by the registry."""
+    rng = random.Random(0)
+    vocabulary = sorted({s for symptoms, _, _ in case_inputs() for s in symptoms})
+    df = pd.DataFrame([{
+        "age": rng.randint(1, 90),
+        "gender": rng.choice(["male", "female"]),
+        "symptoms": rng.sample(vocabulary, rng.randint(1, 5)),
+        "diagnosis": rng.choice(["flu", "migraine", "asthma", "gastritis"]),
+    } for _ in range(300)])
+    X, y, mlb = ml_model.preprocess_data(df)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    model_path, encoder_path = tmp_path / "model.pkl", tmp_path / "encoder.pkl"
+    joblib.dump(model, model_path)
+    joblib.dump(mlb, encoder_path)
+    monkeypatch.setattr(ml_model, "model_registry", ml_model.ModelRegistry(str(model_path), str(encoder_path)))
+    ml_model.prediction_cache.clear()
+    yield model, mlb
+    ml_model.prediction_cache.clear()
+
+
+def dataframe_predict(model, mlb, symptoms, age, gender):
+    """The original per-request path: mlb.transform + one-row DataFrame."""
+    gender_val = 0 if gender.lower() == "male" else 1
+    vector = mlb.transform([[s for s in symptoms if s in set(mlb.classes_)]])
+    input_df = pd.DataFrame([[age, gender_val] + list(vector[0])], columns=["age", "gender"] + list(mlb.classes_))
+    return model.predict(input_df)[0]
+
+
+def test_fast_path_matches_the_dataframe_path_on_every_case(small_model):
+    model, mlb = small_model
+    inputs = case_inputs()
+    expected = [dataframe_predict(model, mlb, *item) for item in inputs]
+    assert [ml_model.predict_diagnosis(*item) for item in inputs] == expected
+    # Cache hits return the same labels
+    assert [ml_model.predict_diagnosis(*item) for item in inputs] == expected
+    assert [r["diagnosis"] for r in ml_model.predict_diagnosis_batch(inputs)] == expected
+
+
+def test_unusable_inputs_are_errors(small_model):
+    with pytest.raises(ValueError):
+        ml_model.predict_diagnosis(["not a symptom"], 30, "male")
+    with pytest.raises(ValueError):
+        ml_model.predict_diagnosis(case_inputs()[0][0], 30, "other")
+    results = ml_model.predict_diagnosis_batch([(["not a symptom"], 30, "male"), (case_inputs()[0][0], 30, "female")])
+    assert "error" in results[0] and results[0]["error"]
+    assert results[1]["diagnosis"] and len(results[1]["top_k"]) == 3
@@ -0,0 +1,47 @@
+# tests/test_pagination.py
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from pagination import InvalidCursor, decode_cursor, encode_cursor, page_query
+
+
+@pytest.mark.parametrize("value", [
+    datetime(2024, 5, 1, 12, 30, 15, 123000),
+    "General checkup",
+    42,
+    None,
+])
+def test_cursor_round_trip(value):
+    _id = ObjectId()
+    assert decode_cursor(encode_cursor(value, _id)) == (value, _id)
+
+
+def test_cursor_is_url_safe():
+    token = encode_cursor(datetime(2024, 5, 1), ObjectId())
+    assert "=" not in token and "+" not in token and "/" not in token
+
+
+@pytest.mark.parametrize("token", [
+    "not-a-cursor",
+    encode_cursor("x", ObjectId())[:-4],
+    "WzEsMl0",  # [1,2]: well-formed JSON, not an ObjectId
+])
+def test_bad_cursor_rejected(token):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token)
+
+
+def test_page_query_without_cursor_is_unchanged():
+    assert page_query({"email": "a@b.c"}, "created_at", DESCENDING) == {"email": "a@b.c"}
+
+
+def test_page_query_selects_after_cursor():
+    _id = ObjectId()
+    query = page_query({"email": "a@b.c"}, "timestamp", ASCENDING, encode_cursor(5, _id))
+    assert query == {"$and": [
+        {"email": "a@b.c"},
+        {"$or": [{"timestamp": {"$gt": 5}}, {"timestamp": 5, "_id": {"$gt": _id}}]},
+    ]}
@@ -0,0 +1,168 @@
+# tests/test_report_jobs.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from report_jobs import ReportJobQueue, JobQueueFull, job_key, DONE, FAILED, QUEUED, RUNNING
+
+
+class FakeLLM:
+    def __init__(self, latency=0.01, fail_on=None):
+        self.latency = latency
+        self.fail_on = fail_on
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.active -= 1
+        if prompt == self.fail_on:
+            raise RuntimeError("model unavailable")
+        return f"report: {prompt}"
+
+
+def new_queue(llm, collection=None, **options):
+    collection = collection if collection is not None else AsyncMongoMockClient()["test"]["report_jobs"]
+    return ReportJobQueue(lambda: collection, generate=llm.generate, **options), collection
+
+
+async def wait_finished(queue, job_ids, timeout=5):
+    async def poll():
+        while True:
+            docs = [await queue.get(job_id) for job_id in job_ids]
+            if all(doc["status"] in (DONE, FAILED) for doc in docs):
+                return docs
+            await asyncio.sleep(0.005)
+    return await asyncio.wait_for(poll(), timeout)
+
+
+def test_identical_jobs_share_one_generation():
+    async def scenario():
+        llm = FakeLLM(latency=0.05)
+        queue, _ = new_queue(llm, workers=2)
+        queue.start()
+        results = await asyncio.gather(*(queue.submit({"n": 1}, "same prompt") for _ in range(5)))
+        [doc] = await wait_finished(queue, {job_id for job_id, _ in results})
+        await queue.stop()
+        return results, doc, llm
+
+    results, doc, llm = asyncio.run(scenario())
+    assert len({job_id for job_id, _ in results}) == 1
+    assert [deduplicated for _, deduplicated in results] == [False, True, True, True, True]
+    assert llm.calls == 1
+    assert doc["status"] == DONE and doc["result"] == "report: same prompt" and doc["attempts"] == 1
+
+
+def test_workers_and_queue_are_bounded():
+    async def scenario():
+        llm = FakeLLM(latency=0.05)
+        queue, _ = new_queue(llm, workers=2, max_queue=3)
+        queue.start()
+        accepted, rejected = [], 0
+        for i in range(8):
+            try:
+                accepted.append((await queue.submit({}, f"prompt {i}"))[0])
+            except JobQueueFull:
+                rejected += 1
+        await wait_finished(queue, accepted)
+        await queue.stop()
+        return accepted, rejected, llm
+
+    accepted, rejected, llm = asyncio.run(scenario())
+    assert len(accepted) == 5 and rejected == 3
+    assert llm.peak == 2
+
+
+def test_failed_generation_is_recorded():
+    async def scenario():
+        queue, _ = new_queue(FakeLLM(fail_on="bad"))
+        queue.start()
+        job_id, _ = await queue.submit({}, "bad")
+        [doc] = await wait_finished(queue, [job_id])
+        await queue.stop()
+        return doc
+
+    doc = asyncio.run(scenario())
+    assert doc["status"] == FAILED and "model unavailable" in doc["error"]
+    assert doc["expires_at"] > doc["finished_at"]
+
+
+def leftover(i, status=QUEUED, attempts=0):
+    """A record a previous process left unfinished."""
+    return {"_id": f"old{i}", "key": job_key(f"old prompt {i}"), "status": status, "params": {},
+            "prompt": f"old prompt {i}", "attempts": attempts,
+            "created_at": datetime.utcnow() - timedelta(minutes=10, seconds=-i)}
+
+
+def test_recovery_respects_the_bound():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"]["report_jobs"]
+        await collection.insert_many([leftover(i, RUNNING if i % 2 else QUEUED, attempts=i % 2) for i in range(12)])
+        llm = FakeLLM(latency=0.01)
+        queue, _ = new_queue(llm, collection, workers=2, max_queue=2)
+        peak_pending = 0
+
+        async def generate(prompt):
+            nonlocal peak_pending
+            peak_pending = max(peak_pending, queue.pending)
+            return await llm.generate(prompt)
+
+        queue.generate = generate
+        queue.start()
+        docs = await wait_finished(queue, [f"old{i}" for i in range(12)])
+        await queue.stop()
+        return docs, queue, peak_pending
+
+    docs, queue, peak_pending = asyncio.run(scenario())
+    assert all(doc["status"] == DONE for doc in docs)
+    assert queue.counters["recovered"] == 12
+    assert peak_pending <= 4
+
+
+def test_recovery_gives_up_after_max_attempts():
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"]["report_jobs"]
+        await collection.insert_many([leftover(0, RUNNING, attempts=3), leftover(1, RUNNING, attempts=2)])
+        llm = FakeLLM()
+        queue, _ = new_queue(llm, collection, max_attempts=3)
+        queue.start()
+        docs = await wait_finished(queue, ["old0", "old1"])
+        await queue.stop()
+        return docs, queue, llm
+
+    (crashed, retried), queue, llm = asyncio.run(scenario())
+    assert crashed["status"] == FAILED and "3 attempts" in crashed["error"]
+    assert retried["status"] == DONE and retried["attempts"] == 3
+    assert queue.counters["abandoned"] == 1 and llm.calls == 1
+
+
+@pytest.mark.parametrize("status", [QUEUED, RUNNING])
+def test_jobs_interrupted_by_stop_resume_on_start(status):
+    async def scenario():
+        collection = AsyncMongoMockClient()["test"]["report_jobs"]
+        llm = FakeLLM(latency=0.2)
+        queue, _ = new_queue(llm, collection, workers=1)
+        queue.start()
+        first, _ = await queue.submit({}, "first")
+        second, _ = await queue.submit({}, "second")
+        await asyncio.sleep(0.05)
+        await queue.stop()
+        interrupted = {first: RUNNING, second: QUEUED}
+        job_id = next(j for j, s in interrupted.items() if s == status)
+        assert (await queue.get(job_id))["status"] == status
+        # Looks like an earlier process's job to the next start()
+        await asyncio.sleep(0.01)
+        queue.start()
+        [doc] = await wait_finished(queue, [job_id])
+        await queue.stop()
+        return doc
+
+    assert asyncio.run(scenario())["status"] == DONE
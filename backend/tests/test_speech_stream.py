@@ -0,0 +1,91 @@
+# tests/test_speech_stream.py
+import asyncio
+import logging
+from types import SimpleNamespace
+
+import numpy as np
+
+from speech_stream import SpeechSession
+
+RATE = 16000
+
+
+class FakeASR:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.backend = SimpleNamespace(sample_rate=RATE)
+        self.calls = 0
+
+    async def transcribe(self, clip):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return f"utterance {self.calls}"
+
+
+def speech(seconds=0.5) -> bytes:
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (0.5 * 32767 * np.sin(2 * np.pi * 440 * t)).astype("<i2").tobytes()
+
+
+def silence(seconds=1.0) -> bytes:
+    return bytes(2 * int(seconds * RATE))
+
+
+def test_failed_on_final_is_logged_and_later_finals_still_delivered(caplog):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def on_final(text, utterance):
+        if utterance == 1:
+            raise RuntimeError("chat pipeline down")
+
+    async def scenario():
+        session = SpeechSession(FakeASR(), RATE, send, on_final=on_final)
+        for _ in range(2):
+            await session.feed(speech() + silence())
+        await session.finish()
+        await session.close()
+
+    with caplog.at_level(logging.WARNING, logger="speech_stream"):
+        asyncio.run(scenario())
+    assert [m["utterance"] for m in sent if m["type"] == "final"] == [1, 2]
+    assert "chat pipeline down" in caplog.text
+
+
+def test_send_failure_in_final_is_logged(caplog):
+    async def send(message):
+        if message["type"] == "final":
+            raise ConnectionError("websocket closed")
+
+    async def scenario():
+        session = SpeechSession(FakeASR(), RATE, send)
+        await session.feed(speech() + silence())
+        await session.finish()
+        await session.close()
+
+    with caplog.at_level(logging.WARNING, logger="speech_stream"):
+        asyncio.run(scenario())
+    assert "websocket closed" in caplog.text
+
+
+def test_close_cancels_and_awaits_pending_finals():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def scenario():
+        session = SpeechSession(FakeASR(latency=10), RATE, send)
+        await session.feed(speech() + silence())
+        await session.feed(speech())
+        await session.end_utterance()
+        tasks = list(session._tasks)
+        await asyncio.wait_for(session.close(), 1)
+        return tasks, session
+
+    tasks, session = asyncio.run(scenario())
+    assert tasks and all(task.done() for task in tasks)
+    assert not session._tasks
+    assert not [m for m in sent if m["type"] == "final"]
@@ -0,0 +1,47 @@
+# tests/test_symptom_extractor.py
+import pytest
+import spacy
+
+from symptom_extractor import SPACY_MODEL, SymptomExtractor, load_nlp
+
+if not spacy.util.is_package(SPACY_MODEL):
+    pytest.skip(f"spaCy model {SPACY_MODEL} is not installed", allow_module_level=True)
+
+
+# (text, symptoms present, symptoms only mentioned negated)
+LABELLED = [
+    ("I have had a headache and fever since Monday.", ["fever", "headache"], []),
+    ("No fever, but a bad cough since Monday", ["cough"], ["fever"]),
+    ("Denies fever, chills or nausea. Feeling tired.", ["fatigue"], ["fever", "nausea", "chills"]),
+    ("I don't feel dizzy", [], ["dizziness"]),
+    ("I am not dizzy, just tired", ["fatigue"], ["dizziness"]),
+    ("negative for rash; itchy skin", ["itching"], ["rash"]),
+    ("My belly pain gets worse after meals", ["abdominal pain"], []),
+    ("Sharp abdominal pain and headaches", ["headache", "abdominal pain"], []),
+    ("Coughing a lot at night, sore throat", ["cough", "sore throat"], []),
+    ("Throwing up twice since yesterday", ["vomiting"], []),
+    ("Breathless on stairs and lightheaded", ["shortness of breath", "dizziness"], []),
+    ("without any blurred vision", [], ["blurred vision"]),
+    ("Hello doctor", [], []),
+    ("", [], []),
+]
+
+
+@pytest.fixture(scope="module")
+def extractor():
+    return SymptomExtractor(nlp=load_nlp(), cache_size=0)
+
+
+@pytest.mark.parametrize("text,present,negated", LABELLED)
+def test_labelled_text(extractor, text, present, negated):
+    analysis = extractor.analyze(text)
+    assert set(analysis["symptoms"]) == set(present)
+    assert {s["symptom"] for s in analysis["spans"] if s["negated"]} - set(analysis["symptoms"]) == set(negated)
+    for span in analysis["spans"]:
+        assert text[span["start"]:span["end"]] == span["text"]
+
+
+def test_batch_matches_single_text(extractor):
+    texts = [text for text, _, _ in LABELLED]
+    assert list(extractor.analyze_many(texts)) == [extractor.analyze(text) for text in texts]
+    assert list(extractor.extract_many(texts)) == [extractor.extract(text) for text in texts]
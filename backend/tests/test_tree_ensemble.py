@@ -0,0 +1,54 @@
+# tests/test_tree_ensemble.py
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from tree_ensemble import FlatForest, export_forest, forest_path_for
+
+
+def rows(n_rows, n_features, rng):
+    """Shaped like the diagnosis features: age, gender, then 0/1 symptom columns."""
+    X = np.zeros((n_rows, n_features), dtype=np.float32)
+    X[:, 0] = rng.integers(1, 100, n_rows)
+    X[:, 1] = rng.integers(0, 2, n_rows)
+    X[:, 2:] = rng.random((n_rows, n_features - 2)) < 0.15
+    return X
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    rng = np.random.default_rng(0)
+    X = rows(400, 30, rng)
+    y = rng.choice(["flu", "migraine", "asthma", "gastritis", "covid"], len(X))
+    model = RandomForestClassifier(n_estimators=25, random_state=0).fit(X, y)
+    return model, rows(1000, 30, rng)
+
+
+def test_flat_forest_is_bit_identical_to_sklearn(fitted):
+    model, X = fitted
+    forest = FlatForest.from_model(model)
+    assert np.array_equal(forest.predict_proba(X), model.predict_proba(X))
+    assert np.array_equal(forest.predict(X), model.predict(X))
+    # Single rows take the same path as the live endpoint
+    for row in X[:20]:
+        assert np.array_equal(forest.predict_proba(row[None, :]), model.predict_proba(row[None, :]))
+
+
+def test_continuous_features_split_like_sklearn():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(300, 6)).astype(np.float32)
+    y = (X[:, 0] + X[:, 3] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    forest = FlatForest.from_model(model)
+    X_test = rng.normal(size=(500, 6))  # float64 input, cast like sklearn does
+    assert np.array_equal(forest.predict_proba(X_test), model.predict_proba(X_test))
+
+
+def test_export_round_trips(fitted, tmp_path):
+    model, X = fitted
+    path = export_forest(model, str(tmp_path / "model.pkl"), model_sha="abc")
+    assert path == forest_path_for(str(tmp_path / "model.pkl"))
+    loaded = FlatForest.load(path)
+    assert loaded.model_sha == "abc" and loaded.n_trees == 25
+    assert np.array_equal(loaded.predict_proba(X), model.predict_proba(X))
+    assert list(loaded.predict(X)) == list(model.predict(X))
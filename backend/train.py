@@ -0,0 +1,39 @@
+# train.py
+# Train the diagnosis model from cases/:
+#
+#   python train.py                      # all cores, cached case features, promote
+#   python train.py --workers 8 --no-promote
+import argparse
+import logging
+
+from ml_model import CASE_FEATURES_CACHE, MODELS_DIR, train_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the MediTrain diagnosis model.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used to parse case files (default: one per core)")
+    parser.add_argument("--n-jobs", type=int, default=-1,
+                        help="cores used to fit the forest (default: all)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-parse every case file instead of using the feature cache")
+    parser.add_argument("--models-dir", default=MODELS_DIR,
+                        help="where versioned model directories are written")
+    parser.add_argument("--no-promote", action="store_true",
+                        help="only write the versioned directory, keep serving the current model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    version_dir = train_model(
+        n_jobs=args.n_jobs,
+        workers=args.workers,
+        cache_path=None if args.no_cache else CASE_FEATURES_CACHE,
+        models_dir=args.models_dir,
+        promote=not args.no_promote,
+    )
+    if version_dir is None:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
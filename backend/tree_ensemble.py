@@ -0,0 +1,156 @@
+# tree_ensemble.py
+"""
+Flat-array export and pure-NumPy evaluator for the diagnosis RandomForest.
+
+All trees are concatenated into contiguous node arrays (feature, threshold,
+left child, leaf value) laid out breadth-first so that every right child
+sits right after its left sibling. Leaves point to themselves, so a batch of rows walks
+every tree at once with one gather per depth level and no Python recursion.
+Probabilities are accumulated tree by tree in estimator order and divided
+by the tree count, exactly as sklearn's ForestClassifier.predict_proba does,
+so predictions are bit-identical.
+"""
+import os
+import numpy as np
+
+
+def _sibling_order(children_left, children_right):
+    """Breadth-first node order of one sklearn tree (root first, siblings adjacent)."""
+    order = [0]
+    for node in order:
+        if children_left[node] != -1:
+            order.append(children_left[node])
+            order.append(children_right[node])
+    return np.asarray(order, dtype=np.intp)
+
+
+def forest_path_for(model_path: str) -> str:
+    """diagnosis_model.pkl -> diagnosis_model.forest.npz"""
+    root, _ = os.path.splitext(model_path)
+    return root + ".forest.npz"
+
+
+class FlatForest:
+    def __init__(self, feature, threshold, left, value, roots, max_depth, classes, model_sha=""):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.classes = classes
+        self.model_sha = model_sha
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_model(cls, model, model_sha=""):
+        features, thresholds, lefts, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            order = _sibling_order(tree.children_left, tree.children_right)
+            position = np.empty_like(order)
+            position[order] = np.arange(len(order))
+            children_left = tree.children_left[order]
+            leaf = children_left == -1
+            # Siblings are stored next to each other, so the right child is
+            # always left + 1; leaves point to themselves with a +inf
+            # threshold and never move whatever the feature value.
+            left = np.where(leaf, np.arange(len(order)), position[children_left])
+            features.append(np.where(leaf, 0, tree.feature[order]).astype(np.intp))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold[order]))
+            lefts.append((left + offset).astype(np.intp))
+            # Same slice DecisionTreeClassifier.predict_proba returns per leaf
+            values.append(np.ascontiguousarray(tree.value[order, 0, :model.n_classes_], dtype=np.float64))
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += len(order)
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_),
+            model_sha=model_sha,
+        )
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                feature=self.feature,
+                threshold=self.threshold,
+                left=self.left,
+                value=self.value,
+                roots=self.roots,
+                max_depth=np.int32(self.max_depth),
+                classes=np.asarray([str(c) for c in self.classes]),
+                model_sha=np.asarray(self.model_sha),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                feature=data["feature"].astype(np.intp),
+                threshold=data["threshold"],
+                left=data["left"].astype(np.intp),
+                value=data["value"],
+                roots=data["roots"].astype(np.intp),
+                max_depth=int(data["max_depth"]),
+                classes=np.asarray(data["classes"].tolist(), dtype=object),
+                model_sha=str(data["model_sha"]),
+            )
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf index of every (tree, row) pair, shape (n_trees, n_rows)."""
+        # sklearn evaluates trees on float32 input; comparing the float32
+        # values against float64 thresholds matches its Cython traversal.
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = np.arange(n_rows, dtype=np.intp) * n_features
+        nodes = np.repeat(self.roots[:, None], n_rows, axis=1)
+        for _ in range(self.max_depth):
+            values = flat_X.take(row_offsets + self.feature.take(nodes))
+            # False (<= threshold) -> left child, True -> its right sibling
+            nodes = self.left.take(nodes) + (values > self.threshold.take(nodes))
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[1], self.value.shape[1]), dtype=np.float64)
+        # Sequential accumulation in estimator order, as sklearn does
+        for tree_leaves in leaves:
+            proba += self.value[tree_leaves]
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def export_forest(model, model_path: str, model_sha: str = "") -> str:
+    """Flatten `model` and save it next to its pickle. Returns the npz path."""
+    path = forest_path_for(model_path)
+    FlatForest.from_model(model, model_sha=model_sha).save(path)
+    return path
+
+
+if __name__ == "__main__":
+    # Export the currently saved model: python tree_ensemble.py
+    import hashlib
+    import joblib
+    from ml_model import MODEL_PATH
+
+    with open(MODEL_PATH, "rb") as f:
+        sha = hashlib.sha256(f.read()).hexdigest()
+    print(f"✅ Forest exported to {export_forest(joblib.load(MODEL_PATH), MODEL_PATH, sha)}")
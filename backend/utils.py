@@ -9,14 +9,13 @@ import unicodedata
 from difflib import SequenceMatcher
 from typing import Optional, Dict, Tuple
 
-import spacy
 # Third-party
-import google.generativeai as genai
 from dotenv import load_dotenv
 # from langdetect import detect, DetectorFactory  # Optional if multilingual
 
 # Local imports
-from config import ALLOWED_KEYWORDS, BANNED_TOPICS
+from keyword_matcher import MESSAGE_FILTER
+from case_store import case_store
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -47,68 +46,51 @@ def normalize_text(text: str) -> str:
 #     except:
 #         return "unknown"
 
-# Load environment and configure Gemini
+# Load environment (the LLM itself is configured in llm_client.py)
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
 
-# Load case from file
+LLM_ERROR_REPLY = "⚠️ Sorry, something went wrong while generating the response."
+
+# Load case (parsed once and kept in memory, see case_store.py)
 def load_case(case_id: str) -> Optional[Dict]:
-    path = f"cases/{case_id}.json"
-    if not os.path.exists(path):
-        logging.warning(f"[CASE NOT FOUND] {path}")
-        return None
-    with open(path, "r") as f:
-        return json.load(f)
-
-# Prompt generator for virtual patient
+    case = case_store.get(case_id)
+    if case is None:
+        logging.warning(f"[CASE NOT FOUND] cases/{case_id}.json")
+    return case
+
+# Prompt generator for virtual patient: precomputed persona prefix + doctor message
 def generate_prompt(case, user_input: str) -> str:
-    p = case["patient_profile"]
-    symptoms = ', '.join(case['symptoms'])
-    med_hist = ', '.join(case['additional_info']['medical_history'])
-    fam_hist = ', '.join(case['additional_info']['family_history'])
-
-    template = f"""
-You are a virtual patient named {p['name']}, age {p['age']}, gender {p['gender']}.
-You are speaking to a doctor during a consultation. Your main complaint is: {p['chief_complaint']}.
-Your symptoms include: {symptoms}.
-Medical History: {med_hist}
-Family History: {fam_hist}
-
-INSTRUCTIONS:
-- Always respond **as the patient**, not as an AI or assistant.
-- Only answer **medical or personal health-related** questions, including:
-  - Your pain, symptoms, medical/family history, or recent changes.
-  - Basic identity and emotional state (name, tell me, how you’re feeling, etc.).
-- **Do NOT** answer questions about science, math, geography, or anything unrelated to your condition.
-  - For those, politely deflect and redirect the conversation to your health.
-- Doctor may use multiple languages for input. You must understand and respond accordingly as a **virtual patient**.
-- Maintain a natural, emotional, and human tone.
-
-Doctor: {user_input}
-""".strip()
-    return template
+    return (case_store.prompt_prefix(case) + user_input).rstrip()
+
+# === Message Filtering ===
+# Each check is one MESSAGE_FILTER scan (keyword lists in config.py), with
+# the same decisions as the per-keyword `in` scans it replaced.
+def is_general_knowledge_question(text: str) -> bool:
+    return "general_knowledge" in MESSAGE_FILTER.matched(text.lower())
+
+def is_irrelevant_message(message: str) -> bool:
+    return "irrelevant" in MESSAGE_FILTER.matched(message.lower())
+
+def is_medical_input(user_input: str) -> bool:
+    found = MESSAGE_FILTER.matched(user_input.lower())
+    return (
+        "banned_sentence" not in found and
+        "banned_topic" not in found and
+        "allowed" in found
+    )
 
 # Filter out invalid or irrelevant user messages
 def is_allowed_message(message: str) -> bool:
-    normalized = normalize_text(message)
-    for banned in BANNED_TOPICS:
-        if re.search(rf'\b{re.escape(banned)}\b', normalized):
-            return False
-    for keyword in ALLOWED_KEYWORDS:
-        if re.search(rf'\b{re.escape(keyword)}\b', normalized):
-            return True
-    return False
-
-# Call the Gemini model with generated prompt
-def call_llm(prompt: str) -> str:
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        logging.warning(f"[LLM ERROR] {e}")
-        return "⚠️ Sorry, something went wrong while generating the response."
+    # Whole-word matches of every banned/allowed keyword in one pass
+    found = MESSAGE_FILTER.matched(normalize_text(message), word_boundary=True)
+    return "banned_topic" not in found and "allowed" in found
+
+# Prompt asking the LLM to pull diagnosis and treatment out of a conversation
+def extraction_prompt(conversation: str) -> str:
+    return (
+        f"From the following conversation, extract diagnosis and treatment:\n"
+        f"{conversation}\n\nFormat:\nDiagnosis: <...>\nTreatment: <...>"
+    )
 
 # Accuracy calculation for diagnosis/treatment match
 def accuracy_score(user_text: str, correct_text: str) -> float:
@@ -152,8 +134,8 @@ def extract_diagnosis_and_treatment(text: str) -> Tuple[str, str]:
 
 # llm_utils.py
 
-def generate_diagnosis_report(name, age, gender, symptoms, diagnosis, duration="unknown"):
-    prompt = f"""
+def diagnosis_report_prompt(name, age, gender, symptoms, diagnosis, duration="unknown"):
+    return f"""
     Patient Name: {name}
     Age: {age}
     Gender: {gender}
@@ -168,65 +150,11 @@ def generate_diagnosis_report(name, age, gender, symptoms, diagnosis, duration="
     - A professional tone
     """
 
-    try:
-        model = genai.GenerativeModel("gemini-2.0-flash")
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return f"❌ Error generating report: {str(e)}"
-
 # nlp_utils.py
-
-# Attempt to load SpaCy model with fallback installer
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    os.system("python -m spacy download en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
-
-# Clinical symptom keywords (canonical names)
-SYMPTOM_KEYWORDS = [
-    "fever", "cough", "headache", "fatigue", "nausea",
-    "vomiting", "diarrhea", "pain", "sore throat",
-    "chills", "shortness of breath", "dizziness",
-    "rash", "itching", "abdominal pain", "blurred vision"
-]
-
-# Synonyms or common variations mapped to canonical symptom keywords
-SYMPTOM_SYNONYMS = {
-    "tired": "fatigue",
-    "exhausted": "fatigue",
-    "sick": "nausea",
-    "queasy": "nausea",
-    "throwing up": "vomiting",
-    "upset stomach": "abdominal pain",
-    "belly pain": "abdominal pain",
-    "breathless": "shortness of breath",
-    "dizzy": "dizziness",
-    "lightheaded": "dizziness",
-    "blurred sight": "blurred vision",
-    "itchy": "itching",
-    "sore throat": "sore throat"
-}
-
-def extract_symptoms_from_text(user_input):
-    raw_text = user_input.lower()
-    doc = nlp(raw_text)
-    lemmatized_text = " ".join([token.lemma_ for token in doc])
-    symptoms_found = set()
-
-    # Check canonical symptom keywords in lemmatized and raw text
-    for symptom in SYMPTOM_KEYWORDS:
-        if symptom in lemmatized_text or symptom in raw_text:
-            symptoms_found.add(symptom)
-
-    # Check for synonyms in both raw and lemmatized forms
-    for synonym, mapped_symptom in SYMPTOM_SYNONYMS.items():
-        if (synonym in raw_text or synonym in lemmatized_text) and mapped_symptom in SYMPTOM_KEYWORDS:
-            symptoms_found.add(mapped_symptom)
-
-    return list(symptoms_found)
+# Symptom extraction lives in symptom_extractor.py (trimmed spaCy pipeline +
+# one automaton over every symptom phrase); re-exported for existing imports.
+from symptom_extractor import (
+    SYMPTOM_KEYWORDS, SYMPTOM_SYNONYMS, symptom_extractor, extract_symptoms_from_text,
+)
 
 print("✅ NLP utils loaded")
-
-